@@ -0,0 +1,161 @@
+import json
+import asyncio
+import functools
+import threading
+from contextlib import contextmanager
+from typing import Any, Dict, Optional
+
+from pydantic import BaseModel
+
+# ---------------- Store Locking ----------------
+# Route handlers are plain `def`, so FastAPI runs them concurrently in its
+# threadpool. Each in-memory store gets its own lock (no global lock), and
+# readers of a store proceed in parallel.
+
+class RWLock:
+    """
+    Many readers or one writer. Writers are preferred: once a writer is waiting,
+    new readers queue behind it, so polling clients cannot starve mutations.
+    Not re-entrant - take it once at the endpoint, not inside helpers.
+    """
+
+    def __init__(self):
+        self._cond = threading.Condition(threading.Lock())
+        self._readers = 0
+        self._writer = False
+        self._waiting_writers = 0
+
+    @contextmanager
+    def read(self):
+        with self._cond:
+            while self._writer or self._waiting_writers:
+                self._cond.wait()
+            self._readers += 1
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._readers -= 1
+                if self._readers == 0:
+                    self._cond.notify_all()
+
+    @contextmanager
+    def write(self):
+        with self._cond:
+            self._waiting_writers += 1
+            while self._writer or self._readers:
+                self._cond.wait()
+            self._waiting_writers -= 1
+            self._writer = True
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._writer = False
+                self._cond.notify_all()
+
+def locked(acquire):
+    """
+    Runs a route handler inside a lock context, e.g. @locked(SCHEDULE_LOCK.write).
+    Place it under the router decorator; the signature is preserved for FastAPI.
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with acquire():
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+# ---------------- Single-Flight ----------------
+# Identical concurrent calls (shift start: every station screen polls at once)
+# share one in-flight computation; every waiter gets the leader's result or
+# exception. Nothing is cached once the call completes. An async call is
+# cancelled when every waiter has gone (clients disconnected).
+
+def _normalize(value):
+    if isinstance(value, BaseModel):
+        return value.model_dump(mode="json")
+    return value
+
+def flight_key(*args, **kwargs) -> str:
+    """Default key: arguments as canonical JSON (pydantic models by field values)."""
+    return json.dumps(
+        [[_normalize(a) for a in args], {k: _normalize(v) for k, v in kwargs.items()}],
+        sort_keys=True, default=str,
+    )
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result: Any = None
+        self.error: Optional[BaseException] = None
+
+class _Flight:
+    def __init__(self, task: asyncio.Future):
+        self.task = task
+        self.waiters = 0
+
+def single_flight(key=flight_key):
+    """
+    Coalesces concurrent calls with the same `key(*args, **kwargs)`. Works on
+    plain functions (threadpool handlers) and coroutines. Like `locked`, place
+    it under the router decorator.
+    """
+    def decorator(func):
+        if asyncio.iscoroutinefunction(func):
+            flights: Dict[str, _Flight] = {}
+
+            def forget(k: str, flight: _Flight):
+                if flights.get(k) is flight:
+                    del flights[k]
+
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                k = key(*args, **kwargs)
+                flight = flights.get(k)
+                if flight is None:
+                    flight = flights[k] = _Flight(asyncio.ensure_future(func(*args, **kwargs)))
+                    flight.task.add_done_callback(lambda t, k=k, f=flight: forget(k, f))
+                flight.waiters += 1
+                try:
+                    # Shielded: one waiter disconnecting must not cancel the others' result
+                    return await asyncio.shield(flight.task)
+                finally:
+                    flight.waiters -= 1
+                    # ...but once the last one has gone, nobody wants the upstream call
+                    if flight.waiters == 0 and not flight.task.done():
+                        forget(k, flight)
+                        flight.task.cancel()
+            return async_wrapper
+
+        calls: Dict[str, _Call] = {}
+        guard = threading.Lock()
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            k = key(*args, **kwargs)
+            with guard:
+                call = calls.get(k)
+                leader = call is None
+                if leader:
+                    call = calls[k] = _Call()
+
+            if not leader:
+                call.done.wait()
+                if call.error is not None:
+                    raise call.error
+                return call.result
+
+            try:
+                call.result = func(*args, **kwargs)
+                return call.result
+            except BaseException as e:
+                call.error = e
+                raise
+            finally:
+                with guard:
+                    del calls[k]
+                call.done.set()
+        return wrapper
+    return decorator
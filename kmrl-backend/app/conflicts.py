@@ -1,8 +1,11 @@
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Request
 from pydantic import BaseModel
 from typing import List, Optional
 import uuid
 import random
+import threading
+
+from app.http_cache import ResponseCache, StoreVersion
 
 conflicts_router = APIRouter(prefix="/conflicts", tags=["Conflicts"])
 
@@ -23,7 +26,24 @@ class OverrideRequest(BaseModel):
     comment: str
 
 # --- In-Memory DB ---
+# Copy-on-write: writers build a new list (and new Conflict objects) and swap the
+# reference, so readers always iterate a complete, immutable snapshot.
 CONFLICTS_DB: List[Conflict] = []
+CONFLICTS_WRITE_LOCK = threading.Lock()
+CONFLICTS_VERSION = StoreVersion()  # Bumped after each swap
+CONFLICTS_CACHE = ResponseCache("conflicts")
+
+def _find(conflict_id: str) -> Conflict:
+    for c in CONFLICTS_DB:
+        if c.id == conflict_id:
+            return c
+    raise HTTPException(status_code=404, detail="Conflict not found")
+
+def _replace(updated: Conflict):
+    """Swaps in a new snapshot with `updated` replacing its old version (hold the write lock)."""
+    global CONFLICTS_DB
+    CONFLICTS_DB = [updated if c.id == updated.id else c for c in CONFLICTS_DB]
+    CONFLICTS_VERSION.bump()
 
 # --- Logic ---
 
@@ -31,8 +51,6 @@ CONFLICTS_DB: List[Conflict] = []
 def run_conflict_check():
     """Simulates a scan of the system and generates conflicts."""
     global CONFLICTS_DB
-    CONFLICTS_DB = [] # Reset for demo simulation (or we could append)
-    
     new_conflicts = []
 
     # 1. Staffing: Double Booking
@@ -123,40 +141,40 @@ def run_conflict_check():
         can_auto_fix=False
     ))
 
-    CONFLICTS_DB.extend(new_conflicts)
+    with CONFLICTS_WRITE_LOCK:
+        CONFLICTS_DB = list(new_conflicts) # Reset for demo simulation (or we could append)
+        CONFLICTS_VERSION.bump()
     return new_conflicts
 
 @conflicts_router.get("/", response_model=List[Conflict])
-def get_conflicts():
-    return CONFLICTS_DB
+def get_conflicts(request: Request):
+    return CONFLICTS_CACHE.respond(request, (CONFLICTS_VERSION.value,), lambda: (CONFLICTS_DB, {}))
 
 @conflicts_router.post("/{conflict_id}/resolve")
 def resolve_conflict(conflict_id: str):
-    for c in CONFLICTS_DB:
-        if c.id == conflict_id:
-            c.status = "Resolved"
-            return {"message": "Conflict resolved"}
-    raise HTTPException(status_code=404, detail="Conflict not found")
+    with CONFLICTS_WRITE_LOCK:
+        c = _find(conflict_id)
+        _replace(c.model_copy(update={"status": "Resolved"}))
+    return {"message": "Conflict resolved"}
 
 @conflicts_router.post("/{conflict_id}/override")
 def override_conflict(conflict_id: str, req: OverrideRequest):
-    for c in CONFLICTS_DB:
-        if c.id == conflict_id:
-            c.status = "Overridden"
-            c.override_comment = req.comment
-            return {"message": "Conflict overridden"}
-    raise HTTPException(status_code=404, detail="Conflict not found")
+    with CONFLICTS_WRITE_LOCK:
+        c = _find(conflict_id)
+        _replace(c.model_copy(update={"status": "Overridden", "override_comment": req.comment}))
+    return {"message": "Conflict overridden"}
 
 @conflicts_router.post("/{conflict_id}/auto-fix")
 def auto_fix_conflict(conflict_id: str):
-    for c in CONFLICTS_DB:
-        if c.id == conflict_id:
-            if not c.can_auto_fix:
-                raise HTTPException(status_code=400, detail="This conflict cannot be auto-fixed.")
-            
-            c.status = "Auto-Fixed"
-            # In a real app, this would actually modify the Roster/Schedule tables.
-            # Here we just change the status and maybe update description to show what happened.
-            c.description += f" [AUTO-FIXED: {c.fix_description}]"
-            return {"message": f"Conflict auto-fixed: {c.fix_description}"}
-    raise HTTPException(status_code=404, detail="Conflict not found")
+    with CONFLICTS_WRITE_LOCK:
+        c = _find(conflict_id)
+        if not c.can_auto_fix:
+            raise HTTPException(status_code=400, detail="This conflict cannot be auto-fixed.")
+
+        # In a real app, this would actually modify the Roster/Schedule tables.
+        # Here we just change the status and maybe update description to show what happened.
+        _replace(c.model_copy(update={
+            "status": "Auto-Fixed",
+            "description": c.description + f" [AUTO-FIXED: {c.fix_description}]"
+        }))
+    return {"message": f"Conflict auto-fixed: {c.fix_description}"}
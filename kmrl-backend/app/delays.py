@@ -0,0 +1,143 @@
+import heapq
+from typing import Dict, Iterable, List
+
+from pydantic import BaseModel
+
+from app.trip_store import TripStore, format_minutes
+
+# ---------------- Delay Propagation ----------------
+# A delay on one trip knocks on to the next trip of the same rake (train chain)
+# and the same pilot (pilot chain), minus whatever turnaround slack exists
+# between them. departure_time stays the planned time; delay_minutes is the
+# expected delay and arrival_time is shifted to the expected arrival. Each trip
+# also keeps the delay entered on it directly, so knock-on delays are
+# recomputed from their predecessors and shrink again when the cause does.
+
+MIN_TURNAROUND = 5       # Minutes a rake needs at the terminal between trips
+MIN_PILOT_HANDOVER = 5   # Minutes a pilot needs between trips
+DELAY_ALERT_MINUTES = 10 # Propagated delays above this are reported
+DAY_END = 24 * 60 - 1    # Last minute of the service day; expected arrivals may not wrap past it
+
+CHAINS = {"train": MIN_TURNAROUND, "pilot": MIN_PILOT_HANDOVER}
+
+class AffectedTrip(BaseModel):
+    id: str
+    trip_id: str
+    departure_time: str
+    delay_minutes: int
+    added_minutes: int
+    via: str  # "origin", "train" or "pilot"
+
+class DelayImpact(BaseModel):
+    trip_id: str
+    delay_minutes: int
+    applied: bool
+    affected: List[AffectedTrip]
+    conflicts: List[str]
+
+def propagate_delay(store: TripStore, row: int, delay: int, apply: bool = True) -> DelayImpact:
+    """
+    Sets `row`'s delay and recomputes the knock-on delay down its train and
+    pilot chains: each later trip runs at the larger of its own delay and what
+    its train / pilot predecessors force on it, so delays can drop as well as
+    grow. Trips are settled in departure order off a heap, so each affected trip
+    is visited once after all of its predecessors, and the walk stops where a
+    delay comes out unchanged: O(k log k) for k affected trips.
+    """
+    dep, arr, delays, own = store.col("dep"), store.col("arr"), store.col("delay"), store.col("own_delay")
+
+    new_delay: Dict[int, int] = {row: delay}
+    via: Dict[int, str] = {row: "origin"}
+    heap = [(store.key(row), row)]
+    queued = {row}
+
+    def expected_arrival(r: int) -> int:
+        return int(arr[r]) + new_delay.get(r, int(delays[r])) - int(delays[r])
+
+    while heap:
+        _, r = heapq.heappop(heap)
+        if r != row:
+            # Own delay, or more if a predecessor (already settled) forces it
+            needed = int(own[r])
+            for field, min_gap in CHAINS.items():
+                prev = store.prev_in_chain(field, r)
+                if prev is None:
+                    continue
+                induced = expected_arrival(prev) + min_gap - int(dep[r])
+                if induced > needed:
+                    needed, via[r] = induced, field
+            if needed == int(delays[r]):
+                continue
+            new_delay[r] = needed
+        for field in CHAINS:
+            nxt = store.next_in_chain(field, r)
+            if nxt is not None and nxt not in queued:
+                queued.add(nxt)
+                via.setdefault(nxt, field)
+                heapq.heappush(heap, (store.key(nxt), nxt))
+
+    affected = []
+    conflicts = []
+    for r in sorted(new_delay, key=store.key):
+        added = new_delay[r] - int(delays[r])
+        affected.append(AffectedTrip(
+            id=store.trip_uid(r),
+            trip_id=store.trip_label(r),
+            departure_time=format_minutes(int(dep[r])),
+            delay_minutes=new_delay[r],
+            added_minutes=added,
+            via=via[r],
+        ))
+        if r != row and new_delay[r] > DELAY_ALERT_MINUTES:
+            conflicts.append(f"{store.trip_label(r)} delayed {new_delay[r]} min via {via[r]} chain")
+
+        # Metro line: a late departure must not pass the next service on the route
+        ahead = store.next_in_chain("route", r)
+        if ahead is not None and ahead not in new_delay:
+            if int(dep[r]) + new_delay[r] >= int(dep[ahead]) + int(delays[ahead]):
+                conflicts.append(f"{store.trip_label(r)} now departs after {store.trip_label(ahead)} on {store.value(r, 'route')}")
+
+    late = [r for r in sorted(new_delay, key=store.key) if expected_arrival(r) > DAY_END]
+    for r in late:
+        conflicts.append(f"{store.trip_label(r)} would arrive after the end of the service day")
+    if apply:
+        apply_delays(store, new_delay, own_rows=(row,))
+
+    return DelayImpact(
+        trip_id=store.trip_label(row),
+        delay_minutes=delay,
+        applied=apply,
+        affected=affected,
+        conflicts=conflicts,
+    )
+
+def apply_delays(store: TripStore, delays_by_row: Dict[int, int], own_rows: Iterable[int] = ()):
+    """
+    Writes new delays in one batch, shifting expected arrival and Scheduled/Delayed
+    status. Rows in `own_rows` had their delay entered directly (not knocked on).
+    """
+    own_rows = set(own_rows)
+    arr, delays = store.col("arr"), store.col("delay")
+    # Validate the whole batch before writing: arrivals are minutes of one service day
+    for r, delay in delays_by_row.items():
+        if int(arr[r]) + delay - int(delays[r]) > DAY_END:
+            raise ValueError(f"A {delay} min delay on {store.trip_label(r)} would move its arrival past the end of the service day")
+    for r, delay in delays_by_row.items():
+        old = int(store.col("delay")[r])
+        changes = {}
+        if r in own_rows and delay != int(store.col("own_delay")[r]):
+            changes["own_delay"] = delay
+        if delay == old:
+            if changes:
+                store.update(r, **changes)
+            continue
+        status = store.value(r, "status")
+        changes.update({
+            "delay_minutes": delay,
+            "arrival_time": format_minutes(int(store.col("arr")[r]) + delay - old),
+        })
+        if delay > 0 and status == "Scheduled":
+            changes["status"] = "Delayed"
+        if delay == 0 and status == "Delayed":
+            changes["status"] = "Scheduled"
+        store.update(r, **changes)
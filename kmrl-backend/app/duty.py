@@ -0,0 +1,155 @@
+import weakref
+from bisect import bisect_left, bisect_right, insort
+from typing import Collection, Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+import numpy as np
+
+from app.trip_store import TripStore, format_minutes
+
+# ---------------- Pilot Duty Accounting ----------------
+# Each pilot's trips are kept as sorted (start, end) intervals with a prefix
+# sum of driving minutes and the positions where a new duty spell begins
+# (after a gap of at least BREAK_MINUTES). Driving minutes in any window,
+# time since the last break and "can this pilot take this trip" are all a
+# few bisections, so generation can check every assignment as it goes.
+# Live-timetable indexes are cached per pilot until the store next changes.
+
+MAX_DRIVING_MINUTES = 420     # Driving per service day
+MAX_CONTINUOUS_DUTY = 240     # First departure to last arrival without a break
+BREAK_MINUTES = 30            # A gap this long counts as a meal / rest break
+
+class DutySummary(NamedTuple):
+    trips: int
+    driving_minutes: int
+    longest_spell: int       # Minutes of continuous duty
+    breaks: int
+
+class DutyIndex:
+    """One pilot's non-overlapping trips, sorted by departure."""
+
+    def __init__(self, intervals: Iterable[Tuple[int, int]] = ()):
+        self.starts: List[int] = []
+        self.ends: List[int] = []
+        self.prefix: List[int] = [0]      # prefix[i] = driving minutes of the first i trips
+        self.spells: List[int] = []       # Positions of trips that start a spell
+        for start, end in sorted(intervals):
+            self.add(start, end)
+
+    def __len__(self) -> int:
+        return len(self.starts)
+
+    def add(self, start: int, end: int):
+        """Appends in O(1) when trips arrive in departure order (generation), else re-sums."""
+        if not self.starts or start >= self.starts[-1]:
+            if not self.starts or start - self.ends[-1] >= BREAK_MINUTES:
+                self.spells.append(len(self.starts))
+            self.starts.append(start)
+            self.ends.append(end)
+            self.prefix.append(self.prefix[-1] + end - start)
+            return
+        intervals = list(zip(self.starts, self.ends))
+        insort(intervals, (start, end))
+        self.__init__(intervals)
+
+    def copy(self) -> "DutyIndex":
+        clone = DutyIndex.__new__(DutyIndex)
+        clone.starts, clone.ends = list(self.starts), list(self.ends)
+        clone.prefix, clone.spells = list(self.prefix), list(self.spells)
+        return clone
+
+    def total(self) -> int:
+        return self.prefix[-1]
+
+    def driving_minutes(self, start: int, end: int) -> int:
+        """Driving minutes inside [start, end)."""
+        i = bisect_right(self.ends, start)      # First trip ending after the window opens
+        j = bisect_left(self.starts, end)       # Trips starting before it closes
+        if i >= j:
+            return 0
+        minutes = self.prefix[j] - self.prefix[i]
+        minutes -= max(start - self.starts[i], 0) + max(self.ends[j - 1] - end, 0)
+        return minutes
+
+    def _spell(self, k: int) -> Tuple[int, int]:
+        """First and last position of the spell containing trip k."""
+        s = bisect_right(self.spells, k)
+        last = self.spells[s] - 1 if s < len(self.spells) else len(self.starts) - 1
+        return self.spells[s - 1], last
+
+    def since_break(self, at: int) -> int:
+        """Minutes on continuous duty at time `at` (0 if on a break or before the first trip)."""
+        k = bisect_right(self.starts, at) - 1
+        if k < 0 or at - self.ends[k] >= BREAK_MINUTES:
+            return 0
+        return at - self.starts[self._spell(k)[0]]
+
+    def continuous_with(self, start: int, end: int) -> int:
+        """Length of the spell a new trip [start, end) would sit in."""
+        k = bisect_left(self.starts, start)
+        first, last = start, end
+        if k > 0 and start - self.ends[k - 1] < BREAK_MINUTES:
+            first = self.starts[self._spell(k - 1)[0]]
+        if k < len(self.starts) and self.starts[k] - end < BREAK_MINUTES:
+            last = self.ends[self._spell(k)[1]]
+        return last - first
+
+    def check(self, start: int, end: int) -> Optional[str]:
+        """Why this pilot can't take a trip [start, end), or None if they can."""
+        k = bisect_left(self.starts, start)
+        if (k > 0 and self.ends[k - 1] > start) or (k < len(self.starts) and self.starts[k] < end):
+            return "already driving at that time"
+        return self.limits(start, end)
+
+    def limits(self, start: int, end: int) -> Optional[str]:
+        """Driving / continuous duty limits alone (overlaps checked elsewhere)."""
+        if self.total() + end - start > MAX_DRIVING_MINUTES:
+            return f"would exceed {MAX_DRIVING_MINUTES} driving minutes ({self.total()} already)"
+        spell = self.continuous_with(start, end)
+        if spell > MAX_CONTINUOUS_DUTY:
+            return (f"would be on duty {spell} minutes without a {BREAK_MINUTES}-minute break "
+                    f"(max {MAX_CONTINUOUS_DUTY})")
+        return None
+
+    def summary(self) -> DutySummary:
+        longest = max((self.ends[self._spell(s)[1]] - self.starts[s] for s in self.spells), default=0)
+        return DutySummary(len(self.starts), self.total(), longest, max(len(self.spells) - 1, 0))
+
+def _build(store: TripStore, pilot: str, exclude: Collection[int]) -> DutyIndex:
+    rows, _ = store.query(pilot=pilot)
+    rows = np.array([r for r in rows if r not in exclude], dtype=np.int64)
+    # Only this pilot's rows: expected departure = planned + delay
+    dep = store.col("dep")[rows] + store.col("delay")[rows]
+    arr, status = store.col("arr")[rows], store.col("status")[rows]
+    cancelled = store.code_of("status", "Cancelled")
+    return DutyIndex((int(d), int(a)) for d, a, st in zip(dep, arr, status) if st != cancelled)
+
+# store -> (version, {pilot: index}); dropped wholesale when the store changes
+_DUTY: "weakref.WeakKeyDictionary[TripStore, Tuple[int, Dict[str, DutyIndex]]]" = weakref.WeakKeyDictionary()
+
+def pilot_duty(store: TripStore, pilot: str, exclude: Collection[int] = ()) -> DutyIndex:
+    """
+    Index of a pilot's operating trips in `store` at their expected times, built
+    from the pilot's own rows (O(k log k)). Without `exclude` it is cached until
+    the store's next write, so treat it as read-only (copy() before adding).
+    """
+    if exclude:
+        return _build(store, pilot, exclude)
+    version, indexes = _DUTY.get(store, (None, None))
+    if version != store.version:
+        indexes = {}
+        _DUTY[store] = (store.version, indexes)
+    index = indexes.get(pilot)
+    if index is None:
+        index = indexes[pilot] = _build(store, pilot, ())
+    return index
+
+def duty_violation(store: TripStore, pilot: Optional[str], dep: int, arr: int,
+                   exclude_row: Optional[int] = None) -> Optional[str]:
+    """Duty-rule error for giving `pilot` a trip [dep, arr), or None."""
+    if not pilot:
+        return None
+    exclude = () if exclude_row is None else (exclude_row,)
+    reason = pilot_duty(store, pilot, exclude).check(dep, arr)
+    if reason is None:
+        return None
+    return f"Pilot {pilot} cannot take {format_minutes(dep)}-{format_minutes(arr)}: {reason}"
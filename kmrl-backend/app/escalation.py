@@ -0,0 +1,193 @@
+import asyncio
+import heapq
+import itertools
+import threading
+import time
+from collections import deque
+from datetime import datetime
+from typing import Callable, Deque, Dict, Iterable, List, Optional, Tuple
+
+from pydantic import BaseModel
+
+# ---------------- SLA Escalation Scheduler ----------------
+# Every open note with an SLA gets a timer per SLA kind (acknowledgement,
+# resolution) on a min-heap keyed by its deadline. One asyncio task sleeps
+# until the earliest deadline (or until a sooner timer is added), then pops
+# only the timers that are due and hands them to the notes module to
+# escalate. Acknowledging / resolving cancels timers lazily: the live-timer
+# map drops them and their heap entries are skipped when they surface. Work
+# per wake-up is proportional to the due timers, not to the notes store.
+
+ACK = "acknowledgement"
+RESOLVE = "resolution"
+KINDS = (ACK, RESOLVE)
+
+# Minutes after creation, per priority (None = no SLA)
+SLA_MINUTES: Dict[str, Dict[str, Optional[int]]] = {
+    "Critical": {ACK: 5, RESOLVE: 60},
+    "High": {ACK: 15, RESOLVE: 240},
+    "Normal": {ACK: None, RESOLVE: 24 * 60},
+}
+# Categories that tighten / relax the priority SLA (None = never escalated)
+CATEGORY_FACTOR: Dict[str, Optional[float]] = {
+    "Incident": 0.5,
+    "VIP Movement": 0.5,
+    "Routine": 2.0,
+    "Handover": None,
+}
+EVENT_HISTORY = 500     # Escalation events kept for polling clients
+RETRY_SECONDS = 5       # Pause after an unexpected failure in the timer loop
+
+class EscalationEvent(BaseModel):
+    seq: int
+    note_id: str
+    subject: str
+    priority: str
+    category: str
+    kind: str            # "acknowledgement" or "resolution"
+    sla_minutes: int
+    deadline: str
+    escalated_at: str
+
+def sla_minutes(priority: str, category: str) -> Dict[str, int]:
+    """SLA per kind for a note; kinds without one are left out."""
+    factor = CATEGORY_FACTOR.get(category, 1.0)
+    if factor is None:
+        return {}
+    slas = SLA_MINUTES.get(priority, SLA_MINUTES["Normal"])
+    return {kind: max(round(m * factor), 1) for kind, m in slas.items() if m is not None}
+
+def _stamp(epoch: float) -> str:
+    return datetime.fromtimestamp(epoch).strftime("%Y-%m-%d %H:%M:%S")
+
+# Called with (note_id, kind, deadline) for each due timer; returns the event to publish, or None if moot
+DueHandler = Callable[[str, str, float], Optional[EscalationEvent]]
+
+class EscalationScheduler:
+    def __init__(self, on_due: DueHandler):
+        self.on_due = on_due
+        self._heap: List[Tuple[float, int, str, str]] = []        # (deadline, seq, note_id, kind)
+        self._live: Dict[Tuple[str, str], Tuple[int, float]] = {} # (note_id, kind) -> (seq, deadline)
+        self._seq = itertools.count()
+        self._lock = threading.Lock()
+
+        self.events: Deque[EscalationEvent] = deque(maxlen=EVENT_HISTORY)
+        self.listeners: List[Callable[[EscalationEvent], None]] = []
+        self._event_seq = itertools.count(1)
+
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._wake: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+
+    # --- Timers ---
+
+    def schedule(self, note_id: str, kind: str, deadline: float):
+        """(Re)arms the timer for `kind` on a note. Safe from any thread."""
+        with self._lock:
+            seq = next(self._seq)
+            self._live[(note_id, kind)] = (seq, deadline)
+            sooner = not self._heap or deadline < self._heap[0][0]
+            heapq.heappush(self._heap, (deadline, seq, note_id, kind))
+            self._compact()
+        if sooner:
+            self._poke()
+
+    def cancel(self, note_id: str, kinds: Iterable[str] = KINDS):
+        with self._lock:
+            for kind in kinds:
+                self._live.pop((note_id, kind), None)
+
+    def pending(self) -> int:
+        return len(self._live)
+
+    def _compact(self):
+        # Cancelled entries wait in the heap until they surface; rebuild if they pile up
+        if len(self._heap) > 2 * len(self._live) + 64:
+            self._heap = [(d, seq, note, kind) for (note, kind), (seq, d) in self._live.items()]
+            heapq.heapify(self._heap)
+
+    def _pop_due(self, now: float) -> List[Tuple[str, str, float]]:
+        due = []
+        with self._lock:
+            while self._heap and self._heap[0][0] <= now:
+                deadline, seq, note_id, kind = heapq.heappop(self._heap)
+                if self._live.get((note_id, kind), (None,))[0] == seq:
+                    del self._live[(note_id, kind)]
+                    due.append((note_id, kind, deadline))
+        return due
+
+    def next_deadline(self) -> Optional[float]:
+        with self._lock:
+            while self._heap and self._live.get(self._heap[0][2:], (None,))[0] != self._heap[0][1]:
+                heapq.heappop(self._heap)
+            return self._heap[0][0] if self._heap else None
+
+    def run_due(self, now: Optional[float] = None) -> List[EscalationEvent]:
+        """Escalates every timer due by `now` and publishes the events."""
+        published = []
+        for note_id, kind, deadline in self._pop_due(time.time() if now is None else now):
+            # One failing note must not stop the others (or the timer task)
+            try:
+                event = self.on_due(note_id, kind, deadline)
+            except Exception as e:
+                print(f"Escalation of {note_id} ({kind}) failed:", repr(e))
+                continue
+            if event is not None:
+                published.append(self.publish(event))
+        return published
+
+    # --- Events ---
+
+    def publish(self, event: EscalationEvent) -> EscalationEvent:
+        event = event.model_copy(update={"seq": next(self._event_seq)})
+        self.events.append(event)
+        for listener in list(self.listeners):
+            try:
+                listener(event)
+            except Exception as e:
+                print(f"Escalation listener failed on event {event.seq}:", repr(e))
+        return event
+
+    def events_after(self, seq: int = 0) -> List[EscalationEvent]:
+        return [e for e in list(self.events) if e.seq > seq]
+
+    # --- Background task ---
+
+    def _poke(self):
+        loop, wake = self._loop, self._wake
+        if loop is not None and wake is not None and not loop.is_closed():
+            loop.call_soon_threadsafe(wake.set)
+
+    async def _run(self):
+        while True:
+            self._wake.clear()
+            try:
+                self.run_due()
+                deadline = self.next_deadline()
+                timeout = None if deadline is None else max(deadline - time.time(), 0)
+            except Exception as e:
+                # Keep the task alive: a dead loop would silently stop every SLA
+                print("Escalation scheduler error, retrying:", repr(e))
+                timeout = RETRY_SECONDS
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+
+    def start(self):
+        """Starts the timer task on the running loop (call from the app lifespan)."""
+        if self._task is not None and not self._task.done():
+            return
+        self._loop = asyncio.get_running_loop()
+        self._wake = asyncio.Event()
+        self._task = asyncio.ensure_future(self._run())
+
+    async def stop(self):
+        task, self._task = self._task, None
+        self._loop = self._wake = None
+        if task is not None:
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
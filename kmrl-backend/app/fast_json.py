@@ -0,0 +1,19 @@
+from typing import Any
+
+from fastapi.responses import JSONResponse
+from pydantic_core import to_json
+
+# ---------------- Fast JSON Path ----------------
+# FastAPI's default path validates the return value against response_model and
+# then walks it with jsonable_encoder in Python. For large payloads of data we
+# built ourselves, serialize straight to bytes in pydantic-core (Rust) instead.
+# Models, dicts, lists, enums and datetimes are all handled natively.
+
+def dumps(content: Any) -> bytes:
+    return to_json(content)
+
+class FastJSONResponse(JSONResponse):
+    """Return this from a handler to skip response_model re-validation and jsonable_encoder."""
+
+    def render(self, content: Any) -> bytes:
+        return to_json(content)
@@ -1,9 +1,20 @@
-from fastapi import APIRouter, HTTPException
-from pydantic import BaseModel
+from fastapi import APIRouter, HTTPException, Query, Request
+from pydantic import BaseModel, Field
 from typing import List, Optional, Dict
 import random
+import threading
+import time
 from datetime import datetime, timedelta
 
+import numpy as np
+
+from app.stations import SERVICE_HOURS, STATION_REGISTRY, STATION_NAMES
+from app.timetable import forecast_demand, plan_headways, planned_load_percent, rakes_required
+from app.maintenance import (DEPOTS, SERVICE_KM_PER_DAY, Induction, RakeRecord, km_to_due,
+                             mock_rake_records, plan_maintenance)
+from app.concurrency import single_flight
+from app.http_cache import ResponseCache, StoreVersion, parse_version_token, version_token
+
 fleet_router = APIRouter(prefix="/fleet", tags=["Fleet Management"])
 
 # --- Models ---
@@ -15,6 +26,7 @@ class TrainDetail(BaseModel):
     delay_minutes: int = 0
     km_run_today: float = 0.0
     ridership_load: float = 0.0 # Percentage 0-100
+    odometer_km: float = 0.0 # Cumulative, from the maintenance records
 
 class FleetStatus(BaseModel):
     availability: float
@@ -25,6 +37,10 @@ class FleetStatus(BaseModel):
     active_trains: int
     train_details: List[TrainDetail]
 
+class FleetDelta(FleetStatus):
+    version: str
+    full: bool  # False -> train_details holds only trains changed since the client's version
+
 class TripRequest(BaseModel):
     id: str
     route_name: str
@@ -41,8 +57,51 @@ class AssignmentResult(BaseModel):
 class AssignmentRequest(BaseModel):
     trips: List[TripRequest]
 
+class MaintenancePlanRequest(BaseModel):
+    days: int = Field(30, ge=1, le=120)
+    service_rakes: Optional[int] = Field(None, ge=0) # Default: what the forecast timetable needs at peak
+    apply: bool = False # Put tonight's inductions into the fleet
+
+class MaintenanceJob(BaseModel):
+    train_id: str
+    kind: str
+    depot: str
+    nights_left: int
+
+class MaintenanceDay(BaseModel):
+    date: str
+    service: int
+    standby: List[str]
+    maintenance: List[MaintenanceJob]
+    inducted: List[str]
+    deferred: List[str] # Due, but no suitable bay was free
+    shortfall: int
+
+class MaintenancePlan(BaseModel):
+    service_rakes: int
+    odometer_spread_km: Dict[str, float] # Max - min odometer at the start / end of the horizon
+    bay_nights: Dict[str, int] # Per depot over the horizon
+    deferred_total: int
+    elapsed_ms: float
+    trains_updated: int
+    days: List[MaintenanceDay]
+
 # --- Logic ---
 
+def _ridership_load(line_load: np.ndarray, station: int, direction: int, hour: int) -> float:
+    """% of capacity on the segment a rake leaves `station` on; it turns back at the termini."""
+    last = line_load.shape[1]
+    if (direction == 0 and station >= last) or (direction == 1 and station == 0):
+        direction = 1 - direction
+    segment = station if direction == 0 else station - 1
+    # The mock fleet runs around the clock; outside service hours use the nearest one
+    hour = min(max(hour - SERVICE_HOURS[0], 0), line_load.shape[2] - 1)
+    return float(line_load[direction, segment, hour])
+
+# Cumulative km / maintenance history per rake, and who is in a depot bay tonight
+RAKE_RECORDS: Dict[str, RakeRecord] = {}
+DEPOT_BAYS: Dict[str, Induction] = {}
+
 def _generate_mock_fleet(total_fleet=25) -> List[TrainDetail]:
     """
     Generates a consistent mock fleet state for both Fleet Status and Assignment modules.
@@ -54,30 +113,34 @@ def _generate_mock_fleet(total_fleet=25) -> List[TrainDetail]:
     now = datetime.now()
     start_of_service = now.replace(hour=6, minute=0, second=0, microsecond=0)
     current_hour = now.hour
+    demand = forecast_demand(now.weekday())
+    line_load = planned_load_percent(demand, total_fleet)
+
+    # Tonight's depot induction decides who is in maintenance / service / standby
+    ids = [f"TM-{100+i}" for i in range(1, total_fleet + 1)]
+    for record in mock_rake_records([i for i in ids if i not in RAKE_RECORDS]):
+        RAKE_RECORDS[record.id] = record
+    tonight = plan_maintenance([RAKE_RECORDS[i] for i in ids], 1,
+                               rakes_required(plan_headways(demand, total_fleet)), DEPOT_BAYS)[0]
+    DEPOT_BAYS.clear()
+    DEPOT_BAYS.update({job.rake: job for job in tonight.maintenance})
     
     for i in range(1, total_fleet + 1):
         train_id = f"TM-{100+i}"
         delay = 0
 
         # Status Logic
-        if i == 5:
+        if train_id in DEPOT_BAYS:
              status = "Maintenance"
-             loc = "Aluva Depot"
-        elif i == 12:
-             status = "Maintenance"
-             loc = "Muttom Yard"
-        elif i == 18:
-             status = "Maintenance"
-             loc = "Pettah Terminal"
+             loc = DEPOT_BAYS[train_id].depot
         else:
-             status = "In Service" if i % 2 == 0 else "Available"
-             loc = f"Station {chr(65 + (i%5))}" if status == "In Service" else "Depot"
+             status = "In Service" if train_id in tonight.service else "Available"
+             # Spread in-service rakes along the line
+             loc = STATION_NAMES[(i * 7) % len(STATION_NAMES)] if status == "In Service" else "Depot"
         
         # --- Metrics Calculation ---
         if status == "In Service":
-            # Delays
-            if random.random() < 0.15: 
-                delay = random.randint(2, 12)
+            # Delays come from the line simulator (app.simulator.sync_fleet), not per-train dice
             
             # 1. KM Run Calculation
             if now < start_of_service:
@@ -89,27 +152,9 @@ def _generate_mock_fleet(total_fleet=25) -> List[TrainDetail]:
                 km_run *= random.uniform(0.85, 1.15)
                 km_run = round(max(0.0, km_run), 1)
 
-            # 2. Ridership Load Calculation
-            if 8 <= current_hour < 11: # Morning Peak
-                base_load = random.uniform(80, 90)
-            elif 17 <= current_hour < 20: # Evening Peak
-                base_load = random.uniform(85, 95)
-            elif 11 <= current_hour < 17: # Mid-Day
-                base_load = random.uniform(40, 60)
-            else: 
-                base_load = random.uniform(10, 30)
-
-            # Station Tier Multiplier
-            if loc in ["Aluva", "Edapally", "M.G. Road", "Maharaja's College", "Vytila"]:
-                tier_multiplier = 1.2
-            elif loc in ["Kalamassery", "Kaloor", "JLN Stadium", "Palarivattom", "Ernakulam South", "Petta"]:
-                tier_multiplier = 1.0
-            else:
-                tier_multiplier = 0.7
-            
-            ridership_load = base_load * tier_multiplier
-            ridership_load *= random.uniform(0.9, 1.1)
-            ridership_load = round(min(120.0, max(0.0, ridership_load)), 1)
+            # 2. Ridership Load: forecast line load at the rake's position under the planned service
+            ridership_load = _ridership_load(line_load, STATION_REGISTRY.id_of(loc), (i // 2) % 2, current_hour)
+            ridership_load = round(min(120.0, ridership_load), 1)
             
         else:
             # "Available" or "Maintenance"
@@ -126,21 +171,48 @@ def _generate_mock_fleet(total_fleet=25) -> List[TrainDetail]:
             location=loc, 
             delay_minutes=delay,
             km_run_today=km_run,
-            ridership_load=ridership_load
+            ridership_load=ridership_load,
+            odometer_km=RAKE_RECORDS[train_id].odometer_km
         ))
         
     return train_details
 
 # --- Internal API for other modules ---
+# Copy-on-write like the conflicts store: writers swap in a new list under
+# FLEET_WRITE_LOCK; FLEET_CHANGED records the version at which each train changed.
 FLEET_DB = _generate_mock_fleet(25)
+FLEET_WRITE_LOCK = threading.Lock()
+FLEET_VERSION = StoreVersion()
+FLEET_CHANGED: Dict[str, int] = {}
+FLEET_CACHE = ResponseCache("fleet")
+
+def update_train(train_id: str, **changes) -> TrainDetail:
+    """Replaces one train's record (e.g. status, location, delay_minutes) and bumps the fleet version."""
+    return update_trains({train_id: changes})[0]
+
+def update_trains(changes: Dict[str, dict]) -> List[TrainDetail]:
+    """Applies per-train field changes in one swap and one version bump (e.g. a simulator sync)."""
+    global FLEET_DB
+    with FLEET_WRITE_LOCK:
+        current = {t.id: t for t in FLEET_DB}
+        missing = [train_id for train_id in changes if train_id not in current]
+        if missing:
+            raise HTTPException(status_code=404, detail=f"Train not found: {', '.join(missing)}")
+        updated = {train_id: current[train_id].model_copy(update=fields) for train_id, fields in changes.items()}
+        for train_id in updated:
+            FLEET_CHANGED[train_id] = FLEET_VERSION.value + 1
+        FLEET_DB = [updated.get(t.id, t) for t in FLEET_DB]
+        FLEET_VERSION.bump()
+    return list(updated.values())
 
 def get_all_trains() -> List[TrainDetail]:
     return FLEET_DB
 
 # --- Endpoints ---
 
-@fleet_router.get("/", response_model=FleetStatus)
-def get_fleet_status():
+@single_flight()
+def _fleet_status(version: int) -> FleetStatus:
+    """Fleet KPIs; `version` keys the shared flight so no caller joins a build older than what it has seen."""
     total_fleet = 25 
     train_details = FLEET_DB
     
@@ -164,6 +236,91 @@ def get_fleet_status():
         train_details=train_details
     )
 
+@fleet_router.get("/", response_model=FleetStatus)
+def get_fleet_status(
+    request: Request,
+    since: Optional[str] = Query(None, description="Delta mode: X-Version from a previous response"),
+):
+    """Fleet KPIs and train details. With `since`, only trains changed after that version."""
+    current = FLEET_VERSION.value
+    version = version_token(current)
+
+    def build():
+        status = _fleet_status(current)
+        if since is None:
+            return status, {"X-Version": version}
+        changed_since = parse_version_token(since)
+        details = status.train_details
+        if changed_since is not None:
+            details = [t for t in details if FLEET_CHANGED.get(t.id, 0) > changed_since]
+        delta = FleetDelta(**status.model_dump(exclude={"train_details"}), train_details=details,
+                           version=version, full=changed_since is None)
+        return delta, {"X-Version": version}
+
+    return FLEET_CACHE.respond(request, (current,), build)
+
+@fleet_router.post("/maintenance-plan", response_model=MaintenancePlan)
+def plan_depot_induction(req: MaintenancePlanRequest):
+    """Nightly service / standby / maintenance decisions over the next `days` days."""
+    started = time.perf_counter()
+    records = [RAKE_RECORDS[t.id] for t in FLEET_DB if t.id in RAKE_RECORDS]
+    service_rakes = req.service_rakes
+    if service_rakes is None:
+        service_rakes = rakes_required(plan_headways(forecast_demand(datetime.now().weekday()), len(records)))
+    plans = plan_maintenance(records, req.days, service_rakes, DEPOT_BAYS)
+    elapsed = (time.perf_counter() - started) * 1000
+
+    start = {r.id: r.odometer_km for r in records}
+    end = dict(start)
+    bay_nights = {d.name: 0 for d in DEPOTS}
+    for day in plans:
+        for rake in day.service:
+            end[rake] += SERVICE_KM_PER_DAY
+        for job in day.maintenance:
+            bay_nights[job.depot] += 1
+
+    updated = 0
+    if req.apply:
+        tonight = {job.rake: job for job in plans[0].maintenance}
+        changes = {}
+        for t in FLEET_DB:
+            if t.id in tonight:
+                if t.status != "Maintenance" or t.location != tonight[t.id].depot:
+                    changes[t.id] = {"status": "Maintenance", "location": tonight[t.id].depot, "ridership_load": 0.0}
+            elif t.status == "Maintenance":
+                changes[t.id] = {"status": "Available", "location": "Depot"}
+        if changes:
+            update_trains(changes)
+        DEPOT_BAYS.clear()
+        DEPOT_BAYS.update(tonight)
+        updated = len(changes)
+
+    today = datetime.now().date()
+    return MaintenancePlan(
+        service_rakes=service_rakes,
+        odometer_spread_km={
+            "start": round(max(start.values()) - min(start.values()), 1) if start else 0.0,
+            "end": round(max(end.values()) - min(end.values()), 1) if end else 0.0,
+        },
+        bay_nights=bay_nights,
+        deferred_total=sum(len(day.deferred) for day in plans),
+        elapsed_ms=round(elapsed, 2),
+        trains_updated=updated,
+        days=[
+            MaintenanceDay(
+                date=(today + timedelta(days=day.day)).isoformat(),
+                service=len(day.service),
+                standby=day.standby,
+                maintenance=[MaintenanceJob(train_id=j.rake, kind=j.kind, depot=j.depot, nights_left=j.nights_left)
+                             for j in day.maintenance],
+                inducted=day.inducted,
+                deferred=day.deferred,
+                shortfall=day.shortfall,
+            )
+            for day in plans
+        ],
+    )
+
 @fleet_router.post("/assign-trains")
 def assign_trains_endpoint(data: AssignmentRequest):
     assignments = []
@@ -173,20 +330,21 @@ def assign_trains_endpoint(data: AssignmentRequest):
     
     # Filter for "Available" trains only
     available_trains = [
-        {"id": t.id, "km_run": t.km_run_today} 
+        {"id": t.id, "km_run": t.km_run_today, "km_to_due": km_to_due(RAKE_RECORDS[t.id]) if t.id in RAKE_RECORDS else 0.0} 
         for t in all_trains 
         if t.status == "Available"
     ]
     
-    # 2. Sort Trains: Fresher first (Lowest KM)
-    available_trains.sort(key=lambda x: x['km_run'])
+    # 2. Sort Trains: most km left before their next maintenance first, then fresher today (Lowest KM)
+    available_trains.sort(key=lambda x: (-x['km_to_due'], x['km_run']))
     
     # 3. Analyze Trips & Assign Priority
     prioritized_trips = []
     for trip in data.trips:
         hour = int(trip.start_time.split(':')[0])
         is_peak = (8 <= hour <= 10) or (17 <= hour <= 19)
-        is_hub_start = trip.origin_station in ["Aluva", "Pettah", "SN Junction"]
+        origin = STATION_REGISTRY.get(trip.origin_station)
+        is_hub_start = origin is not None and origin.is_hub
         
         score = 0
         if is_peak: score += 2
@@ -0,0 +1,106 @@
+import os
+import re
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from app.llm_parsing import extract_json
+from app.stations import STATION_REGISTRY, TIER_LABELS
+
+# ---------------- Grid Forecast Prompt Packing ----------------
+# A dashboard wants dates x times x stations in one go. Each (date, time) pair is
+# a "slot"; slots are packed into as few prompts as fit the token budget.
+# Stations are sent as registry codes with the tier table once per prompt, and
+# the model answers one compact row of numbers per slot.
+
+PROMPT_TOKEN_BUDGET = int(os.getenv("LLM_PROMPT_TOKEN_BUDGET", "8000"))  # Prompt + expected answer
+CHARS_PER_TOKEN = 4
+TOKENS_PER_VALUE = 3  # "12345," in the answer
+
+Slot = Tuple[int, int]  # (date index, time index)
+
+_ROW = re.compile(r'"d(\d+)t(\d+)"\s*:\s*\[([^\]\[]*)\]')
+
+def estimate_tokens(text: str) -> int:
+    return len(text) // CHARS_PER_TOKEN + 1
+
+def station_code(name: str) -> str:
+    return f"S{STATION_REGISTRY.id_of(name)}"
+
+def _header(stations: List[str], weather: str) -> str:
+    table = []
+    for tier, label in TIER_LABELS.items():
+        codes = [station_code(st) for st in stations if STATION_REGISTRY.resolve(st).tier == tier]
+        if codes:
+            table.append(f"T{tier} ({label}): {' '.join(codes)}")
+    order = " ".join(station_code(st) for st in stations)
+    return (
+        "Kochi Metro hourly ridership forecaster.\n"
+        "Station codes: " + ", ".join(f"{station_code(st)}={STATION_REGISTRY.canonical(st)}" for st in stations) + "\n"
+        + "\n".join(table) + "\n"
+        f"Weather: {weather}\n"
+        f"Column order: {order}\n"
+        "For each slot give passengers per station in column order.\n"
+        'Respond ONLY in JSON: {"d0t0": [n, n, ...], ...}\n'
+        "Slots:\n"
+    )
+
+def _slot_line(slot: Slot, dates: List[str], times: List[str], holidays: List[bool]) -> str:
+    d, t = slot
+    try:
+        day = datetime.strptime(dates[d], "%Y-%m-%d").strftime("%a")
+    except ValueError:
+        day = "?"
+    return f"d{d}t{t} {dates[d]} {day} {times[t]}{' holiday' if holidays[d] else ''}\n"
+
+def pack_prompts(stations: List[str], dates: List[str], times: List[str], weather: str,
+                 holidays: List[bool], slots: Optional[List[Slot]] = None,
+                 budget: int = PROMPT_TOKEN_BUDGET) -> List[Tuple[str, List[Slot]]]:
+    """Greedily fills prompts with slots up to `budget` tokens (prompt + expected answer)."""
+    if slots is None:
+        slots = [(d, t) for d in range(len(dates)) for t in range(len(times))]
+    header = _header(stations, weather)
+    answer_per_slot = TOKENS_PER_VALUE * len(stations) + 4
+
+    prompts = []
+    body, chunk, used = [], [], estimate_tokens(header)
+    for slot in slots:
+        line = _slot_line(slot, dates, times, holidays)
+        cost = estimate_tokens(line) + answer_per_slot
+        if chunk and used + cost > budget:
+            prompts.append((header + "".join(body), chunk))
+            body, chunk, used = [], [], estimate_tokens(header)
+        body.append(line)
+        chunk.append(slot)
+        used += cost
+    if chunk:
+        prompts.append((header + "".join(body), chunk))
+    return prompts
+
+def parse_grid(text: str, slots: List[Slot], n_stations: int) -> Dict[Slot, np.ndarray]:
+    """Rows for the requested slots; unusable values are NaN so the caller can fill them locally."""
+    obj = extract_json(text)
+    if obj is not None:
+        raw = obj.items()
+    else:
+        # Truncated answer: keep every complete row
+        raw = ((f"d{d}t{t}", body.split(",")) for d, t, body in _ROW.findall(text))
+
+    wanted = set(slots)
+    rows = {}
+    for key, values in raw:
+        m = re.fullmatch(r"d(\d+)t(\d+)", key)
+        if not m or not isinstance(values, list):
+            continue
+        slot = (int(m.group(1)), int(m.group(2)))
+        if slot not in wanted:
+            continue
+        row = np.full(n_stations, np.nan)
+        for i, v in enumerate(values[:n_stations]):
+            try:
+                row[i] = max(float(v), 0.0)
+            except (TypeError, ValueError):
+                pass
+        rows[slot] = row
+    return rows
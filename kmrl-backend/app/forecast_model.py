@@ -0,0 +1,272 @@
+import os
+import csv
+import hashlib
+import threading
+from datetime import datetime
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from app.stations import STATION_REGISTRY, STATION_NAMES, SERVICE_HOURS, TIER_DAILY
+
+# ---------------- Config ----------------
+# "gemini" -> LLM first, local model as fallback
+# "local"  -> local model only (LLM never on the request path)
+FORECAST_ENGINE = os.getenv("FORECAST_ENGINE", "gemini").lower()
+# Anchored to the backend directory, not the working directory of whoever starts the server
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+MODEL_PATH = os.getenv("FORECAST_MODEL_PATH", os.path.join(BACKEND_DIR, "forecast_model.npz"))
+HISTORY_PATH = os.getenv("RIDERSHIP_HISTORY_PATH")
+
+HOURS = np.array(SERVICE_HOURS)  # One slot per service hour
+WEATHER_CLASSES = ["Clear", "Clouds", "Rain", "Storm"]
+
+# Raw OpenWeather / UI labels -> model weather class
+WEATHER_ALIASES = {
+    "Clear": "Clear", "Sunny": "Clear",
+    "Clouds": "Clouds", "Cloudy": "Clouds", "Mist": "Clouds", "Haze": "Clouds", "Fog": "Clouds",
+    "Rain": "Rain", "Drizzle": "Rain",
+    "Storm": "Storm", "Thunderstorm": "Storm",
+}
+
+# ---------------- Helpers ----------------
+
+def weather_class(weather: Optional[str]) -> int:
+    return WEATHER_CLASSES.index(WEATHER_ALIASES.get(weather or "Clear", "Clear"))
+
+def _features(weather_idx, holiday) -> np.ndarray:
+    """Regressor design matrix: one-hot weather (Clear is the baseline) + holiday flag."""
+    weather_idx = np.asarray(weather_idx)
+    x = np.zeros(weather_idx.shape + (len(WEATHER_CLASSES),))
+    for k in range(1, len(WEATHER_CLASSES)):
+        x[..., k - 1] = weather_idx == k
+    x[..., -1] = np.asarray(holiday, dtype=float)
+    return x
+
+def _group_mean(values: np.ndarray, groups: np.ndarray, n_groups: int) -> np.ndarray:
+    sums = np.bincount(groups, weights=values, minlength=n_groups)
+    counts = np.bincount(groups, minlength=n_groups)
+    return np.divide(sums, counts, out=np.zeros(n_groups), where=counts > 0)
+
+# ---------------- Model ----------------
+
+class SeasonalForecaster:
+    """
+    Log-linear seasonal model:
+        log(riders[s, h, d]) = base[s, h] + weekday[s, dow(d)] + beta . [weather, holiday]
+    All stations x service hours are predicted in one vectorised call.
+    """
+
+    def __init__(self, stations: List[str], base: np.ndarray, weekday: np.ndarray, beta: np.ndarray):
+        self.stations = list(stations)
+        self.station_index = {s: i for i, s in enumerate(self.stations)}
+        self.base = base          # [stations, hours]
+        self.weekday = weekday    # [stations, 7]
+        self.beta = beta          # [weather one-hot (3) + holiday]
+
+    # --- Fitting ---
+
+    @classmethod
+    def fit(cls, stations: List[str], station_idx, hour_idx, dow, weather_idx, holiday, riders, iterations: int = 4):
+        """Backfitting on log ridership. All inputs are flat, equally sized arrays."""
+        n_st, n_h = len(stations), len(HOURS)
+        station_idx = np.asarray(station_idx)
+        hour_idx = np.asarray(hour_idx)
+        dow = np.asarray(dow)
+        y = np.log1p(np.asarray(riders, dtype=float))
+        x = _features(weather_idx, holiday)
+
+        sh = station_idx * n_h + hour_idx
+        sd = station_idx * 7 + dow
+        base = np.zeros(n_st * n_h)
+        weekday = np.zeros(n_st * 7)
+        beta = np.zeros(x.shape[1])
+
+        for _ in range(iterations):
+            reg = x @ beta
+            base = _group_mean(y - weekday[sd] - reg, sh, n_st * n_h)
+            weekday = _group_mean(y - base[sh] - reg, sd, n_st * 7)
+            # Centre weekday effects per station so base carries the level
+            weekday = (weekday.reshape(n_st, 7) - weekday.reshape(n_st, 7).mean(axis=1, keepdims=True)).ravel()
+            beta = np.linalg.lstsq(x, y - base[sh] - weekday[sd], rcond=None)[0]
+
+        return cls(stations, base.reshape(n_st, n_h), weekday.reshape(n_st, 7), beta)
+
+    # --- Prediction ---
+
+    def predict_grid(self, dow: int, weather: Optional[str] = None, holiday: bool = False) -> np.ndarray:
+        """Hourly ridership for every station x service hour -> array [stations, hours]."""
+        shift = _features(weather_class(weather), holiday) @ self.beta
+        return np.expm1(self.base + self.weekday[:, dow][:, None] + shift)
+
+    def predict_daily(self, dow: int, weather: Optional[str] = None, holiday: bool = False) -> np.ndarray:
+        return self.predict_grid(dow, weather, holiday).sum(axis=1)
+
+    def index_of(self, station: str) -> Optional[int]:
+        known = STATION_REGISTRY.get(station)
+        return self.station_index.get(known.name) if known else None
+
+    def predict_station_hour(self, station: str, dow: int, hour: int, weather: Optional[str] = None, holiday: bool = False) -> Optional[float]:
+        i = self.index_of(station)
+        if i is None or not (HOURS[0] <= hour <= HOURS[-1]):
+            return None
+        shift = _features(weather_class(weather), holiday) @ self.beta
+        return float(np.expm1(self.base[i, hour - HOURS[0]] + self.weekday[i, dow] + shift))
+
+    # --- Persistence ---
+
+    def save(self, path: str, source: str = ""):
+        """`source` fingerprints the training data, so a stale file can be told apart."""
+        np.savez(path, stations=np.array(self.stations), base=self.base, weekday=self.weekday, beta=self.beta,
+                 source=np.array(source))
+
+    @classmethod
+    def load(cls, path: str) -> "SeasonalForecaster":
+        with np.load(path) as data:
+            return cls([str(s) for s in data["stations"]], data["base"], data["weekday"], data["beta"])
+
+    @staticmethod
+    def saved_source(path: str) -> Optional[str]:
+        with np.load(path) as data:
+            return str(data["source"]) if "source" in data.files else None
+
+# ---------------- Training Data ----------------
+
+def load_history(path: str):
+    """
+    Reads historical ridership CSV with columns:
+    date (YYYY-MM-DD), hour (0-23), station, passengers, weather, holiday (0/1)
+    """
+    cols = ([], [], [], [], [], [])
+    with open(path, newline="") as f:
+        for row in csv.DictReader(f):
+            hour = int(row["hour"])
+            station = STATION_REGISTRY.get(row["station"])
+            if station is None:
+                print("Skipping history row for unknown station:", row["station"])
+                continue
+            if not (HOURS[0] <= hour <= HOURS[-1]):
+                continue
+            cols[0].append(station.id)
+            cols[1].append(hour - HOURS[0])
+            cols[2].append(datetime.strptime(row["date"], "%Y-%m-%d").weekday())
+            cols[3].append(weather_class(row.get("weather")))
+            cols[4].append(row.get("holiday", "0") in ("1", "true", "True"))
+            cols[5].append(float(row["passengers"]))
+    return cols
+
+def synthetic_history(days: int = 120, seed: int = 42):
+    """
+    Deterministic bootstrap history built from the registry tier/curve planning
+    assumptions. Used only until real AFC data is supplied via RIDERSHIP_HISTORY_PATH.
+    """
+    rng = np.random.default_rng(seed)
+    n_st, n_h = len(STATION_REGISTRY), len(HOURS)
+
+    daily = np.array([TIER_DAILY[t] for t in STATION_REGISTRY.tier])
+    profile = daily[:, None] * STATION_REGISTRY.demand_matrix()
+
+    dow = np.arange(days) % 7
+    weather_idx = rng.choice(len(WEATHER_CLASSES), size=days, p=[0.45, 0.3, 0.2, 0.05])
+    holiday = rng.random(days) < 0.05
+    factor = (np.where(dow >= 5, 1.2, 1.0) * np.where(holiday, 1.3, 1.0)
+              * np.array([1.0, 0.97, 0.9, 0.8])[weather_idx])
+
+    riders = profile[None] * factor[:, None, None] * rng.lognormal(0, 0.1, (days, n_st, n_h))
+    d, s, h = np.meshgrid(np.arange(days), np.arange(n_st), np.arange(n_h), indexing="ij")
+    return s.ravel(), h.ravel(), dow[d].ravel(), weather_idx[d].ravel(), holiday[d].ravel(), riders.ravel()
+
+SYNTHETIC_SOURCE = "synthetic:v1"
+
+def training_source() -> str:
+    """Fingerprint of the data the model should be trained on: the history file's hash, or the bootstrap."""
+    if HISTORY_PATH and os.path.exists(HISTORY_PATH):
+        digest = hashlib.sha256()
+        with open(HISTORY_PATH, "rb") as f:
+            for chunk in iter(lambda: f.read(1 << 20), b""):
+                digest.update(chunk)
+        return f"history:{digest.hexdigest()}"
+    stations = hashlib.sha256("|".join(STATION_NAMES).encode()).hexdigest()[:16]
+    return f"{SYNTHETIC_SOURCE}:{stations}"
+
+# ---------------- Loader (once per process) ----------------
+
+_MODEL: Optional[SeasonalForecaster] = None
+_MODEL_LOCK = threading.Lock()
+
+def get_model() -> SeasonalForecaster:
+    if _MODEL is not None:
+        return _MODEL
+    with _MODEL_LOCK:
+        return _load_model()
+
+def _load_model() -> SeasonalForecaster:
+    global _MODEL
+    if _MODEL is not None:
+        return _MODEL
+
+    # A saved model is reused only if it was trained on the same data (e.g. not the
+    # bootstrap after RIDERSHIP_HISTORY_PATH was set, nor an older history file)
+    source = training_source()
+    if os.path.exists(MODEL_PATH) and SeasonalForecaster.saved_source(MODEL_PATH) == source:
+        _MODEL = SeasonalForecaster.load(MODEL_PATH)
+        return _MODEL
+
+    history = load_history(HISTORY_PATH) if source.startswith("history:") else synthetic_history()
+    _MODEL = SeasonalForecaster.fit(STATION_NAMES, *history)
+    try:
+        _MODEL.save(MODEL_PATH, source)
+    except OSError as e:
+        print("Could not persist forecast model:", e)
+    return _MODEL
+
+def _day_of_week(date: str, day_name: Optional[str]) -> int:
+    days = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"]
+    if day_name in days:
+        return days.index(day_name)
+    try:
+        return datetime.strptime(date, "%Y-%m-%d").weekday()
+    except ValueError:
+        return 0
+
+def local_forecast(station: str, date: str, time: str, weather: Optional[str] = None,
+                   holiday: bool = False, day_of_week: Optional[str] = None) -> Optional[int]:
+    """Hourly demand at one station. None if the station/hour is outside the model."""
+    try:
+        hour = int(time.split(":")[0])
+    except ValueError:
+        return None
+    value = get_model().predict_station_hour(station, _day_of_week(date, day_of_week), hour, weather, holiday)
+    return None if value is None else int(value)
+
+def local_batch_forecast(stations: List[str], date: str, weather: Optional[str] = None,
+                         holiday: bool = False, day_of_week: Optional[str] = None) -> Dict[str, int]:
+    """Daily demand per requested station from a single vectorised grid prediction."""
+    model = get_model()
+    daily = model.predict_daily(_day_of_week(date, day_of_week), weather, holiday)
+    result = {}
+    for st in stations:
+        i = model.index_of(st)
+        if i is None:
+            print("Local forecast: unknown station", st)
+            continue
+        result[st] = int(daily[i])
+    return result
+
+def local_grid_forecast(stations: List[str], dates: List[str], times: List[str], weather: Optional[str] = None,
+                        holidays: Optional[List[bool]] = None) -> np.ndarray:
+    """
+    Hourly demand as a dense array [dates, times, stations]. Stations must be
+    known to the registry; times outside service hours are 0 (line closed).
+    """
+    model = get_model()
+    cols = np.array([model.index_of(st) for st in stations])
+    hours = np.array([int(t.split(":")[0]) for t in times])
+    open_ = (hours >= HOURS[0]) & (hours <= HOURS[-1])
+    hour_idx = np.clip(hours - HOURS[0], 0, len(HOURS) - 1)
+
+    out = np.zeros((len(dates), len(times), len(stations)))
+    for d, date in enumerate(dates):
+        grid = model.predict_grid(_day_of_week(date, None), weather, bool(holidays and holidays[d]))
+        out[d] = grid[cols][:, hour_idx].T * open_[:, None]
+    return out
@@ -0,0 +1,104 @@
+import uuid
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple
+from urllib.parse import urlencode
+
+from fastapi import Request, Response
+
+from app.fast_json import dumps
+
+# ---------------- Conditional GET / Response Cache ----------------
+# Each in-memory store keeps a version counter. A read endpoint's ETag is
+# derived from the versions it depends on and the (normalized) query, so
+# polling clients get a 304 with no serialization at all, and a
+# changed-but-already-served version is answered from the cached bytes.
+# Handlers validate their query parameters before calling respond(), so an
+# invalid request is a 422 even when its ETag would match.
+
+# Versions restart at 0 with the process; the boot id keeps old ETags from matching
+BOOT_ID = uuid.uuid4().hex[:8]
+
+class StoreVersion:
+    """Change counter for one store. Call bump() after the write is visible to readers."""
+
+    def __init__(self):
+        self._value = 0
+        self._lock = threading.Lock()
+
+    @property
+    def value(self) -> int:
+        return self._value
+
+    def bump(self) -> int:
+        with self._lock:
+            self._value += 1
+            return self._value
+
+# ---------------- Delta Sync Tokens ----------------
+# Clients on delta mode send back the last "version" they saw (?since=...).
+# Tokens carry the boot id: a token from another process means "send everything".
+
+def version_token(version: int) -> str:
+    return f"{BOOT_ID}.{version}"
+
+def parse_version_token(token: Optional[str]) -> Optional[int]:
+    """Version number from a token issued by this process, else None (full payload)."""
+    if not token:
+        return None
+    boot, _, version = token.partition(".")
+    if boot != BOOT_ID or not version.isdigit():
+        return None
+    return int(version)
+
+def _etag_matches(header: Optional[str], etag: str) -> bool:
+    if not header:
+        return False
+    tags = [t.strip() for t in header.split(",")]
+    return "*" in tags or etag in tags or f"W/{etag}" in tags
+
+class ResponseCache:
+    """Latest serialized body per (path, query string), bounded LRU."""
+
+    def __init__(self, name: str, max_entries: int = 64):
+        self.name = name
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, Tuple[str, bytes, Dict[str, str]]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def etag(self, version: Tuple[Hashable, ...], query: str = "") -> str:
+        tag = f'{BOOT_ID}-{self.name}-{"-".join(map(str, version))}'
+        if query:
+            # Each filter / page of an endpoint is a different representation
+            tag += "-" + hashlib.blake2b(query.encode(), digest_size=8).hexdigest()
+        return f'"{tag}"'
+
+    def respond(self, request: Request, version: Tuple[Hashable, ...],
+                build: Callable[[], Tuple[Any, Dict[str, str]]]) -> Response:
+        """
+        `version` must be read before the data `build` serializes, so a racing
+        write can only make a body newer than its ETag, never older.
+        `build` returns (content, extra headers).
+        """
+        # Parameter order doesn't change the representation
+        query = urlencode(sorted(request.query_params.multi_items()))
+        etag = self.etag(version, query)
+        if _etag_matches(request.headers.get("if-none-match"), etag):
+            return Response(status_code=304, headers={"ETag": etag})
+
+        key = f"{request.url.path}?{query}"
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+        if entry is None or entry[0] != etag:
+            content, headers = build()
+            entry = (etag, dumps(content), headers)
+            with self._lock:
+                self._entries[key] = entry
+                self._entries.move_to_end(key)
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+
+        return Response(entry[1], media_type="application/json", headers={**entry[2], "ETag": etag})
@@ -0,0 +1,232 @@
+import os
+import time
+import random
+import asyncio
+from collections import deque
+from typing import Awaitable, Callable, Deque, Optional
+
+import httpx
+import google.generativeai as genai
+from google.api_core import exceptions as google_exceptions
+
+# ---------------- Resilient LLM Client ----------------
+# Wraps the upstream model with per-call timeouts, jittered retries, a circuit
+# breaker and optional hedged requests. Callers get text back or LLMUnavailable,
+# and fall back to the local forecast model on the latter.
+
+Transport = Callable[[str], Awaitable[str]]
+
+class LLMUnavailable(Exception):
+    pass
+
+RETRYABLE = (
+    asyncio.TimeoutError,
+    httpx.TransportError,
+    google_exceptions.ResourceExhausted,
+    google_exceptions.ServiceUnavailable,
+    google_exceptions.InternalServerError,
+    google_exceptions.DeadlineExceeded,
+)
+
+def gemini_transport(model_name: str = "gemini-1.5-pro") -> Transport:
+    model = genai.GenerativeModel(model_name)
+
+    async def call(prompt: str) -> str:
+        response = await model.generate_content_async(prompt)
+        return response.candidates[0].content.parts[0].text.strip()
+    return call
+
+def http_transport(url: str) -> Transport:
+    """
+    Plain HTTP model endpoint: POST {"prompt": ...} -> {"text": ...}. Used for a
+    local fake model server. The returned callable's `aclose` closes its client.
+    """
+    client = httpx.AsyncClient()
+
+    async def call(prompt: str) -> str:
+        res = await client.post(url, json={"prompt": prompt})
+        if res.status_code >= 500 or res.status_code == 429:
+            raise httpx.TransportError(f"Upstream returned {res.status_code}")
+        res.raise_for_status()
+        return res.json()["text"].strip()
+    call.aclose = client.aclose
+    return call
+
+class CircuitBreaker:
+    """closed -> open after `threshold` consecutive failures; half-open trial after `cooldown` seconds."""
+
+    def __init__(self, threshold: int = 5, cooldown: float = 30.0):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self.trial_in_flight = False
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.cooldown:
+            return "half-open"
+        return "open"
+
+    def allow(self) -> bool:
+        state = self.state
+        if state == "closed":
+            return True
+        if state == "half-open" and not self.trial_in_flight:
+            self.trial_in_flight = True
+            return True
+        return False
+
+    def record_success(self):
+        self.failures = 0
+        self.opened_at = None
+        self.trial_in_flight = False
+
+    def release(self):
+        """Call abandoned (e.g. client disconnected): free the half-open trial slot."""
+        self.trial_in_flight = False
+
+    def record_failure(self):
+        self.failures += 1
+        if self.trial_in_flight or self.failures >= self.threshold:
+            self.opened_at = time.monotonic()
+        self.trial_in_flight = False
+
+class LLMClient:
+    def __init__(self, transport: Transport, timeout: float = 8.0, max_retries: int = 2,
+                 backoff: float = 0.25, breaker: Optional[CircuitBreaker] = None,
+                 hedge_percentile: Optional[float] = None, hedge_min_samples: int = 20):
+        self.transport = transport
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.breaker = breaker or CircuitBreaker()
+        self.hedge_percentile = hedge_percentile
+        self.hedge_min_samples = hedge_min_samples
+        self.latencies: Deque[float] = deque(maxlen=500)
+        self.counters = {
+            "calls": 0, "successes": 0, "failures": 0, "timeouts": 0,
+            "retries": 0, "short_circuited": 0, "hedges": 0, "hedge_wins": 0,
+        }
+
+    # --- Public ---
+
+    async def generate(self, prompt: str) -> str:
+        self.counters["calls"] += 1
+        if not self.breaker.allow():
+            self.counters["short_circuited"] += 1
+            raise LLMUnavailable("Circuit open")
+
+        for attempt in range(self.max_retries + 1):
+            try:
+                text = await self._attempt(prompt)
+                self.breaker.record_success()
+                self.counters["successes"] += 1
+                return text
+            except RETRYABLE as e:
+                if isinstance(e, asyncio.TimeoutError):
+                    self.counters["timeouts"] += 1
+                if attempt == self.max_retries:
+                    break
+                self.counters["retries"] += 1
+                # Full jitter exponential backoff
+                await asyncio.sleep(random.uniform(0, self.backoff * 2 ** attempt))
+            except asyncio.CancelledError:
+                self.breaker.release()
+                raise
+            except Exception as e:
+                print("LLM call failed (non-retryable):", e)
+                break
+
+        self.breaker.record_failure()
+        self.counters["failures"] += 1
+        raise LLMUnavailable("Upstream model failed")
+
+    async def aclose(self):
+        """Releases the transport's connections, if it holds any (call from the app lifespan)."""
+        close = getattr(self.transport, "aclose", None)
+        if close is not None:
+            await close()
+
+    def stats(self) -> dict:
+        return {
+            **self.counters,
+            "breaker_state": self.breaker.state,
+            "consecutive_failures": self.breaker.failures,
+            "latency_p50_ms": self._percentile(50),
+            "latency_p95_ms": self._percentile(95),
+            "hedge_after_ms": self._hedge_delay() and self._hedge_delay() * 1000,
+        }
+
+    # --- Internals ---
+
+    def _percentile(self, q: float) -> Optional[float]:
+        if not self.latencies:
+            return None
+        ordered = sorted(self.latencies)
+        return round(ordered[min(len(ordered) - 1, int(len(ordered) * q / 100))] * 1000, 1)
+
+    def _hedge_delay(self) -> Optional[float]:
+        if self.hedge_percentile is None or len(self.latencies) < self.hedge_min_samples:
+            return None
+        return self._percentile(self.hedge_percentile) / 1000
+
+    async def _timed(self, prompt: str) -> str:
+        start = time.monotonic()
+        text = await asyncio.wait_for(self.transport(prompt), self.timeout)
+        self.latencies.append(time.monotonic() - start)
+        return text
+
+    async def _attempt(self, prompt: str) -> str:
+        hedge_after = self._hedge_delay()
+        primary = asyncio.ensure_future(self._timed(prompt))
+        if hedge_after is None:
+            return await primary
+
+        # Hedged request: if the primary is slower than the latency percentile,
+        # fire a second call and take whichever succeeds first. Whatever is still
+        # running when we leave (a winner, an error, or our caller cancelled) is cancelled.
+        tasks = [primary]
+        try:
+            done, _ = await asyncio.wait({primary}, timeout=hedge_after)
+            if done:
+                return primary.result()
+
+            self.counters["hedges"] += 1
+            hedge = asyncio.ensure_future(self._timed(prompt))
+            tasks.append(hedge)
+            pending = set(tasks)
+            error: Optional[BaseException] = None
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is hedge:
+                            self.counters["hedge_wins"] += 1
+                        return task.result()
+                    error = task.exception()
+            raise error
+        finally:
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
+
+# ---------------- Default Client ----------------
+
+def _build_default() -> LLMClient:
+    fake_url = os.getenv("LLM_FAKE_SERVER_URL")
+    hedge = os.getenv("LLM_HEDGE_PERCENTILE")
+    return LLMClient(
+        transport=http_transport(fake_url) if fake_url else gemini_transport(),
+        timeout=float(os.getenv("LLM_TIMEOUT_SECONDS", "8")),
+        max_retries=int(os.getenv("LLM_MAX_RETRIES", "2")),
+        breaker=CircuitBreaker(
+            threshold=int(os.getenv("LLM_BREAKER_THRESHOLD", "5")),
+            cooldown=float(os.getenv("LLM_BREAKER_COOLDOWN_SECONDS", "30")),
+        ),
+        hedge_percentile=float(hedge) if hedge else None,
+    )
+
+LLM = _build_default()
@@ -0,0 +1,91 @@
+import re
+import json
+from typing import Dict, Iterable, Optional
+
+from pydantic import BaseModel, Field, ValidationError
+
+from app.stations import STATION_REGISTRY
+
+# ---------------- LLM Response Parsing ----------------
+# Model output is "JSON, mostly": wrapped in ``` fences, preceded by prose,
+# or truncated mid-object. Parse what we can instead of dropping the call.
+
+_DECODER = json.JSONDecoder()
+
+# "Station Name": 12345  /  "Station Name": "12,345"  (salvage for truncated output).
+# The lookahead drops a number cut off at the end of the text.
+_PAIR = re.compile(r'"([^"{}]+)"\s*:\s*"?((?:\d{1,3}(?:,\d{3})+|\d+)(?:\.\d+)?)"?(?=\s*[,}])')
+
+# --- Schemas ---
+class SingleForecastResponse(BaseModel):
+    predicted_passengers: int = Field(ge=0)
+
+class BatchForecastResponse(BaseModel):
+    predictions: Dict[str, float]
+
+def extract_json(text: str) -> Optional[dict]:
+    """First JSON object in `text`, ignoring fences and surrounding prose."""
+    text = text.strip()
+    try:
+        obj = json.loads(text)  # Fast path: bare JSON
+        return obj if isinstance(obj, dict) else None
+    except ValueError:
+        pass
+
+    start = text.find("{")
+    while start != -1:
+        try:
+            obj, _ = _DECODER.raw_decode(text, start)
+            if isinstance(obj, dict):
+                return obj
+        except ValueError:
+            pass
+        start = text.find("{", start + 1)
+    return None
+
+def parse_single(text: str) -> Optional[int]:
+    obj = extract_json(text)
+    if obj is None:
+        return None
+    try:
+        return SingleForecastResponse.model_validate(obj).predicted_passengers
+    except ValidationError:
+        return None
+
+def _to_count(value) -> Optional[int]:
+    try:
+        count = int(float(str(value).replace(",", "")))
+    except ValueError:
+        return None
+    return count if count >= 0 else None
+
+def parse_station_map(text: str, stations: Iterable[str]) -> Dict[str, int]:
+    """
+    Valid predictions for the requested `stations`, keyed by the requested name.
+    Model keys are matched alias-aware ("MG Road" answers "M.G. Road"); bad
+    entries are dropped individually rather than failing the whole batch.
+    """
+    wanted = {}
+    for st in stations:
+        station = STATION_REGISTRY.get(st)
+        wanted[station.name if station else st] = st
+
+    obj = extract_json(text)
+    raw = None
+    if obj is not None:
+        try:
+            raw = BatchForecastResponse.model_validate(obj).predictions
+        except ValidationError:
+            # Validate per entry below
+            raw = obj.get("predictions") if isinstance(obj.get("predictions"), dict) else None
+    if raw is None:
+        raw = dict(_PAIR.findall(text))
+
+    result = {}
+    for key, value in raw.items():
+        station = STATION_REGISTRY.get(key)
+        requested = wanted.get(station.name if station else key)
+        count = _to_count(value)
+        if requested is not None and count is not None:
+            result[requested] = count
+    return result
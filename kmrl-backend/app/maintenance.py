@@ -0,0 +1,169 @@
+import heapq
+import random
+from typing import Dict, List, NamedTuple, Optional, Sequence
+
+from pydantic import BaseModel
+
+# ---------------- Maintenance & Mileage Planner ----------------
+# Nightly depot induction over a multi-week horizon. Each rake carries its
+# odometer and km / days since every maintenance type; each night:
+#   1. rakes whose next maintenance falls due within the lookahead are
+#      inducted off a priority queue (most urgent first) into free bays at a
+#      depot that can do that type,
+#   2. the day's service rakes are the lowest-odometer rakes that are safely
+#      clear of their next due (mileage balancing), topped up by headroom,
+#   3. everything else stands by; service rakes add a day's km.
+# O(days * rakes log rakes): 30 days x 100 rakes plans in milliseconds.
+
+class MaintenanceType(NamedTuple):
+    name: str
+    interval_km: float
+    interval_days: int
+    nights: int          # Nights the rake occupies a bay
+    heavy: bool          # Needs a heavy-maintenance depot
+
+class Depot(NamedTuple):
+    name: str
+    bays: int
+    heavy: bool
+
+# Lightest first; completing a type also resets every lighter one
+MAINTENANCE_TYPES = [
+    MaintenanceType("Inspection", 5000, 7, 1, False),
+    MaintenanceType("Service", 20000, 30, 1, False),
+    MaintenanceType("Overhaul", 120000, 365, 5, True),
+]
+DEPOTS = [
+    Depot("Muttom Yard", 6, True),
+    Depot("Aluva Depot", 3, False),
+]
+SERVICE_KM_PER_DAY = 380.0   # ~33 km/h over an 06:00-23:00 service day
+LOOKAHEAD_DAYS = 2           # Induct early when a bay is free and a rake falls due this soon
+
+class RakeRecord(BaseModel):
+    id: str
+    odometer_km: float
+    km_since: List[float]    # Per MAINTENANCE_TYPES entry
+    days_since: List[int]
+
+class Induction(NamedTuple):
+    rake: str
+    kind: str
+    depot: str
+    nights_left: int
+
+class DayPlan(NamedTuple):
+    day: int
+    service: List[str]
+    standby: List[str]
+    maintenance: List[Induction]   # Everything in a bay tonight (new and continuing)
+    inducted: List[str]
+    deferred: List[str]            # Due but no suitable bay was free
+    shortfall: int                 # Service rakes missing
+
+def mock_rake_records(ids: Sequence[str], seed: int = 0) -> List[RakeRecord]:
+    """Plausible mid-cycle mileage / maintenance history per rake (deterministic)."""
+    rng = random.Random(seed)
+    records = []
+    for rake in ids:
+        # Days since each type; km follows from a typical 70-90% service share
+        days = [rng.randint(0, m.interval_days - 1) for m in MAINTENANCE_TYPES]
+        share = rng.uniform(0.7, 0.9)
+        records.append(RakeRecord(
+            id=rake,
+            odometer_km=round(rng.uniform(150000, 450000), 1),
+            km_since=[round(min(d * SERVICE_KM_PER_DAY * share, m.interval_km * 0.95), 1)
+                      for d, m in zip(days, MAINTENANCE_TYPES)],
+            days_since=days,
+        ))
+    return records
+
+def days_to_due(record: RakeRecord, km_per_day: float = SERVICE_KM_PER_DAY) -> List[float]:
+    """Per type: days of full service left before it falls due (km or calendar, whichever first)."""
+    return [
+        min((m.interval_km - km) / km_per_day, m.interval_days - days)
+        for m, km, days in zip(MAINTENANCE_TYPES, record.km_since, record.days_since)
+    ]
+
+def km_to_due(record: RakeRecord) -> float:
+    """Km until the next maintenance of any type."""
+    return min(m.interval_km - km for m, km in zip(MAINTENANCE_TYPES, record.km_since))
+
+def _due(record: RakeRecord, within: float) -> Optional[int]:
+    """Heaviest type due within `within` days (it covers the lighter ones), else None."""
+    due = [t for t, left in enumerate(days_to_due(record)) if left <= within]
+    return max(due) if due else None
+
+def plan_maintenance(records: Sequence[RakeRecord], days: int, service_rakes: int,
+                     in_bay: Optional[Dict[str, Induction]] = None,
+                     depots: Sequence[Depot] = DEPOTS) -> List[DayPlan]:
+    """Day-by-day induction plan. `records` are not modified."""
+    state = {r.id: r.model_copy(deep=True) for r in records}
+    occupying: Dict[str, Induction] = dict(in_bay or {})
+    kinds = {m.name: t for t, m in enumerate(MAINTENANCE_TYPES)}
+    plans = []
+
+    for day in range(days):
+        # Bays freed by work that finished this morning
+        for rake, job in list(occupying.items()):
+            if job.nights_left <= 0:
+                done = kinds[job.kind]
+                rec = state[rake]
+                for t in range(done + 1):
+                    rec.km_since[t], rec.days_since[t] = 0.0, 0
+                del occupying[rake]
+        free = {d.name: d.bays for d in depots}
+        for job in occupying.values():
+            free[job.depot] -= 1
+
+        # 1. Induction: most urgent first (least time left, then highest odometer)
+        queue = []
+        for rake, rec in state.items():
+            if rake in occupying:
+                continue
+            t = _due(rec, LOOKAHEAD_DAYS)
+            if t is not None:
+                heapq.heappush(queue, (min(days_to_due(rec)), -rec.odometer_km, rake, t))
+        inducted, deferred = [], []
+        while queue:
+            left, _, rake, t = heapq.heappop(queue)
+            kind = MAINTENANCE_TYPES[t]
+            depot = next((d.name for d in depots if free[d.name] > 0 and (d.heavy or not kind.heavy)), None)
+            if depot is None:
+                # Nothing free for it tonight; only worth reporting once it can't wait
+                if left <= 1:
+                    deferred.append(rake)
+                continue
+            free[depot] -= 1
+            occupying[rake] = Induction(rake, kind.name, depot, kind.nights)
+            inducted.append(rake)
+
+        # 2. Service: balance mileage among rakes safely clear of their next due, then by headroom
+        available = [rec for rake, rec in state.items() if rake not in occupying]
+        safe = [rec for rec in available if min(days_to_due(rec)) > LOOKAHEAD_DAYS]
+        service = heapq.nsmallest(service_rakes, safe, key=lambda r: (r.odometer_km, r.id))
+        if len(service) < service_rakes:
+            chosen = {r.id for r in service}
+            rest = [rec for rec in available if rec.id not in chosen]
+            service += heapq.nlargest(service_rakes - len(service), rest, key=lambda r: (min(days_to_due(r)), r.id))
+        service_ids = {r.id for r in service}
+
+        plans.append(DayPlan(
+            day=day,
+            service=sorted(service_ids),
+            standby=sorted(r.id for r in available if r.id not in service_ids),
+            maintenance=sorted(occupying.values()),
+            inducted=inducted,
+            deferred=deferred,
+            shortfall=max(service_rakes - len(service_ids), 0),
+        ))
+
+        # 3. Advance a day
+        for rake, rec in state.items():
+            ran = SERVICE_KM_PER_DAY if rake in service_ids else 0.0
+            rec.odometer_km += ran
+            rec.km_since = [km + ran for km in rec.km_since]
+            rec.days_since = [d + 1 for d in rec.days_since]
+        occupying = {rake: job._replace(nights_left=job.nights_left - 1) for rake, job in occupying.items()}
+
+    return plans
@@ -0,0 +1,83 @@
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+from app.stations import SERVICE_HOURS, STATION_REGISTRY, Station, StationRegistry
+
+# ---------------- Line Network Model ----------------
+# Inter-station run times from chainage, dwell times by station tier and hour
+# (busier hours -> longer dwells), and an all-pairs travel-time matrix
+# [hour, origin, destination] precomputed once at import. Arrival times,
+# partial-route (short-turn) trips and "nearest station" searches are then
+# O(1) array lookups.
+
+CRUISE_KMH = 70.0           # Average speed between stations
+ACCEL_OVERHEAD_S = 40.0     # Extra seconds per run for accelerating / braking
+TIER_DWELL_S = {1: 40.0, 2: 30.0, 3: 20.0}
+PEAK_DWELL_FACTOR = 0.5     # Dwell grows by up to 50% in a station's busiest hour
+
+def route_ends(route: Optional[str]) -> Optional[Tuple[Station, Station]]:
+    """"Aluva -> Petta" -> (origin, destination); None for routes that aren't a run between two line stations."""
+    parts = (route or "").split("->")
+    if len(parts) != 2:
+        return None
+    origin, dest = STATION_REGISTRY.get(parts[0].strip()), STATION_REGISTRY.get(parts[1].strip())
+    if origin is None or dest is None or origin == dest:
+        return None
+    return origin, dest
+
+class LineNetwork:
+    def __init__(self, registry: StationRegistry):
+        self.registry = registry
+        self.run_seconds = ACCEL_OVERHEAD_S + np.diff(registry.chainage) / CRUISE_KMH * 3600      # [segments]
+
+        curve = registry.demand_matrix()                                                        # [stations, hours]
+        base = np.array([TIER_DWELL_S[t] for t in registry.tier])
+        busy = curve / np.maximum(curve.max(axis=1, keepdims=True), 1e-9)
+        self.dwell_seconds = (base[:, None] * (1 + PEAK_DWELL_FACTOR * busy)).T                  # [hours, stations]
+
+        # Running down the line: arrival at k / departure from k, relative to leaving station 0
+        dwell = self.dwell_seconds.copy()
+        dwell[:, 0] = 0.0
+        arrive = np.concatenate([np.zeros((len(dwell), 1)), np.cumsum(self.run_seconds + dwell[:, :-1], axis=1)], axis=1)
+        depart = arrive + dwell
+        # Doors close at the origin -> doors open at the destination; same both ways
+        down = arrive[:, None, :] - depart[:, :, None]
+        self.travel_minutes = (np.where(down > 0, down, np.swapaxes(down, 1, 2)) / 60).astype(np.float32)
+
+        # Quickest travel time over the day, and stations ordered by it from each station (itself first)
+        self.quickest_minutes = self.travel_minutes.min(axis=0)                                  # [origin, destination]
+        self.nearest_order = np.argsort(self.quickest_minutes, axis=1, kind="stable")
+
+    def hour_index(self, minute: int) -> int:
+        return min(max(minute // 60 - SERVICE_HOURS[0], 0), len(SERVICE_HOURS) - 1)
+
+    def minutes(self, origin: str, dest: str, at: int) -> int:
+        """Whole minutes from `origin` to `dest` for a departure at minute-of-day `at`."""
+        i, j = self.registry.id_of(origin), self.registry.id_of(dest)
+        return int(round(float(self.travel_minutes[self.hour_index(at), i, j])))
+
+    def route_minutes(self, route: Optional[str], at: int) -> Optional[int]:
+        """Run time of a trip on `route` (full or short-turn); None for routes off the line."""
+        ends = route_ends(route)
+        if ends is None:
+            return None
+        return int(round(float(self.travel_minutes[self.hour_index(at), ends[0].id, ends[1].id])))
+
+    def end_to_end(self) -> np.ndarray:
+        """Terminus-to-terminus minutes per service hour."""
+        return self.travel_minutes[:, 0, -1]
+
+    def distance(self, origin: Optional[str], dest: str) -> float:
+        """Quickest minutes from `origin` to `dest`; infinite when `origin` is not a line station."""
+        start = self.registry.get(origin)
+        if start is None:
+            return float("inf")
+        return float(self.quickest_minutes[start.id, self.registry.id_of(dest)])
+
+    def nearest(self, station: str) -> List[str]:
+        """Other stations, closest first."""
+        order = self.nearest_order[self.registry.id_of(station)]
+        return [self.registry.names[k] for k in order[1:]]
+
+NETWORK = LineNetwork(STATION_REGISTRY)
@@ -3,6 +3,10 @@ from pydantic import BaseModel
 from typing import List, Optional, Dict
 from datetime import datetime
 import uuid
+import threading
+
+from app.fast_json import FastJSONResponse
+from app.escalation import ACK, EscalationEvent, EscalationScheduler, sla_minutes
 
 notes_router = APIRouter(prefix="/notes", tags=["Operations Notes"])
 
@@ -87,6 +91,73 @@ NOTES_DB: List[Note] = [
     )
 ]
 
+# Copy-on-write: writers copy the note they change and swap in a new list under
+# NOTES_WRITE_LOCK, so readers never see a half-applied edit and need no lock.
+NOTES_WRITE_LOCK = threading.Lock()
+
+def all_notes() -> List[Note]:
+    """Current immutable snapshot of the notes store (for other modules)."""
+    return NOTES_DB
+
+def _get_note(note_id: str) -> Note:
+    note = next((n for n in NOTES_DB if n.id == note_id), None)
+    if not note:
+        raise HTTPException(status_code=404, detail="Note not found")
+    return note.model_copy(deep=True)
+
+def _commit(note: Note):
+    """Publishes a new snapshot containing `note` (hold NOTES_WRITE_LOCK)."""
+    global NOTES_DB
+    if any(n.id == note.id for n in NOTES_DB):
+        NOTES_DB = [note if n.id == note.id else n for n in NOTES_DB]
+    else:
+        NOTES_DB = NOTES_DB + [note]
+
+# ---------------- SLA Escalation ----------------
+
+CLOSED_STATUSES = ("Resolved", "Closed")
+TIMESTAMP_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+def _escalate(note_id: str, kind: str, deadline: float) -> Optional[EscalationEvent]:
+    """Timer callback: flags the note and records why, unless it was dealt with in time."""
+    now = datetime.now().strftime(TIMESTAMP_FORMAT)
+    with NOTES_WRITE_LOCK:
+        note = next((n for n in NOTES_DB if n.id == note_id), None)
+        if note is None or note.status in CLOSED_STATUSES or (kind == ACK and note.acknowledged_by):
+            return None
+        minutes = sla_minutes(note.priority, note.category).get(kind)
+        if minutes is None:
+            return None
+        note = _get_note(note_id)
+        note.is_escalated = True
+        note.history.append(HistoryEntry(
+            action="Escalated",
+            timestamp=now,
+            details=f"No {kind} within the {minutes} min SLA"
+        ))
+        _commit(note)
+    return EscalationEvent(
+        seq=0, note_id=note.id, subject=note.subject, priority=note.priority, category=note.category,
+        kind=kind, sla_minutes=minutes, deadline=datetime.fromtimestamp(deadline).strftime(TIMESTAMP_FORMAT),
+        escalated_at=now,
+    )
+
+ESCALATIONS = EscalationScheduler(_escalate)
+
+def _arm_escalations(note: Note):
+    """(Re)arms a note's SLA timers from its creation time and current priority / category."""
+    ESCALATIONS.cancel(note.id)
+    if note.status in CLOSED_STATUSES:
+        return
+    created = datetime.strptime(note.timestamp, TIMESTAMP_FORMAT).timestamp()
+    for kind, minutes in sla_minutes(note.priority, note.category).items():
+        if kind == ACK and note.acknowledged_by:
+            continue
+        ESCALATIONS.schedule(note.id, kind, created + minutes * 60)
+
+for _note in NOTES_DB:
+    _arm_escalations(_note)
+
 # ---------------- Endpoints ----------------
 
 @notes_router.get("/", response_model=List[Note])
@@ -109,9 +180,14 @@ def get_notes(
         s = search.lower()
         results = [n for n in results if s in n.subject.lower() or s in n.description.lower()]
         
-    # Sort by timestamp descending
-    results.sort(key=lambda x: x.timestamp, reverse=True)
-    return results
+    # Sort by timestamp descending (copy - the snapshot itself is shared).
+    # Notes are already validated models; serialize them directly.
+    return FastJSONResponse(sorted(results, key=lambda x: x.timestamp, reverse=True))
+
+@notes_router.get("/escalations", response_model=List[EscalationEvent])
+def get_escalations(after: int = Query(0, ge=0, description="Only events with seq above this (poll cursor)")):
+    """Recent SLA escalation events, oldest first."""
+    return ESCALATIONS.events_after(after)
 
 @notes_router.post("/", response_model=Note)
 def create_note(note_in: NoteCreate):
@@ -140,85 +216,88 @@ def create_note(note_in: NoteCreate):
         acknowledged_by=[]
     )
     
-    NOTES_DB.append(new_note)
+    with NOTES_WRITE_LOCK:
+        _commit(new_note)
+    _arm_escalations(new_note)
     return new_note
 
 @notes_router.post("/{note_id}/comment", response_model=Note)
 def add_comment(note_id: str, author: str, content: str):
-    note = next((n for n in NOTES_DB if n.id == note_id), None)
-    if not note:
-        raise HTTPException(status_code=404, detail="Note not found")
-        
     comment_id = str(uuid.uuid4())
     now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    
-    note.comments.append(Comment(
-        id=comment_id,
-        author=author,
-        content=content,
-        timestamp=now
-    ))
+
+    with NOTES_WRITE_LOCK:
+        note = _get_note(note_id)
+        note.comments.append(Comment(
+            id=comment_id,
+            author=author,
+            content=content,
+            timestamp=now
+        ))
+        _commit(note)
     return note
 
 @notes_router.post("/{note_id}/acknowledge", response_model=Note)
 def acknowledge_note(note_id: str, user: str):
-    note = next((n for n in NOTES_DB if n.id == note_id), None)
-    if not note:
-        raise HTTPException(status_code=404, detail="Note not found")
-        
-    if user not in note.acknowledged_by:
-        note.acknowledged_by.append(user)
-        note.history.append(HistoryEntry(
-            action="Acknowledged", 
-            timestamp=datetime.now().strftime("%Y-%m-%d %H:%M:%S"), 
-            details=f"Acknowledged by {user}"
-        ))
-        
+    with NOTES_WRITE_LOCK:
+        note = _get_note(note_id)
+        if user not in note.acknowledged_by:
+            note.acknowledged_by.append(user)
+            note.history.append(HistoryEntry(
+                action="Acknowledged", 
+                timestamp=datetime.now().strftime("%Y-%m-%d %H:%M:%S"), 
+                details=f"Acknowledged by {user}"
+            ))
+            _commit(note)
+        ESCALATIONS.cancel(note_id, (ACK,))
+
     return note
 
 @notes_router.post("/{note_id}/resolve", response_model=Note)
 def resolve_note(note_id: str, user: str, status: str = "Resolved"):
-    note = next((n for n in NOTES_DB if n.id == note_id), None)
-    if not note:
-        raise HTTPException(status_code=404, detail="Note not found")
-        
-    note.status = status
-    note.history.append(HistoryEntry(
-        action="Status Change", 
-        timestamp=datetime.now().strftime("%Y-%m-%d %H:%M:%S"), 
-        details=f"Status changed to {status} by {user}"
-    ))
+    with NOTES_WRITE_LOCK:
+        note = _get_note(note_id)
+        note.status = status
+        note.history.append(HistoryEntry(
+            action="Status Change", 
+            timestamp=datetime.now().strftime("%Y-%m-%d %H:%M:%S"), 
+            details=f"Status changed to {status} by {user}"
+        ))
+        _commit(note)
+        _arm_escalations(note)   # Cancels on close; a reopened note is back on its SLA
     return note
 
 @notes_router.patch("/{note_id}", response_model=Note)
 def update_note(note_id: str, update: NoteUpdate, user: str):
-    note = next((n for n in NOTES_DB if n.id == note_id), None)
-    if not note:
-        raise HTTPException(status_code=404, detail="Note not found")
-        
-    # Logic: Immutable Handover logs
-    if note.category == "Handover":
-        raise HTTPException(status_code=403, detail="Handover notes are immutable.")
-        
-    changes = []
-    if update.subject and update.subject != note.subject:
-        note.subject = update.subject
-        changes.append("Subject")
-    if update.description and update.description != note.description:
-        note.description = update.description
-        changes.append("Description")
-    if update.priority and update.priority != note.priority:
-        note.priority = update.priority
-        changes.append("Priority")
-    if update.category and update.category != note.category:
-        note.category = update.category
-        changes.append("Category")
-        
-    if changes:
-        note.history.append(HistoryEntry(
-            action="Edited",
-            timestamp=datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-            details=f"Updated {', '.join(changes)} by {user}"
-        ))
-        
+    with NOTES_WRITE_LOCK:
+        note = _get_note(note_id)
+
+        # Logic: Immutable Handover logs
+        if note.category == "Handover":
+            raise HTTPException(status_code=403, detail="Handover notes are immutable.")
+
+        changes = []
+        if update.subject and update.subject != note.subject:
+            note.subject = update.subject
+            changes.append("Subject")
+        if update.description and update.description != note.description:
+            note.description = update.description
+            changes.append("Description")
+        if update.priority and update.priority != note.priority:
+            note.priority = update.priority
+            changes.append("Priority")
+        if update.category and update.category != note.category:
+            note.category = update.category
+            changes.append("Category")
+
+        if changes:
+            note.history.append(HistoryEntry(
+                action="Edited",
+                timestamp=datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+                details=f"Updated {', '.join(changes)} by {user}"
+            ))
+            _commit(note)
+            if "Priority" in changes or "Category" in changes:
+                _arm_escalations(note)
+
     return note
@@ -0,0 +1,103 @@
+from typing import Dict, Optional
+
+import numpy as np
+
+from app.network import route_ends
+from app.stations import SERVICE_HOURS, STATION_REGISTRY
+from app.trip_store import TripStore
+
+# ---------------- Passenger Load Engine ----------------
+# Station boardings + an origin-destination distribution -> OD matrix per hour
+# -> on-board load per line segment, direction and hour (cumulative boardings
+# minus alightings) -> load on every trip in a TripStore. Everything is a
+# handful of array ops over [hours, stations, stations]; a full day of the
+# 22-station line is well under a millisecond.
+
+def gravity_od(demand: np.ndarray, decay_km: Optional[float] = None) -> np.ndarray:
+    """
+    Hourly boardings [stations, hours] (line order) -> OD matrix [hours, origin, destination].
+
+    Destinations attract riders in proportion to their own share of demand;
+    with `decay_km`, attraction also falls off as exp(-distance / decay_km).
+    Each origin's row sums to its boardings (none where there is nowhere to go).
+    """
+    demand = np.asarray(demand, dtype=float).T                     # [hours, stations]
+    weight = np.broadcast_to(demand[:, None, :], demand.shape + demand.shape[-1:]).copy()
+    if decay_km is not None:
+        distance = np.abs(STATION_REGISTRY.chainage[:, None] - STATION_REGISTRY.chainage[None, :])
+        weight *= np.exp(-distance / decay_km)
+    weight[:, np.arange(demand.shape[1]), np.arange(demand.shape[1])] = 0.0
+
+    total = weight.sum(axis=2, keepdims=True)
+    share = np.divide(weight, total, out=np.zeros_like(weight), where=total > 0)
+    return share * demand[:, :, None]
+
+def segment_loads(od: np.ndarray) -> np.ndarray:
+    """
+    OD matrix [hours, origin, destination] -> on-board load [direction, segment, hours].
+    Direction 0 runs in line order (towards the last station); segment k joins stations k and k+1.
+    """
+    down = np.triu(od, 1)
+    up = np.tril(od, -1)
+    # Load leaving station k = everyone boarded at or before k minus everyone alighted at or before k
+    down_load = np.cumsum(down.sum(axis=2) - down.sum(axis=1), axis=1)[:, :-1]
+    up_load = np.cumsum((up.sum(axis=2) - up.sum(axis=1))[:, ::-1], axis=1)[:, :-1][:, ::-1]
+    return np.stack([down_load.T, up_load.T])
+
+def _route_spans(store: TripStore) -> np.ndarray:
+    """Per route code -> (direction, first segment, last segment + 1); -1s for routes off the line."""
+    spans = np.full((len(store.interners["route"].values), 3), -1, dtype=np.int64)
+    for code, route in enumerate(store.interners["route"].values):
+        ends = route_ends(route)
+        if ends is None:
+            continue
+        a, b = ends[0].id, ends[1].id
+        spans[code] = (0 if a < b else 1, min(a, b), max(a, b))
+    return spans
+
+def trip_loads(store: TripStore, loads: np.ndarray, capacity: int) -> Dict[str, np.ndarray]:
+    """
+    Estimated on-board load of every row in `store` on its busiest segment.
+
+    Each segment's hourly load is shared by the operating trips that cover it
+    in that direction and hour, so short-turns and gaps are accounted for.
+    Returns row-aligned arrays: load (passengers), percent (of capacity) and
+    segment (busiest segment index, -1 if the trip carries nobody).
+    """
+    n_seg, n_hours = loads.shape[1], loads.shape[2]
+    spans = _route_spans(store)
+    route = store.col("route").astype(np.int64)
+    direction = spans[route, 0]
+    hour = np.clip((store.col("dep") + store.col("delay")) // 60 - SERVICE_HOURS[0], 0, n_hours - 1)
+
+    cancelled = store.code_of("status", "Cancelled")
+    operating = (direction >= 0) & (store.col("status") != (-1 if cancelled is None else cancelled))
+
+    # covers[r, k]: route r runs over segment k
+    seg = np.arange(n_seg)
+    covers = (seg >= spans[:, 1:2]) & (seg < spans[:, 2:3])
+
+    # Trains per (direction, segment, hour): trips per (route, hour) spread over their segments
+    trips = np.zeros((len(spans), n_hours))
+    np.add.at(trips, (route[operating], hour[operating]), 1)
+    trains = np.zeros_like(loads)
+    for d in (0, 1):
+        on = spans[:, 0] == d
+        trains[d] = covers[on].T.astype(float) @ trips[on]
+
+    per_train = np.divide(loads, trains, out=np.zeros_like(loads), where=trains > 0)
+    # Busiest covered segment per (route, hour)
+    route_seg = np.where(covers[:, :, None], per_train[np.maximum(spans[:, 0], 0)], -1.0)  # [routes, segments, hours]
+    peak_seg = route_seg.argmax(axis=1)
+    peak = np.take_along_axis(route_seg, peak_seg[:, None, :], axis=1)[:, 0, :]
+
+    load = np.where(operating, peak[route, hour], 0.0)
+    load = np.maximum(load, 0.0)
+    return {
+        "load": load,
+        "percent": load / capacity * 100,
+        "segment": np.where(load > 0, peak_seg[route, hour], -1),
+    }
+
+def segment_name(k: int) -> str:
+    return f"{STATION_REGISTRY.names[k]} - {STATION_REGISTRY.names[k + 1]}"
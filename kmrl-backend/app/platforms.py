@@ -0,0 +1,247 @@
+import math
+import threading
+import weakref
+from typing import Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+import numpy as np
+
+from app.delays import MIN_TURNAROUND
+from app.network import NETWORK, route_ends
+from app.stations import STATION_REGISTRY
+from app.trip_store import TripStore
+
+# ---------------- Platform Allocation ----------------
+# A trip occupies a platform at its origin from the moment its rake is at the
+# platform (departure minus the dwell / boarding time) until the platform has
+# cleared behind it. Each (station, platform) keeps its bookings in a max
+# segment tree over start minutes, so booking, releasing and "is this platform
+# free for [start, end)" cost O(log D) plus the bookings found. Termini can use
+# either platform; other stations have one platform per direction. Whole-day
+# reallocation is a greedy interval colouring in start order.
+
+PLATFORMS = ("Platform 1", "Platform 2")
+TERMINAL_DWELL = MIN_TURNAROUND   # Minutes a rake stands at a terminus platform before leaving
+CLEARANCE = 2                     # Minutes until the next train may enter behind it
+EMPTY = -1 << 30                  # Segment-tree value of a minute with no bookings
+
+class Occupancy(NamedTuple):
+    station: int       # Line order index
+    direction: int     # 0 = towards the last station
+    start: int
+    end: int
+
+def occupancy(route: Optional[str], dep: int) -> Optional[Occupancy]:
+    """Platform time of a departure at its origin; None for routes off the line."""
+    ends = route_ends(route)
+    if ends is None:
+        return None
+    origin, dest = ends
+    if origin.is_hub:
+        dwell = TERMINAL_DWELL
+    else:
+        dwell = math.ceil(NETWORK.dwell_seconds[NETWORK.hour_index(dep), origin.id] / 60)
+    return Occupancy(origin.id, 0 if origin.id < dest.id else 1, dep - dwell, dep + CLEARANCE)
+
+def platforms_for(occ: Occupancy) -> Tuple[str, ...]:
+    """Platforms a departure may use, preferred first."""
+    own = PLATFORMS[occ.direction]
+    if STATION_REGISTRY.stations[occ.station].is_hub:
+        return (own,) + tuple(p for p in PLATFORMS if p != own)
+    return (own,)
+
+class Timeline:
+    """
+    Bookings on one platform: a max segment tree over start minutes, each leaf
+    holding the latest end of the bookings that start in that minute. Booking
+    and releasing touch one leaf and its O(log D) ancestors (D = minutes in the
+    tree); queries descend only into subtrees that reach past the window start.
+    """
+
+    ORIGIN = 120    # Leaf 0 is minute -ORIGIN (dwell before a departure just after midnight)
+    SLOTS = 2048    # Leaves: minutes -ORIGIN .. SLOTS - ORIGIN - 1, past the end of the service day
+
+    def __init__(self):
+        self.tree: List[int] = [EMPTY] * (2 * self.SLOTS)
+        self.leaves: Dict[int, Dict[int, int]] = {}   # leaf -> {row: end}
+        self._count = 0
+
+    def __len__(self) -> int:
+        return self._count
+
+    def _leaf(self, start: int) -> int:
+        leaf = start + self.ORIGIN
+        if not 0 <= leaf < self.SLOTS:
+            raise ValueError(f"Platform booking starting at minute {start} is outside the service day")
+        return leaf
+
+    def _refresh(self, leaf: int):
+        node = leaf + self.SLOTS
+        self.tree[node] = max(self.leaves.get(leaf, {}).values(), default=EMPTY)
+        node //= 2
+        while node:
+            self.tree[node] = max(self.tree[2 * node], self.tree[2 * node + 1])
+            node //= 2
+
+    def add(self, row: int, start: int, end: int):
+        leaf = self._leaf(start)
+        self.leaves.setdefault(leaf, {})[row] = end
+        self._count += 1
+        self._refresh(leaf)
+
+    def remove(self, row: int, start: int):
+        leaf = self._leaf(start)
+        bookings = self.leaves[leaf]
+        del bookings[row]
+        if not bookings:
+            del self.leaves[leaf]
+        self._count -= 1
+        self._refresh(leaf)
+
+    def _reaching(self, last: int, after: int) -> List[int]:
+        """Leaves 0..last, in order, holding a booking that ends after minute `after`."""
+        found, stack = [], [(1, 0, self.SLOTS)]
+        while stack:
+            node, lo, width = stack.pop()
+            if lo > last or self.tree[node] <= after:
+                continue
+            if width == 1:
+                found.append(lo)
+                continue
+            half = width // 2
+            stack.append((2 * node + 1, lo + half, half))
+            stack.append((2 * node, lo, half))
+        return found
+
+    def _overlapping(self, start: int, end: int) -> List[Tuple[int, int, int]]:
+        """(start, end, row) of bookings over any part of [start, end), in start order."""
+        last = min(end + self.ORIGIN, self.SLOTS) - 1
+        return [(leaf - self.ORIGIN, e, row) for leaf in self._reaching(last, start)
+                for row, e in sorted(self.leaves[leaf].items()) if e > start]
+
+    def overlapping(self, start: int, end: int) -> List[int]:
+        """Rows booked over any part of [start, end)."""
+        return [row for _, _, row in self._overlapping(start, end)]
+
+    def free(self, start: int, end: int, ignore: Optional[int] = None) -> bool:
+        return all(row == ignore for row in self.overlapping(start, end))
+
+    def bookings(self) -> List[Tuple[int, int, int]]:
+        """Every (start, end, row), in start order."""
+        return [(leaf - self.ORIGIN, end, row) for leaf in sorted(self.leaves)
+                for row, end in sorted(self.leaves[leaf].items())]
+
+class PlatformBoard:
+    """Every platform's timeline for one TripStore."""
+
+    def __init__(self):
+        self.timelines: Dict[Tuple[int, str], Timeline] = {}
+        self.booked: Dict[int, Tuple[int, str, int, int]] = {}  # row -> (station, platform, start, end)
+        self.version = -1                                     # Store version it reflects
+
+    def timeline(self, station: int, platform: str) -> Timeline:
+        return self.timelines.setdefault((station, platform), Timeline())
+
+    def book(self, row: int, station: int, platform: str, start: int, end: int):
+        self.release(row)
+        self.timeline(station, platform).add(row, start, end)
+        self.booked[row] = (station, platform, start, end)
+
+    def release(self, row: int):
+        booking = self.booked.pop(row, None)
+        if booking is not None:
+            self.timelines[booking[:2]].remove(row, booking[2])
+
+    def track(self, store: TripStore, rows: Iterable[int]):
+        """Re-books `rows` from their current state and marks the board current."""
+        for row in rows:
+            self.release(row)
+            booking = _booking(store, row)
+            if booking is not None:
+                self.book(row, *booking)
+        self.version = store.version
+
+    def is_free(self, occ: Occupancy, platform: str, ignore: Optional[int] = None) -> bool:
+        return self.timeline(occ.station, platform).free(occ.start, occ.end, ignore)
+
+    def allocate(self, occ: Occupancy, ignore: Optional[int] = None, current: Optional[str] = None) -> Optional[str]:
+        """A free platform for `occ`, keeping `current` when it still fits; None if all are taken."""
+        choices = platforms_for(occ)
+        if current in choices:
+            choices = (current,) + tuple(p for p in choices if p != current)
+        return next((p for p in choices if self.is_free(occ, p, ignore)), None)
+
+    def clashes(self) -> List[Tuple[int, int, int, str]]:
+        """(earlier row, later row, station, platform) for every pair of overlapping bookings."""
+        found = []
+        for (station, platform), line in self.timelines.items():
+            for start, end, row in line.bookings():
+                # Bookings starting no later than this one that are still there when it arrives
+                for other_start, _, other in line._overlapping(start, start + 1):
+                    if (other_start, other) < (start, row):
+                        found.append((other, row, station, platform))
+        return found
+
+def _operating(store: TripStore, row: int) -> bool:
+    return store.value(row, "status") != "Cancelled"
+
+def _booking(store: TripStore, row: int) -> Optional[Tuple[int, str, int, int]]:
+    if not _operating(store, row):
+        return None
+    occ = occupancy(store.value(row, "route"), int(store.col("dep")[row]))
+    platform = store.value(row, "platform")
+    if occ is None or platform not in platforms_for(occ):
+        return None
+    return occ.station, platform, occ.start, occ.end
+
+# Writers keep their store's board current by tracking the rows they touch
+# (whole-timetable writes build it afresh). A full build here is then only the
+# first use of a store, or a write that bypassed the board.
+_BOARDS: "weakref.WeakKeyDictionary[TripStore, PlatformBoard]" = weakref.WeakKeyDictionary()
+_BOARDS_LOCK = threading.Lock()   # Readers may race to build the same board
+
+def board_for(store: TripStore) -> PlatformBoard:
+    """The store's board, built (O(n log D)) only when it is missing or out of date."""
+    board = _BOARDS.get(store)
+    if board is not None and board.version == store.version:
+        return board
+    with _BOARDS_LOCK:
+        board = _BOARDS.get(store)
+        if board is None or board.version != store.version:
+            board = PlatformBoard()
+            board.track(store, store.order())
+            _BOARDS[store] = board
+        return board
+
+def track_since(store: TripStore, board: PlatformBoard, version: int):
+    """Re-books the rows written after `version`, e.g. once a fork's edits are adopted."""
+    board.track(store, [int(r) for r in np.flatnonzero(store.col("modified") > version)])
+
+def colour(items: List[Tuple[int, Occupancy]]) -> Tuple[Dict[int, str], List[int]]:
+    """
+    Greedy interval colouring: (key, occupancy) in start order, each onto its
+    first preferred platform that has cleared. Keys that fit nowhere get the
+    platform that clears soonest and are returned as clashes.
+    """
+    free_at: Dict[Tuple[int, str], int] = {}
+    assigned, clashes = {}, []
+    for key, occ in sorted(items, key=lambda item: (item[1].start, item[1].end)):
+        choices = platforms_for(occ)
+        platform = next((p for p in choices if free_at.get((occ.station, p), occ.start) <= occ.start), None)
+        if platform is None:
+            platform = min(choices, key=lambda p: free_at[(occ.station, p)])
+            clashes.append(key)
+        free_at[(occ.station, platform)] = max(free_at.get((occ.station, platform), occ.end), occ.end)
+        assigned[key] = platform
+    return assigned, clashes
+
+def reallocate(store: TripStore) -> Tuple[Dict[int, str], List[int]]:
+    """Colours every operating trip on the line -> (rows whose platform changes, rows left clashing)."""
+    items = []
+    for row in store.order():
+        row = int(row)
+        occ = occupancy(store.value(row, "route"), int(store.col("dep")[row]))
+        if occ is not None and _operating(store, row):
+            items.append((row, occ))
+    assigned, clashes = colour(items)
+    changes = {row: p for row, p in assigned.items() if store.value(row, "platform") != p}
+    return changes, clashes
@@ -3,7 +3,7 @@ from pydantic import BaseModel
 from typing import List, Dict, Any, Optional
 from datetime import datetime
 import random
-from .notes import NOTES_DB # Import in-memory notes
+from .notes import all_notes # Snapshot of in-memory notes
 from .staff import STATIONS # Import station list
 
 reports_router = APIRouter(prefix="/reports", tags=["Reports"])
@@ -65,7 +65,7 @@ def get_summary(
     # Note: Our notes don't strictly have 'station' field yet (just description/asset), 
     # but we can filter by date string matching.
     incidents_count = 0
-    for note in NOTES_DB:
+    for note in all_notes():
         if note.timestamp.startswith(date) and note.priority in ["High", "Critical"]:
             incidents_count += 1
             
@@ -136,7 +136,7 @@ def get_details(
     if report_type == "Operational" or report_type == "Incidents":
         # Return Incidents from NOTES_DB + Some mock maintenance
         # Real Notes first
-        for i, note in enumerate(NOTES_DB):
+        for i, note in enumerate(all_notes()):
             if note.timestamp.startswith(date):
                 rows.append(DetailedRow(
                     id=note.id,
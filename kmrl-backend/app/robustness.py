@@ -0,0 +1,115 @@
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, NamedTuple, Optional
+
+import numpy as np
+
+from app.delays import MIN_PILOT_HANDOVER, MIN_TURNAROUND
+
+# ---------------- Monte Carlo Robustness ----------------
+# Thousands of stochastic delay days against the timetable's dependency
+# chains: the rake's previous trip (turnaround slack), the pilot's previous
+# trip (handover slack) and the train ahead on the same route (headway
+# slack). Each trip's knock-on delay is the worst predecessor delay minus the
+# slack in between; trips are settled in departure order with every scenario
+# as one vector lane. Scenarios are cut into fixed-size chunks with their own
+# child seeds, so results are identical however many worker processes run them.
+# Kept free of app state imports so pool workers start cheaply.
+
+PRIMARY_DELAY_MEAN = 0.5   # Minutes of everyday running / dwell overrun per trip (exponential)
+INCIDENT_PROB = 0.04       # Share of trips hit by an incident
+INCIDENT_MEAN = 4.0        # Minutes (exponential)
+MIN_SEPARATION = 1.5       # Minutes between following trains on the same route
+LATE_MINUTES = 5           # Arrival delay above this counts as late
+CHUNK_SIZE = 500           # Scenarios per task (fixed: part of the seed layout)
+WORKERS = int(os.getenv("ROBUSTNESS_WORKERS", str(os.cpu_count() or 1)))
+
+CHAIN_NAMES = ("train", "pilot", "line")
+
+class Chains(NamedTuple):
+    order: np.ndarray      # Store rows of the analysed trips, in departure order
+    prev: np.ndarray       # [chain, trip] position of the predecessor (-1 = none)
+    slack: np.ndarray      # [chain, trip] minutes of slack after the predecessor
+    base_delay: np.ndarray # Operator-entered delay already on each trip
+
+def _predecessors(codes: np.ndarray, dep: np.ndarray) -> np.ndarray:
+    """Position of the previous trip with the same code (by departure), -1 if none / unassigned."""
+    n = len(codes)
+    prev = np.full(n, -1)
+    by_code = np.lexsort((dep, codes))
+    same = (codes[by_code][1:] == codes[by_code][:-1]) & (codes[by_code][1:] >= 0)
+    prev[by_code[1:][same]] = by_code[:-1][same]
+    return prev
+
+def build_chains(rows: np.ndarray, dep: np.ndarray, arr: np.ndarray, train: np.ndarray,
+                 pilot: np.ndarray, route: np.ndarray, delay: np.ndarray) -> Chains:
+    """Column slices for the operating trips (departure order) -> dependency chains and their slack."""
+    prev = np.stack([_predecessors(train, dep), _predecessors(pilot, dep), _predecessors(route, dep)])
+    p = np.maximum(prev, 0)
+    slack = np.stack([
+        dep - arr[p[0]] - MIN_TURNAROUND,
+        dep - arr[p[1]] - MIN_PILOT_HANDOVER,
+        dep - dep[p[2]] - MIN_SEPARATION,
+    ]).astype(float)
+    slack[prev < 0] = np.inf
+    return Chains(rows, prev, slack, delay.astype(float))
+
+def run_chunk(chains: Chains, n_scenarios: int, seed: np.random.SeedSequence,
+              incident_prob: float = INCIDENT_PROB) -> Dict[str, np.ndarray]:
+    """One block of scenarios -> per-scenario punctuality / knock-on and per-trip tallies."""
+    rng = np.random.default_rng(seed)
+    n = len(chains.order)
+    primary = rng.exponential(PRIMARY_DELAY_MEAN, (n, n_scenarios))
+    primary += (rng.random((n, n_scenarios)) < incident_prob) * rng.exponential(INCIDENT_MEAN, (n, n_scenarios))
+
+    dep_delay = np.empty((n, n_scenarios))
+    arr_delay = np.empty((n, n_scenarios))
+    floor = np.zeros(n_scenarios)
+    for i in range(n):
+        knock = floor
+        for c, source in ((0, arr_delay), (1, arr_delay), (2, dep_delay)):
+            j = chains.prev[c, i]
+            if j >= 0:
+                knock = np.maximum(knock, source[j] - chains.slack[c, i])
+        dep_delay[i] = np.maximum(knock, chains.base_delay[i])
+        arr_delay[i] = dep_delay[i] + primary[i]
+
+    late = arr_delay > LATE_MINUTES
+    knock_on = np.maximum(dep_delay - chains.base_delay[:, None], 0)
+    return {
+        "punctuality": 100 - late.mean(axis=0) * 100 if n else np.full(n_scenarios, 100.0),
+        "knock_on_total": knock_on.sum(axis=0),
+        "late_count": late.sum(axis=1),
+        "delay_sum": arr_delay.sum(axis=1),
+        "knock_on_sum": knock_on.sum(axis=1),
+    }
+
+_POOL: Optional[ProcessPoolExecutor] = None
+_POOL_LOCK = threading.Lock()
+
+def _pool() -> ProcessPoolExecutor:
+    global _POOL
+    with _POOL_LOCK:
+        if _POOL is None:
+            _POOL = ProcessPoolExecutor(max_workers=WORKERS)
+        return _POOL
+
+def monte_carlo(chains: Chains, scenarios: int, seed: int = 0,
+                incident_prob: float = INCIDENT_PROB) -> Dict[str, np.ndarray]:
+    """Runs `scenarios` delay days, chunked across the process pool (inline with one worker)."""
+    sizes = [CHUNK_SIZE] * (scenarios // CHUNK_SIZE) + ([scenarios % CHUNK_SIZE] if scenarios % CHUNK_SIZE else [])
+    seeds = np.random.SeedSequence(seed).spawn(len(sizes))
+    args = (([chains] * len(sizes)), sizes, seeds, [incident_prob] * len(sizes))
+    if WORKERS > 1 and len(sizes) > 1:
+        parts: List[Dict[str, np.ndarray]] = list(_pool().map(run_chunk, *args))
+    else:
+        parts = [run_chunk(*a) for a in zip(*args)]
+
+    return {
+        "punctuality": np.concatenate([p["punctuality"] for p in parts]),
+        "knock_on_total": np.concatenate([p["knock_on_total"] for p in parts]),
+        "p_late": sum(p["late_count"] for p in parts) / scenarios,
+        "expected_delay": sum(p["delay_sum"] for p in parts) / scenarios,
+        "expected_knock_on": sum(p["knock_on_sum"] for p in parts) / scenarios,
+    }
@@ -0,0 +1,363 @@
+from fastapi import APIRouter, HTTPException
+from pydantic import BaseModel, Field
+from typing import Annotated, Dict, List, Literal, Optional, Set, Union
+from datetime import datetime
+import uuid
+import threading
+
+import numpy as np
+
+from app import fleet
+from app.fleet import FLEET_VERSION, TrainDetail, update_train
+from app.conflicts import Conflict
+from app.delays import DELAY_ALERT_MINUTES
+from app.schedule import SCHEDULE_LOCK, TRIPS_DB, TripUpdate, apply_trip_update
+from app.platforms import board_for, track_since
+from app.stations import STATION_REGISTRY
+from app.trip_store import TripStore, format_minutes, to_minutes
+from app.fast_json import FastJSONResponse
+
+scenarios_router = APIRouter(prefix="/scenarios", tags=["What-If Scenarios"])
+
+# ---------------- What-If Scenarios ----------------
+# A scenario forks the live timetable (copy-on-write TripStore), the fleet list
+# and the pilot roster, applies edits to the fork, and evaluates conflicts and
+# KPIs there. Commit swaps the fork into the live store if nothing changed live
+# since the fork; discard just drops it. Forks share every unedited column and
+# index array, so memory grows with the edits, not with the number of scenarios.
+
+PEAK_WINDOWS = [(8 * 60, 10 * 60), (17 * 60, 19 * 60)]
+ON_TIME_MINUTES = 5
+
+# --- Models ---
+
+class CancelRake(BaseModel):
+    type: Literal["cancel_rake"] = "cancel_rake"
+    train_set_id: str
+    reason: Optional[str] = None
+
+class PullPilot(BaseModel):
+    type: Literal["pull_pilot"] = "pull_pilot"
+    pilot_id: str
+
+class SetHeadway(BaseModel):
+    type: Literal["set_headway"] = "set_headway"
+    start: str  # HH:MM window on departures
+    end: str
+    headway_minutes: int = Field(ge=1, le=60)
+    route: Optional[str] = None  # All routes if omitted
+
+class EditTrip(TripUpdate):
+    type: Literal["update_trip"] = "update_trip"
+    id: str
+
+ScenarioEdit = Annotated[Union[CancelRake, PullPilot, SetHeadway, EditTrip], Field(discriminator="type")]
+
+class ScenarioCreate(BaseModel):
+    name: str
+
+class EditRequest(BaseModel):
+    edits: List[ScenarioEdit]
+
+class ScheduleKPIs(BaseModel):
+    trips_total: int
+    trips_operating: int
+    trips_cancelled: int
+    trips_delayed: int
+    punctuality: float        # % operating trips within ON_TIME_MINUTES
+    avg_delay_minutes: float
+    pilot_coverage: float     # % operating trips with a pilot
+    train_coverage: float     # % operating trips with a rake
+    peak_headway_minutes: Optional[float]
+    trains_available: int
+
+class ScenarioSummary(BaseModel):
+    id: str
+    name: str
+    created_at: str
+    base_version: int
+    edits: int
+    owned_bytes: int          # Memory not shared with the live timetable
+    kpis: ScheduleKPIs
+
+class ScenarioEvaluation(BaseModel):
+    scenario: ScenarioSummary
+    baseline: ScheduleKPIs
+    conflicts: List[Conflict]
+
+# --- State ---
+
+class Scenario:
+    def __init__(self, name: str):
+        self.id = str(uuid.uuid4())
+        self.name = name
+        self.created_at = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        self.base_version = TRIPS_DB.version
+        self.base_fleet_version = FLEET_VERSION.value
+        self.trips: TripStore = TRIPS_DB.fork()
+        self.fleet: List[TrainDetail] = fleet.FLEET_DB  # Immutable list; edits swap in a new one
+        self.unavailable_pilots: Set[str] = set()
+        self.edits: List[dict] = []
+        self.lock = threading.Lock()
+
+SCENARIOS: Dict[str, Scenario] = {}
+SCENARIOS_LOCK = threading.Lock()
+
+def _get(scenario_id: str) -> Scenario:
+    scenario = SCENARIOS.get(scenario_id)
+    if scenario is None:
+        raise HTTPException(status_code=404, detail="Scenario not found")
+    return scenario
+
+# --- Edits ---
+
+def _rows(store: TripStore, **equals) -> List[int]:
+    rows, _ = store.query(**equals)
+    return rows
+
+def _apply(scenario: Scenario, store: TripStore, fleet_list: List[TrainDetail], edit) -> List[TrainDetail]:
+    """Applies one edit to `store`; returns the (possibly replaced) fleet list."""
+    if isinstance(edit, CancelRake):
+        if not any(t.id == edit.train_set_id for t in fleet_list):
+            raise HTTPException(status_code=404, detail=f"Train {edit.train_set_id} not found")
+        for row in _rows(store, train=edit.train_set_id):
+            if store.value(row, "status") != "Cancelled":
+                store.update(row, status="Cancelled")
+        return [t.model_copy(update={"status": "Maintenance", "location": None})
+                if t.id == edit.train_set_id else t for t in fleet_list]
+
+    if isinstance(edit, PullPilot):
+        for row in _rows(store, pilot=edit.pilot_id):
+            store.update(row, pilot_id=None)
+        scenario.unavailable_pilots.add(edit.pilot_id)
+        return fleet_list
+
+    if isinstance(edit, SetHeadway):
+        try:
+            start, end = to_minutes(edit.start), to_minutes(edit.end)
+        except ValueError:
+            raise HTTPException(status_code=422, detail="start/end must be HH:MM")
+        routes = [edit.route] if edit.route else [r for r in store.interners["route"].values]
+        for route in routes:
+            rows = [r for r in _rows(store, start=start, end=end, route=route)
+                    if store.value(r, "status") != "Cancelled"]
+            if not rows:
+                continue
+            dep, arr = store.col("dep"), store.col("arr")
+            first = int(dep[rows[0]])
+            # Re-time from the window's first departure; durations are kept
+            retimed = [(r, first + k * edit.headway_minutes, int(arr[r]) - int(dep[r])) for k, r in enumerate(rows)]
+            for r, new_dep, duration in retimed:
+                store.update(r, departure_time=format_minutes(new_dep),
+                             arrival_time=format_minutes(new_dep + duration),
+                             frequency=f"+{edit.headway_minutes} mins")
+        return fleet_list
+
+    # update_trip
+    row = store.find(edit.id)
+    if row is None:
+        raise HTTPException(status_code=404, detail=f"Trip {edit.id} not found")
+    if edit.pilot_id in scenario.unavailable_pilots:
+        raise HTTPException(status_code=409, detail=f"Pilot {edit.pilot_id} is pulled in this scenario")
+    apply_trip_update(store, row, edit)
+    return fleet_list
+
+# --- Evaluation ---
+
+def schedule_kpis(store: TripStore, fleet_list: List[TrainDetail]) -> ScheduleKPIs:
+    n = len(store)
+    cancelled_code = store.code_of("status", "Cancelled")
+    operating = store.col("status") != cancelled_code if cancelled_code is not None else np.ones(n, dtype=bool)
+    delay = store.col("delay")[operating]
+    n_op = int(operating.sum())
+
+    def pct(mask) -> float:
+        return round(100.0 * int(mask.sum()) / n_op, 1) if n_op else 100.0
+
+    # Mean gap between consecutive operating departures per route inside peak windows
+    gaps = []
+    dep = store.col("dep")
+    for route in store.interners["route"].values:
+        for lo, hi in PEAK_WINDOWS:
+            rows = [r for r in _rows(store, start=lo, end=hi, route=route) if operating[r]]
+            if len(rows) > 1:
+                gaps.extend(np.diff(dep[rows]).tolist())
+
+    return ScheduleKPIs(
+        trips_total=n,
+        trips_operating=n_op,
+        trips_cancelled=n - n_op,
+        trips_delayed=int((delay > 0).sum()),
+        punctuality=pct(delay <= ON_TIME_MINUTES),
+        avg_delay_minutes=round(float(delay.mean()), 1) if n_op else 0.0,
+        pilot_coverage=pct(store.col("pilot")[operating] >= 0),
+        train_coverage=pct(store.col("train")[operating] >= 0),
+        peak_headway_minutes=round(float(np.mean(gaps)), 1) if gaps else None,
+        trains_available=len([t for t in fleet_list if t.status != "Maintenance"]),
+    )
+
+def _conflict(category, title, description, severity, entities) -> Conflict:
+    return Conflict(id=str(uuid.uuid4()), category=category, title=title, description=description,
+                    severity=severity, entities=entities)
+
+def schedule_conflicts(store: TripStore, fleet_list: List[TrainDetail], unavailable_pilots: Set[str]) -> List[Conflict]:
+    """Resource and platform clashes, uncovered trips, rakes in maintenance and large delays - O(n) over the indexes."""
+    conflicts = []
+    cancelled_code = store.code_of("status", "Cancelled")
+    dep, arr, status = store.col("dep"), store.col("arr"), store.col("status")
+    expected_dep = dep + store.col("delay")
+
+    # Double booking: consecutive operating trips of one pilot / rake overlap (at expected times)
+    for field, label in (("pilot", "Pilot"), ("train", "Train")):
+        for value in store.interners[field].values:
+            rows = [r for r in _rows(store, **{field: value}) if status[r] != cancelled_code]
+            for a, b in zip(rows, rows[1:]):
+                if expected_dep[b] < arr[a]:
+                    conflicts.append(_conflict(
+                        "Operational", f"{label} Double Booking",
+                        f"{label} {value} runs {store.trip_label(a)} until {format_minutes(int(arr[a]))} "
+                        f"but {store.trip_label(b)} departs {format_minutes(int(expected_dep[b]))}.",
+                        "Critical", [f"{label}: {value}", f"Trip: {store.trip_label(a)}", f"Trip: {store.trip_label(b)}"],
+                    ))
+
+    for a, b, station, platform in board_for(store).clashes():
+        name = STATION_REGISTRY.names[station]
+        conflicts.append(_conflict(
+            "Operational", "Platform Clash",
+            f"{store.trip_label(a)} and {store.trip_label(b)} both need {platform} at {name} "
+            f"around {format_minutes(int(dep[b]))}.",
+            "Critical", [f"Station: {name}", f"Platform: {platform}", f"Trip: {store.trip_label(a)}", f"Trip: {store.trip_label(b)}"],
+        ))
+
+    operating = status != cancelled_code if cancelled_code is not None else np.ones(len(store), dtype=bool)
+    for field, label in (("pilot", "Pilot"), ("train", "Rake")):
+        uncovered = np.flatnonzero(operating & (store.col(field) < 0))
+        if len(uncovered):
+            conflicts.append(_conflict(
+                "Staffing" if field == "pilot" else "Asset", f"Trips Without {label}",
+                f"{len(uncovered)} operating trips have no {label.lower()} assigned.",
+                "Critical", [f"Trip: {store.trip_label(int(r))}" for r in uncovered[:10]],
+            ))
+
+    for t in fleet_list:
+        if t.status != "Maintenance":
+            continue
+        rows = [r for r in _rows(store, train=t.id) if status[r] != cancelled_code]
+        if rows:
+            conflicts.append(_conflict(
+                "Asset", "Rake In Maintenance Scheduled",
+                f"Train {t.id} is in maintenance but still runs {len(rows)} trips.",
+                "Critical", [f"Train: {t.id}"] + [f"Trip: {store.trip_label(r)}" for r in rows[:5]],
+            ))
+
+    for pilot in unavailable_pilots:
+        rows = [r for r in _rows(store, pilot=pilot) if status[r] != cancelled_code]
+        if rows:
+            conflicts.append(_conflict(
+                "Staffing", "Pulled Pilot Still Assigned",
+                f"Pilot {pilot} is unavailable but assigned to {len(rows)} trips.",
+                "Critical", [f"Pilot: {pilot}"],
+            ))
+
+    late = np.flatnonzero(operating & (store.col("delay") > DELAY_ALERT_MINUTES))
+    if len(late):
+        conflicts.append(_conflict(
+            "Operational", "Knock-On Delays",
+            f"{len(late)} trips are delayed more than {DELAY_ALERT_MINUTES} minutes.",
+            "Warning", [f"Trip: {store.trip_label(int(r))}" for r in late[:10]],
+        ))
+    return conflicts
+
+def _summary(scenario: Scenario) -> ScenarioSummary:
+    return ScenarioSummary(
+        id=scenario.id,
+        name=scenario.name,
+        created_at=scenario.created_at,
+        base_version=scenario.base_version,
+        edits=len(scenario.edits),
+        owned_bytes=scenario.trips.owned_nbytes(),
+        kpis=schedule_kpis(scenario.trips, scenario.fleet),
+    )
+
+# --- Endpoints ---
+
+@scenarios_router.post("/", response_model=ScenarioSummary)
+def create_scenario(req: ScenarioCreate):
+    # fork() marks the live arrays as shared, so it needs the writer side
+    with SCHEDULE_LOCK.write():
+        scenario = Scenario(req.name)
+    with SCENARIOS_LOCK:
+        SCENARIOS[scenario.id] = scenario
+    return _summary(scenario)
+
+@scenarios_router.get("/", response_model=List[ScenarioSummary])
+def list_scenarios():
+    return [_summary(s) for s in list(SCENARIOS.values())]
+
+@scenarios_router.get("/{scenario_id}", response_model=ScenarioSummary)
+def get_scenario(scenario_id: str):
+    return _summary(_get(scenario_id))
+
+@scenarios_router.post("/{scenario_id}/edits", response_model=ScenarioSummary)
+def apply_edits(scenario_id: str, req: EditRequest):
+    """Applies edits in order. All-or-nothing: they run on a fork of the scenario itself."""
+    scenario = _get(scenario_id)
+    with scenario.lock:
+        board, base = board_for(scenario.trips), scenario.trips.version
+        trial = scenario.trips.fork()
+        fleet_list = scenario.fleet
+        pulled = set(scenario.unavailable_pilots)
+        try:
+            for edit in req.edits:
+                fleet_list = _apply(scenario, trial, fleet_list, edit)
+        except HTTPException:
+            scenario.unavailable_pilots = pulled
+            raise
+        scenario.trips.adopt(trial)
+        track_since(scenario.trips, board, base)
+        scenario.fleet = fleet_list
+        scenario.edits.extend(edit.model_dump() for edit in req.edits)
+    return _summary(scenario)
+
+@scenarios_router.get("/{scenario_id}/evaluate", response_model=ScenarioEvaluation)
+def evaluate_scenario(scenario_id: str):
+    scenario = _get(scenario_id)
+    with scenario.lock:
+        summary = _summary(scenario)
+        conflicts = schedule_conflicts(scenario.trips, scenario.fleet, scenario.unavailable_pilots)
+    with SCHEDULE_LOCK.read():
+        baseline = schedule_kpis(TRIPS_DB, fleet.FLEET_DB)
+    return ScenarioEvaluation(scenario=summary, baseline=baseline, conflicts=conflicts)
+
+@scenarios_router.get("/{scenario_id}/schedule")
+def get_scenario_schedule(scenario_id: str):
+    scenario = _get(scenario_id)
+    with scenario.lock:
+        return FastJSONResponse(scenario.trips.records(scenario.trips.order()))
+
+@scenarios_router.post("/{scenario_id}/commit")
+def commit_scenario(scenario_id: str):
+    """Makes the scenario live. Rejected if the live schedule or fleet changed since the fork."""
+    scenario = _get(scenario_id)
+    with scenario.lock, SCHEDULE_LOCK.write():
+        if TRIPS_DB.version != scenario.base_version or FLEET_VERSION.value != scenario.base_fleet_version:
+            raise HTTPException(status_code=409, detail="Live schedule changed since this scenario was forked")
+        # Fork versions continue from the base version, so ETags and delta sync stay valid
+        board = board_for(TRIPS_DB)
+        TRIPS_DB.adopt(scenario.trips)
+        track_since(TRIPS_DB, board, scenario.base_version)
+        base = {t.id: t for t in fleet.FLEET_DB}
+        for t in scenario.fleet:
+            if base.get(t.id) is not t:
+                update_train(t.id, **t.model_dump())
+    with SCENARIOS_LOCK:
+        SCENARIOS.pop(scenario_id, None)
+    return {"message": f"Scenario '{scenario.name}' committed", "edits": len(scenario.edits)}
+
+@scenarios_router.delete("/{scenario_id}")
+def discard_scenario(scenario_id: str):
+    with SCENARIOS_LOCK:
+        scenario = SCENARIOS.pop(scenario_id, None)
+    if scenario is None:
+        raise HTTPException(status_code=404, detail="Scenario not found")
+    return {"message": f"Scenario '{scenario.name}' discarded"}
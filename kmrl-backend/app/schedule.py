@@ -1,12 +1,24 @@
-from fastapi import APIRouter, HTTPException
-from pydantic import BaseModel
-from typing import List, Optional
-import uuid
-import random
-from datetime import datetime, timedelta
+from fastapi import APIRouter, HTTPException, Query, Request
+from pydantic import BaseModel, Field
+from typing import Dict, List, Optional, Tuple
+import time
+from datetime import datetime
 
-from app.staff import get_all_pilots
-from app.fleet import get_all_trains
+import numpy as np
+
+from app.staff import STAFF_VERSION, get_all_pilots
+from app.fleet import FLEET_VERSION, get_all_trains
+from app.stations import SERVICE_HOURS, STATION_REGISTRY
+from app.trip_store import FIELDS, TripStore, format_minutes, to_minutes
+from app.concurrency import RWLock, locked
+from app.delays import DAY_END, DelayImpact, apply_delays, propagate_delay
+from app.http_cache import ResponseCache, parse_version_token, version_token
+from app.timetable import TRAIN_CAPACITY, HourPlan, build_timetable, forecast_demand, plan_headways
+from app.network import NETWORK
+from app.robustness import CHAIN_NAMES, INCIDENT_PROB, WORKERS, build_chains, monte_carlo
+from app.passenger_load import gravity_od, segment_loads, segment_name, trip_loads
+from app.duty import MAX_DRIVING_MINUTES, duty_violation, pilot_duty
+from app.platforms import PLATFORMS, PlatformBoard, Timeline, board_for, occupancy, platforms_for, reallocate, track_since
 
 schedule_router = APIRouter(prefix="/schedule", tags=["Service Schedule"])
 
@@ -29,11 +41,11 @@ class Trip(BaseModel):
     train_set_id: Optional[str] = None
     pilot_id: Optional[str] = None
     departure_time: str 
-    arrival_time: str 
+    arrival_time: str = "" # Omit for runs between line stations: computed from the network model
     frequency: str = "+10 mins"
     status: str = "Scheduled" 
     delay_minutes: int = 0
-    platform: str = "Platform 1"
+    platform: str = "" # Omit to allocate a free platform at the origin
     
 class TripUpdate(BaseModel):
     departure_time: Optional[str] = None
@@ -44,187 +56,783 @@ class TripUpdate(BaseModel):
     platform: Optional[str] = None
     cancellation_reason: Optional[str] = None
 
+class BulkTripUpdate(TripUpdate):
+    id: str
+
+class BulkCancellation(BaseModel):
+    id: str
+    cancellation_reason: Optional[str] = None
+
+class BulkRequest(BaseModel):
+    inserts: List[Trip] = []
+    updates: List[BulkTripUpdate] = []
+    cancellations: List[BulkCancellation] = []
+
+class BulkResult(BaseModel):
+    inserted: int
+    updated: int
+    cancelled: int
+
+class SynthesisRequest(BaseModel):
+    date: Optional[str] = None # YYYY-MM-DD, defaults to today
+    weather: Optional[str] = None
+    holiday: bool = False
+    demand: Optional[Dict[str, List[float]]] = None # Station -> hourly boardings (06:00-22:00); overrides the forecast
+    load_factor: float = Field(1.0, gt=0, le=1.5) # Target share of TRAIN_CAPACITY per train
+    apply: bool = True # False = preview only
+
+class TripLoad(BaseModel):
+    trip_id: str
+    route: str
+    departure_time: str
+    peak_load: int # Passengers on board over the busiest segment
+    load_percent: float # Of TRAIN_CAPACITY
+    peak_segment: Optional[str] = None
+
+class RobustnessRequest(BaseModel):
+    scenarios: int = Field(2000, ge=1, le=100000)
+    seed: int = 0
+    incident_prob: float = Field(INCIDENT_PROB, ge=0, le=1)
+    top: int = Field(10, ge=0, le=200) # How many at-risk trips to list
+
+class AtRiskTrip(BaseModel):
+    trip_id: str
+    departure_time: str
+    route: str
+    train_set_id: Optional[str] = None
+    pilot_id: Optional[str] = None
+    p_late: float # Share of scenarios arriving > LATE_MINUTES late
+    expected_delay: float
+    expected_knock_on: float # Minutes inherited from earlier trips
+    min_slack: Optional[float] = None # Tightest train / pilot / headway slack before this trip
+
+class RobustnessReport(BaseModel):
+    scenarios: int
+    seed: int
+    trips: int
+    workers: int
+    elapsed_ms: float
+    punctuality: Dict[str, float] # mean / p5 / p50 / p95 across scenarios
+    expected_knock_on_minutes: float # Per day, summed over trips
+    slack: Dict[str, Dict[str, float]] # Per chain: min / p10 / median minutes, tight (< 2 min) count
+    at_risk: List[AtRiskTrip]
+
+class DelayRequest(BaseModel):
+    delay_minutes: int
+    dry_run: bool = False # Evaluate the knock-on impact without applying it
+
+class PlatformSlot(BaseModel):
+    id: str
+    trip_id: str
+    station: str
+    platform: str
+    start: str           # Rake at the platform
+    end: str             # Platform clear
+    clash: bool
+
+class PilotDuty(BaseModel):
+    pilot_id: str
+    name: str
+    trips: int
+    driving_minutes: int
+    remaining_minutes: int           # Driving left today
+    longest_spell: int               # Minutes on duty without a break
+    breaks: int
+    on_duty_minutes: Optional[int] = None  # Continuous duty at `at`, when asked
+
 # --- State ---
 
-TRIPS_DB: List[Trip] = []
+# Columnar store; pydantic Trip objects are only built at the API boundary
+TRIPS_DB = TripStore()
+# Readers share it, mutations are exclusive (taken once per endpoint)
+SCHEDULE_LOCK = RWLock()
+# Serialized GET bodies, keyed by the store versions they were built from
+SCHEDULE_CACHE = ResponseCache("schedule")
+
+def _trip(row: int) -> Trip:
+    return Trip(**TRIPS_DB.record(row))
 
 # --- Logic Helper (Must be defined before generation) ---
 
-def check_resource_overlap(trip_id: str, pilot_id: Optional[str], train_id: Optional[str], departure: str, arrival: str) -> Optional[str]:
+def check_resource_overlap(trip_id: str, pilot_id: Optional[str], train_id: Optional[str], departure: str, arrival: str,
+                           store: Optional[TripStore] = None, delay: int = 0) -> Optional[str]:
     """
     Checks if the given Pilot or Train is already assigned to a trip that overlaps with the proposed time window.
+    `arrival` is the expected (delay-shifted) arrival, as stored; `delay` shifts the planned departure to match.
+    `store` defaults to the live timetable (scenarios pass their fork).
     """
+    if store is None:
+        store = TRIPS_DB
     try:
-        proposed_start = datetime.strptime(departure, "%H:%M")
-        proposed_end = datetime.strptime(arrival, "%H:%M")
+        proposed_start = to_minutes(departure) + delay
+        proposed_end = to_minutes(arrival)
     except ValueError:
         return None # Return None if format invalid (safeguard)
 
-    for t in TRIPS_DB:
-        if t.id == trip_id: continue 
-        if t.status == "Cancelled": continue 
-        
-        try:
-            t_start = datetime.strptime(t.departure_time, "%H:%M")
-            t_end = datetime.strptime(t.arrival_time, "%H:%M")
-        except ValueError:
-            continue
+    row = store.find_overlap(proposed_start, proposed_end, pilot=pilot_id, train=train_id,
+                             exclude_row=store.find(trip_id))
+    if row is None:
+        return None
+
+    t = store.record(row)
+    if pilot_id and t["pilot_id"] == pilot_id:
+        return f"Pilot is already assigned to {t['trip_id']} ({t['departure_time']}-{t['arrival_time']})"
+    return f"Train {t['train_set_id']} is already assigned to {t['trip_id']} ({t['departure_time']}-{t['arrival_time']})"
 
-        # Overlap exists if (StartA < EndB) and (EndA > StartB)
-        if proposed_start < t_end and proposed_end > t_start:
-            if pilot_id and t.pilot_id == pilot_id:
-                return f"Pilot is already assigned to {t.trip_id} ({t.departure_time}-{t.arrival_time})"
-            if train_id and t.train_set_id == train_id:
-                return f"Train {t.train_set_id} is already assigned to {t.trip_id} ({t.departure_time}-{t.arrival_time})"
-    return None
+def trip_arrival(route: str, departure: str, duration: Optional[int] = None) -> str:
+    """Arrival for a departure on `route` from the network travel times, else `duration` minutes later."""
+    dep = _parse_time(departure, "departure_time")
+    minutes = NETWORK.route_minutes(route, dep)
+    if minutes is None:
+        minutes = duration
+    if minutes is None:
+        raise HTTPException(status_code=422, detail=f"arrival_time is required for route '{route}' (not a run between line stations)")
+    return format_minutes(dep + minutes)
+
+def allocate_platform(store: TripStore, board: PlatformBoard, row: Optional[int], route: str, dep: int,
+                      requested: Optional[str] = None, current: Optional[str] = None) -> str:
+    """
+    Platform for a departure at its origin: `requested` if it is free, else
+    `current` or any other free one. 409 when the platform / station is full.
+    """
+    occ = occupancy(route, dep)
+    if occ is None:
+        return requested or current or PLATFORMS[0]
+    station = STATION_REGISTRY.names[occ.station]
+    if requested:
+        if requested not in platforms_for(occ):
+            raise HTTPException(status_code=422, detail=f"{requested} at {station} does not serve {route}")
+        clash = [r for r in board.timeline(occ.station, requested).overlapping(occ.start, occ.end) if r != row]
+        if clash:
+            raise HTTPException(status_code=409, detail=f"{requested} at {station} is occupied by {store.trip_label(clash[0])} "
+                                                        f"({format_minutes(occ.start)}-{format_minutes(occ.end)})")
+        return requested
+    platform = board.allocate(occ, row, current)
+    if platform is None:
+        raise HTTPException(status_code=409, detail=f"No free platform at {station} for a {format_minutes(dep)} departure")
+    return platform
 
 # --- Schedule Generation ---
 
+def synthesize_schedule(demand: np.ndarray, load_factor: float = 1.0) -> Tuple[List[HourPlan], List[dict]]:
+    """Demand [stations, service hours] -> hourly plan and trips, with resources in roster / fleet order."""
+    pilots = [p.id for p in get_all_pilots()]
+    rakes = [t.id for t in get_all_trains() if t.status != "Maintenance"]
+    plan = plan_headways(demand, len(rakes), load_factor=load_factor)
+    return plan, build_timetable(plan, pilots, rakes)
+
+def _load_schedule(trips: List[dict]):
+    # Resource indexes follow roster / fleet order
+    for p in get_all_pilots(): TRIPS_DB.interners["pilot"].code(p.id)
+    for t in get_all_trains(): TRIPS_DB.interners["train"].code(t.id)
+    TRIPS_DB.insert_many(trips)
+
 def generate_initial_schedule():
-    global TRIPS_DB
-    if TRIPS_DB: return
-    
-    # Gapless Schedule Generation (06:00 - 22:00)
-    current_time = datetime.strptime("06:00", "%H:%M")
-    end_time = datetime.strptime("22:00", "%H:%M")
-    
-    trip_counter = 1001
-    
-    # Fetch Central Resources
-    pilots = get_all_pilots()
-    trains = get_all_trains()
-    
-    # Availability Pools
-    pilot_pool = [p for p in pilots]
-    train_pool = [t for t in trains if t.status != "Maintenance"]
-    
-    while current_time < end_time:
-        # Determine Frequency
-        hour = current_time.hour
-        
-        if 8 <= hour < 11 or 16 <= hour < 20:
-            freq = 10 # Peak
-        elif 20 <= hour:
-            freq = 20 # Night
-        else:
-            freq = 15 # Off-peak
-            
-        duration = 45 # Standard trip time
-        
-        # Create Trip Meta
-        direction = "Aluva -> Petta" if trip_counter % 2 != 0 else "Petta -> Aluva"
-        platform = "Platform 1" if trip_counter % 2 != 0 else "Platform 2"
-        arrival = current_time + timedelta(minutes=duration)
-        
-        trip_id_str = str(uuid.uuid4())
-        trip_friendly_id = f"TR-{trip_counter}"
-        dept_str = current_time.strftime("%H:%M")
-        arr_str = arrival.strftime("%H:%M")
-        
-        # --- Smart Assignment ---
-        assigned_pilot = None
-        assigned_train = None
-
-        # Find first available Pilot
-        for p in pilot_pool:
-            if not check_resource_overlap(trip_id_str, p.id, None, dept_str, arr_str):
-                assigned_pilot = p.id
-                break
-        
-        # Find first available Train
-        for t in train_pool:
-            if not check_resource_overlap(trip_id_str, None, t.id, dept_str, arr_str):
-                assigned_train = t.id
-                # Rotate the pool for load distribution
-                train_pool.append(train_pool.pop(0)) 
-                break
-        
-        if assigned_pilot and pilot_pool:
-             # Rotate pilot pool too
-             pilot_pool.append(pilot_pool.pop(0))
-
-        # Simulate Status
-        status = "Scheduled"
-        
-        TRIPS_DB.append(Trip(
-            id=trip_id_str,
-            trip_id=trip_friendly_id,
-            route=direction,
-            departure_time=dept_str,
-            arrival_time=arr_str,
-            frequency=f"+{freq} mins",
-            pilot_id=assigned_pilot,
-            train_set_id=assigned_train,
-            status=status,
-            platform=platform
-        ))
-        
-        current_time += timedelta(minutes=freq)
-        trip_counter += 1
+    if len(TRIPS_DB): return
+
+    # Headways follow today's local forecast rather than a fixed peak / off-peak pattern
+    _, trips = synthesize_schedule(forecast_demand(datetime.now().weekday()))
+    _load_schedule(trips)
 
 # Initialize
 generate_initial_schedule()
 
 # --- Endpoints ---
 
+def _parse_time(value: Optional[str], name: str) -> Optional[int]:
+    if value is None:
+        return None
+    try:
+        return to_minutes(value)
+    except ValueError:
+        raise HTTPException(status_code=422, detail=f"{name} must be HH:MM")
+
 @schedule_router.get("/", response_model=List[Trip])
-def get_schedule():
-    return TRIPS_DB
+@locked(SCHEDULE_LOCK.read)
+def get_schedule(
+    request: Request,
+    start: Optional[str] = Query(None, description="Departures at or after HH:MM"),
+    end: Optional[str] = Query(None, description="Departures before HH:MM"),
+    route: Optional[str] = None,
+    status: Optional[str] = None,
+    pilot_id: Optional[str] = None,
+    train_set_id: Optional[str] = None,
+    platform: Optional[str] = None,
+    limit: Optional[int] = Query(None, ge=1, le=1000, description="Page size (e.g. next N departures)"),
+    cursor: Optional[str] = Query(None, description="X-Next-Cursor from the previous page"),
+    fields: Optional[str] = Query(None, description="Comma separated Trip fields to return"),
+    since: Optional[str] = Query(None, description="Delta mode: X-Version from a previous response"),
+):
+    """
+    Trips in departure order. All filters are optional; with none given the full
+    timetable is returned. When more rows remain, the X-Next-Cursor header holds the
+    cursor for the next page. Responses carry an ETag of the timetable version and query.
+
+    Delta mode (`since` given): returns {"version", "full", "trips"} with only the
+    trips changed after that version; "full" is true when the client must replace
+    its copy instead (unknown token, or the timetable was reset since).
+    """
+    # Validated up front: a bad request is a 422 even with a matching If-None-Match
+    after = None
+    if cursor:
+        try:
+            after = int(cursor, 16)
+        except ValueError:
+            raise HTTPException(status_code=422, detail="Invalid cursor")
+
+    projection = None
+    if fields:
+        # Partial rows don't fit the Trip schema; they are returned as-is
+        projection = [f.strip() for f in fields.split(",") if f.strip()]
+        unknown = [f for f in projection if f not in FIELDS]
+        if unknown:
+            raise HTTPException(status_code=422, detail=f"Unknown fields: {', '.join(unknown)}")
+
+    start_minute, end_minute = _parse_time(start, "start"), _parse_time(end, "end")
+
+    def build():
+        changed_since = parse_version_token(since)
+        if changed_since is not None and changed_since < TRIPS_DB.cleared_at:
+            changed_since = None
+
+        filters = {"route": route, "status": status, "pilot": pilot_id, "train": train_set_id, "platform": platform}
+        rows, next_key = TRIPS_DB.query(
+            start=start_minute,
+            end=end_minute,
+            after=after,
+            limit=limit,
+            changed_since=changed_since,
+            **{k: v for k, v in filters.items() if v is not None}
+        )
+        version = version_token(TRIPS_DB.version)
+        headers = {"X-Version": version}
+        if next_key is not None:
+            headers["X-Next-Cursor"] = f"{next_key:x}"
+
+        records = TRIPS_DB.records(rows, projection)
+        if since is not None:
+            return {"version": version, "full": changed_since is None, "trips": records}, headers
+        return records, headers
+
+    return SCHEDULE_CACHE.respond(request, (TRIPS_DB.version,), build)
 
 @schedule_router.post("/trip", response_model=Trip)
+@locked(SCHEDULE_LOCK.write)
 def add_trip(trip: Trip):
-    error = check_resource_overlap(trip.id, trip.pilot_id, trip.train_set_id, trip.departure_time, trip.arrival_time)
+    if not trip.arrival_time:
+        trip.arrival_time = trip_arrival(trip.route, trip.departure_time)
+    error = check_resource_overlap(trip.id, trip.pilot_id, trip.train_set_id, trip.departure_time, trip.arrival_time,
+                                   delay=trip.delay_minutes)
+    if not error and trip.status != "Cancelled":
+        error = duty_violation(TRIPS_DB, trip.pilot_id, _parse_time(trip.departure_time, "departure_time") + trip.delay_minutes,
+                               _parse_time(trip.arrival_time, "arrival_time"))
     if error:
         raise HTTPException(status_code=409, detail=error)
 
-    TRIPS_DB.append(trip)
-    TRIPS_DB.sort(key=lambda x: x.departure_time)
-    return trip
+    board = board_for(TRIPS_DB)
+    if trip.status != "Cancelled":
+        dep = _parse_time(trip.departure_time, "departure_time")
+        trip.platform = allocate_platform(TRIPS_DB, board, None, trip.route, dep, trip.platform or None)
+    trip.platform = trip.platform or PLATFORMS[0]
+
+    try:
+        row = TRIPS_DB.insert(trip.model_dump())
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    board.track(TRIPS_DB, [row])
+    return _trip(row)
 
 @schedule_router.put("/trip/{id}", response_model=Trip)
+@locked(SCHEDULE_LOCK.write)
 def update_trip(id: str, update: TripUpdate):
-    for trip in TRIPS_DB:
-        if trip.id == id:
-            new_pilot = update.pilot_id if update.pilot_id is not None else trip.pilot_id
-            new_train = update.train_set_id if update.train_set_id is not None else trip.train_set_id
-            new_dept = update.departure_time if update.departure_time else trip.departure_time
-            new_arrival = trip.arrival_time 
-            
-            error = check_resource_overlap(trip.id, new_pilot, new_train, new_dept, new_arrival)
-            if error:
-                raise HTTPException(status_code=409, detail=error)
-
-            if update.departure_time: trip.departure_time = update.departure_time
-            if update.delay_minutes is not None: 
-                trip.delay_minutes = update.delay_minutes
-                if trip.delay_minutes > 0 and trip.status == "Scheduled":
-                    trip.status = "Delayed"
-                if trip.delay_minutes == 0 and trip.status == "Delayed":
-                    trip.status = "Scheduled"
-            if update.status: trip.status = update.status
-            if update.pilot_id: trip.pilot_id = update.pilot_id
-            if update.train_set_id: trip.train_set_id = update.train_set_id
-            if update.platform: trip.platform = update.platform
-            
-            return trip
-    raise HTTPException(status_code=404, detail="Trip not found")
+    row = TRIPS_DB.find(id)
+    if row is None:
+        raise HTTPException(status_code=404, detail="Trip not found")
+    apply_trip_update(TRIPS_DB, row, update)
+    return _trip(row)
+
+def apply_trip_update(store: TripStore, row: int, update: TripUpdate):
+    """Validates and applies a TripUpdate to `row` (live timetable or a scenario fork)."""
+    trip = store.record(row)
+    new_pilot = update.pilot_id if update.pilot_id is not None else trip["pilot_id"]
+    new_train = update.train_set_id if update.train_set_id is not None else trip["train_set_id"]
+    new_dept = update.departure_time if update.departure_time else trip["departure_time"]
+    delay = trip["delay_minutes"]
+    new_arrival = trip["arrival_time"]
+    if update.departure_time:
+        # Re-time the arrival from the network (off-line routes keep their duration); it stays delay-shifted
+        old_duration = to_minutes(trip["arrival_time"]) - delay - to_minutes(trip["departure_time"])
+        planned = trip_arrival(trip["route"], new_dept, old_duration)
+        new_arrival = format_minutes(to_minutes(planned) + delay)
+    if update.delay_minutes is not None:
+        shifted = to_minutes(new_arrival) + update.delay_minutes - delay
+        if shifted > DAY_END:
+            raise HTTPException(status_code=422, detail=f"A {update.delay_minutes} min delay would move the arrival "
+                                                        f"past the end of the service day ({format_minutes(DAY_END)})")
+
+    # Only a new pilot, rake or departure can create a clash; status / delay / platform edits can't
+    if update.pilot_id or update.train_set_id or update.departure_time:
+        error = check_resource_overlap(trip["id"], new_pilot, new_train, new_dept, new_arrival, store, delay)
+        if not error:
+            error = duty_violation(store, new_pilot, to_minutes(new_dept) + delay, to_minutes(new_arrival), row)
+        if error:
+            raise HTTPException(status_code=409, detail=error)
+
+    # A new platform or departure needs the platform free over the new dwell
+    board = board_for(store)
+    platform = trip["platform"]
+    if update.platform or update.departure_time:
+        platform = allocate_platform(store, board, row, trip["route"], to_minutes(new_dept), update.platform, trip["platform"])
+
+    changes = {}
+    if update.departure_time: changes.update(departure_time=update.departure_time, arrival_time=new_arrival)
+    if update.pilot_id: changes["pilot_id"] = update.pilot_id
+    if update.train_set_id: changes["train_set_id"] = update.train_set_id
+    if platform != trip["platform"]: changes["platform"] = platform
+
+    try:
+        store.update(row, **changes)
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+
+    # Delay knocks on to later trips of the same rake / pilot (also sets Delayed status).
+    # It validates every affected trip before writing; if one would overrun the service
+    # day, the row's own changes above are rolled back so the edit is all or nothing.
+    if update.delay_minutes is not None:
+        try:
+            propagate_delay(store, row, update.delay_minutes)
+        except ValueError as e:
+            store.update(row, **{field: trip[field] for field in changes})
+            board.track(store, [row])
+            raise HTTPException(status_code=422, detail=str(e))
+    if update.status:
+        store.update(row, status=update.status)
+    board.track(store, [row])   # Knock-on delays don't move bookings: they follow planned departures
+
+@schedule_router.post("/trip/{id}/delay", response_model=DelayImpact)
+@locked(SCHEDULE_LOCK.write)
+def delay_trip(id: str, req: DelayRequest):
+    """Applies (or with dry_run, only evaluates) a delay and its downstream knock-on."""
+    row = TRIPS_DB.find(id)
+    if row is None:
+        raise HTTPException(status_code=404, detail="Trip not found")
+    board = board_for(TRIPS_DB)
+    try:
+        impact = propagate_delay(TRIPS_DB, row, req.delay_minutes, apply=not req.dry_run)
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    # Bookings follow planned departures, so delays leave them as they are
+    board.track(TRIPS_DB, [row])
+    return impact
+
+def _validate_bulk(req: BulkRequest):
+    """
+    Resolves every batch item to its final (dep, arr, pilot, train) and checks
+    pilot/train overlaps in one sweep per touched resource, covering both the
+    existing schedule and other items of the same batch.
+    Returns (errors, planned row changes).
+    """
+    errors = []
+    planned = {}     # row -> field changes
+    proposals = []   # (label, dep, arr, pilot, train, row or None)
+    placements = []  # (item, trip label, route, planned dep, requested, current platform, Trip / changes to set it on)
+    touched = set()
+    released = set() # Rows whose current platform booking the batch gives up
+    ids = set()
+
+    for i, t in enumerate(req.inserts):
+        if t.id in ids or TRIPS_DB.find(t.id) is not None:
+            errors.append(f"inserts[{i}]: trip id {t.id} already exists")
+            continue
+        ids.add(t.id)
+        try:
+            dep, arr = to_minutes(t.departure_time), to_minutes(t.arrival_time)
+        except ValueError as e:
+            errors.append(f"inserts[{i}]: {e}")
+            continue
+        if t.status != "Cancelled":
+            proposals.append((t.trip_id, dep + t.delay_minutes, arr, t.pilot_id, t.train_set_id, None))
+            placements.append((f"inserts[{i}]", t.trip_id, t.route, dep, t.platform or None, None, t))
+        else:
+            t.platform = t.platform or PLATFORMS[0]
+
+    for i, u in enumerate(req.updates):
+        row = TRIPS_DB.find(u.id)
+        if row is None or row in touched:
+            errors.append(f"updates[{i}]: trip {u.id} " + ("not found" if row is None else "appears twice in batch"))
+            continue
+        touched.add(row)
+        trip = TRIPS_DB.record(row)
+        changes = {k: v for k, v in u.model_dump(exclude={"id", "cancellation_reason"}).items() if v is not None}
+        try:
+            dep = to_minutes(changes.get("departure_time", trip["departure_time"]))
+            arr = to_minutes(trip["arrival_time"])
+        except ValueError as e:
+            errors.append(f"updates[{i}]: {e}")
+            continue
+        planned_dep = dep
+        if "departure_time" in changes:
+            # Re-timed like a single update: network run time, or the old duration off the line
+            old_duration = arr - trip["delay_minutes"] - to_minutes(trip["departure_time"])
+            arr = to_minutes(trip_arrival(trip["route"], changes["departure_time"], old_duration)) + trip["delay_minutes"]
+        shifted = arr   # Arrival under the current delay, as stored before the new delay is applied
+        if "delay_minutes" in changes:
+            arr += changes["delay_minutes"] - trip["delay_minutes"]
+        if max(arr, shifted) > DAY_END:
+            errors.append(f"updates[{i}]: trip {u.id} would arrive past the end of the service day")
+            continue
+        if "departure_time" in changes:
+            changes["arrival_time"] = format_minutes(shifted)
+        dep += changes.get("delay_minutes", trip["delay_minutes"])  # Compared at expected times
+        planned[row] = changes
+        if changes.get("status", trip["status"]) != "Cancelled":
+            proposals.append((trip["trip_id"], dep, arr, changes.get("pilot_id", trip["pilot_id"]),
+                              changes.get("train_set_id", trip["train_set_id"]), row))
+            # A new departure or platform (or a trip coming back into service) is placed again
+            if "departure_time" in changes or "platform" in changes or trip["status"] == "Cancelled":
+                released.add(row)
+                placements.append((f"updates[{i}]", trip["trip_id"], trip["route"], planned_dep,
+                                   changes.get("platform"), trip["platform"], changes))
+        else:
+            released.add(row)
+
+    for i, c in enumerate(req.cancellations):
+        row = TRIPS_DB.find(c.id)
+        if row is None or row in touched:
+            errors.append(f"cancellations[{i}]: trip {c.id} " + ("not found" if row is None else "appears twice in batch"))
+            continue
+        touched.add(row)
+        released.add(row)
+        planned[row] = {"status": "Cancelled"}
+
+    # --- One sweep per touched pilot / train ---
+    intervals = {}
+    for label, dep, arr, pilot, train, row in proposals:
+        if pilot: intervals.setdefault(("pilot", pilot), []).append((dep, arr, label, True))
+        if train: intervals.setdefault(("train", train), []).append((dep, arr, label, True))
+
+    cancelled_code = TRIPS_DB.code_of("status", "Cancelled")
+    for (field, value), items in intervals.items():
+        rows, _ = TRIPS_DB.query(end=max(i[1] for i in items), **{field: value})
+        for r in rows:
+            if r in touched or TRIPS_DB.col("status")[r] == cancelled_code:
+                continue # Replaced / cancelled by this batch, or not running
+            items.append((int(TRIPS_DB.col("dep")[r] + TRIPS_DB.col("delay")[r]), int(TRIPS_DB.col("arr")[r]),
+                          TRIPS_DB.trip_label(r), False))
+
+        items.sort()
+        latest = None
+        for item in items:
+            if latest and item[0] < latest[1] and (item[3] or latest[3]):
+                kind = "Pilot" if field == "pilot" else "Train"
+                errors.append(f"{kind} {value} double-booked: {latest[2]} ({format_minutes(latest[0])}-{format_minutes(latest[1])}) "
+                              f"overlaps {item[2]} ({format_minutes(item[0])}-{format_minutes(item[1])})")
+            if latest is None or item[1] > latest[1]:
+                latest = item
+
+    # --- Duty limits per touched pilot: its untouched trips, then batch items in order ---
+    for (field, pilot), items in intervals.items():
+        if field != "pilot":
+            continue
+        duty = pilot_duty(TRIPS_DB, pilot, touched).copy()
+        for dep, arr, label, proposed in sorted(i for i in items if i[3]):
+            reason = duty.limits(dep, arr)
+            if reason:
+                errors.append(f"Pilot {pilot} cannot take {label} ({format_minutes(dep)}-{format_minutes(arr)}): {reason}")
+            duty.add(dep, arr)
+
+    # --- Platforms: placed in departure order against the board and the batch, as single edits are ---
+    board = board_for(TRIPS_DB)
+    batch: Dict[Tuple[int, str], Timeline] = {}
+    batch_labels = []
+    for item, label, route, dep, requested, current, target in sorted(placements, key=lambda p: p[3]):
+        occ = occupancy(route, dep)
+        if occ is None:
+            platform = requested or current or PLATFORMS[0]
+        else:
+            station = STATION_REGISTRY.names[occ.station]
+            window = f"{format_minutes(occ.start)}-{format_minutes(occ.end)}"
+            if requested:
+                if requested not in platforms_for(occ):
+                    errors.append(f"{item}: {requested} at {station} does not serve {route}")
+                    continue
+                other = _platform_taken(board, batch, batch_labels, released, occ, requested)
+                if other:
+                    errors.append(f"{item}: {requested} at {station} is occupied by {other} ({window})")
+                    continue
+                platform = requested
+            else:
+                choices = platforms_for(occ)
+                if current in choices:
+                    choices = (current,) + tuple(p for p in choices if p != current)
+                platform = next((p for p in choices
+                                 if not _platform_taken(board, batch, batch_labels, released, occ, p)), None)
+                if platform is None:
+                    errors.append(f"{item}: no free platform at {station} for {label} ({window})")
+                    continue
+            batch.setdefault((occ.station, platform), Timeline()).add(len(batch_labels), occ.start, occ.end)
+            batch_labels.append(label)
+        if isinstance(target, Trip):
+            target.platform = platform
+        elif platform != current:
+            target["platform"] = platform
+
+    return errors, planned
+
+def _platform_taken(board: PlatformBoard, batch: Dict[Tuple[int, str], Timeline], batch_labels: List[str],
+                    released: set, occ, platform: str) -> Optional[str]:
+    """Label of a trip (live, and not re-placed by the batch, or earlier in the batch) on `platform` over `occ`."""
+    live = [r for r in board.timeline(occ.station, platform).overlapping(occ.start, occ.end) if r not in released]
+    if live:
+        return TRIPS_DB.trip_label(live[0])
+    line = batch.get((occ.station, platform))
+    hits = line.overlapping(occ.start, occ.end) if line is not None else []
+    return batch_labels[hits[0]] if hits else None
+
+@schedule_router.post("/bulk", response_model=BulkResult)
+@locked(SCHEDULE_LOCK.write)
+def bulk_update(req: BulkRequest):
+    """
+    Applies a batch of inserts, updates and cancellations atomically: the whole
+    batch is validated first and rejected (409) if any item fails.
+    """
+    # Inserts without an arrival are timed from the network, as single inserts are
+    for i, t in enumerate(req.inserts):
+        if not t.arrival_time:
+            try:
+                t.arrival_time = trip_arrival(t.route, t.departure_time)
+            except HTTPException as e:
+                raise HTTPException(status_code=422, detail=f"inserts[{i}]: {e.detail}")
+    errors, planned = _validate_bulk(req)
+    if errors:
+        raise HTTPException(status_code=409, detail={"message": "Batch rejected", "errors": errors})
+
+    board = board_for(TRIPS_DB)
+    inserted = TRIPS_DB.insert_many([t.model_dump() for t in req.inserts])
+
+    for row, changes in planned.items():
+        delay = changes.pop("delay_minutes", None)
+        status = changes.pop("status", None)
+        TRIPS_DB.update(row, **changes)
+        # Planners send final delays, so no chain propagation here
+        if delay is not None:
+            apply_delays(TRIPS_DB, {row: delay}, own_rows=(row,))
+        if status:
+            TRIPS_DB.update(row, status=status)
+    # Platforms were settled by validation; the board follows the written rows
+    board.track(TRIPS_DB, inserted + list(planned))
+
+    return BulkResult(inserted=len(req.inserts), updated=len(req.updates), cancelled=len(req.cancellations))
 
 @schedule_router.post("/reset")
+@locked(SCHEDULE_LOCK.write)
 def reset_schedule():
     """Resets the schedule to the initial state."""
-    global TRIPS_DB
-    TRIPS_DB = []
+    TRIPS_DB.clear()
     generate_initial_schedule()
+    board_for(TRIPS_DB)   # Built here under the write lock, not by the next reader
     return {"message": "Schedule reset to default."}
 
+@schedule_router.post("/synthesize")
+@locked(SCHEDULE_LOCK.write)
+def synthesize(req: SynthesisRequest):
+    """Rebuilds the day's timetable from hourly demand (forecast unless given)."""
+    try:
+        day = datetime.strptime(req.date, "%Y-%m-%d") if req.date else datetime.now()
+    except ValueError:
+        raise HTTPException(status_code=422, detail="date must be YYYY-MM-DD")
+
+    started = time.perf_counter()
+    demand = forecast_demand(day.weekday(), req.weather, req.holiday)
+    for name, hourly in (req.demand or {}).items():
+        station = STATION_REGISTRY.get(name)
+        if station is None:
+            raise HTTPException(status_code=422, detail=f"Unknown station: {name}")
+        if len(hourly) != len(SERVICE_HOURS):
+            raise HTTPException(status_code=422, detail=f"{name}: expected {len(SERVICE_HOURS)} hourly values")
+        demand[station.id] = np.maximum(hourly, 0)
+
+    plan, trips = synthesize_schedule(demand, req.load_factor)
+    if req.apply:
+        TRIPS_DB.clear()
+        _load_schedule(trips)
+        board_for(TRIPS_DB)
+
+    return {
+        "date": day.strftime("%Y-%m-%d"),
+        "applied": req.apply,
+        "plan": [
+            {"hour": f"{p.hour:02d}:00", "peak_load": p.peak_load, "trains_needed": p.trains_needed, "headway": p.headway}
+            for p in plan
+        ],
+        "trips": len(trips),
+        "unassigned_pilot": sum(t["pilot_id"] is None for t in trips),
+        "unassigned_train": sum(t["train_set_id"] is None for t in trips),
+        "elapsed_ms": round((time.perf_counter() - started) * 1000, 2),
+    }
+
+@schedule_router.get("/loads", response_model=List[TripLoad])
+@locked(SCHEDULE_LOCK.read)
+def get_trip_loads(
+    date: Optional[str] = Query(None, description="YYYY-MM-DD, defaults to today"),
+    weather: Optional[str] = None,
+    holiday: bool = False,
+    min_percent: float = Query(0, ge=0, description="Only trips loaded at least this much"),
+):
+    """Estimated on-board load of every trip, from the forecast OD matrix and the live timetable."""
+    try:
+        day = datetime.strptime(date, "%Y-%m-%d") if date else datetime.now()
+    except ValueError:
+        raise HTTPException(status_code=422, detail="date must be YYYY-MM-DD")
+
+    loads = segment_loads(gravity_od(forecast_demand(day.weekday(), weather, holiday)))
+    est = trip_loads(TRIPS_DB, loads, TRAIN_CAPACITY)
+    rows = TRIPS_DB.order()
+    rows = rows[est["percent"][rows] >= min_percent]
+    return [
+        TripLoad(
+            **TRIPS_DB.record(int(r), ("trip_id", "route", "departure_time")),
+            peak_load=int(round(est["load"][r])),
+            load_percent=round(float(est["percent"][r]), 1),
+            peak_segment=segment_name(int(est["segment"][r])) if est["segment"][r] >= 0 else None,
+        )
+        for r in rows
+    ]
+
+@schedule_router.post("/robustness", response_model=RobustnessReport)
+def analyse_robustness(req: RobustnessRequest):
+    """Monte Carlo delay days against the live timetable's train / pilot / headway chains."""
+    started = time.perf_counter()
+    with SCHEDULE_LOCK.read():
+        rows = TRIPS_DB.order()
+        cancelled = TRIPS_DB.code_of("status", "Cancelled")
+        if cancelled is not None:
+            rows = rows[TRIPS_DB.col("status")[rows] != cancelled]
+        cols = {name: TRIPS_DB.col(name)[rows].astype(np.int64) for name in ("dep", "arr", "train", "pilot", "route", "delay")}
+        chains = build_chains(rows, **cols)
+        records = TRIPS_DB.records(rows, ("trip_id", "departure_time", "route", "train_set_id", "pilot_id"))
+
+    result = monte_carlo(chains, req.scenarios, req.seed, req.incident_prob)
+    punctuality = result["punctuality"]
+    slack = {}
+    for c, name in enumerate(CHAIN_NAMES):
+        values = chains.slack[c][np.isfinite(chains.slack[c])]
+        if len(values):
+            slack[name] = {"min": round(float(values.min()), 1), "p10": round(float(np.percentile(values, 10)), 1),
+                           "median": round(float(np.median(values)), 1), "tight": int((values < 2).sum())}
+
+    min_slack = chains.slack.min(axis=0)
+    worst = np.lexsort((-result["expected_delay"], -result["p_late"]))[:req.top]
+    return RobustnessReport(
+        scenarios=req.scenarios,
+        seed=req.seed,
+        trips=len(rows),
+        workers=WORKERS,
+        elapsed_ms=round((time.perf_counter() - started) * 1000, 2),
+        punctuality={
+            "mean": round(float(punctuality.mean()), 2),
+            **{f"p{q}": round(float(np.percentile(punctuality, q)), 2) for q in (5, 50, 95)},
+        },
+        expected_knock_on_minutes=round(float(result["knock_on_total"].mean()), 1),
+        slack=slack,
+        at_risk=[
+            AtRiskTrip(
+                **records[i],
+                p_late=round(float(result["p_late"][i]), 3),
+                expected_delay=round(float(result["expected_delay"][i]), 2),
+                expected_knock_on=round(float(result["expected_knock_on"][i]), 2),
+                min_slack=round(float(min_slack[i]), 1) if np.isfinite(min_slack[i]) else None,
+            )
+            for i in worst
+        ],
+    )
+
 @schedule_router.get("/resources/pilots", response_model=List[Pilot])
-def get_pilots():
+def get_pilots(request: Request):
+    return SCHEDULE_CACHE.respond(request, ("pilots", STAFF_VERSION.value), lambda: (_pilots(), {}))
+
+@schedule_router.get("/resources/trains", response_model=List[TrainSet])
+def get_trains(request: Request):
+    return SCHEDULE_CACHE.respond(request, ("trains", FLEET_VERSION.value), lambda: (_trains(), {}))
+
+@schedule_router.get("/platforms", response_model=List[PlatformSlot])
+@locked(SCHEDULE_LOCK.read)
+def get_platform_occupancy(request: Request, station: Optional[str] = None):
+    """Platform bookings (rake at the platform until it has cleared) per station, in time order."""
+    station_id = None
+    if station is not None:
+        found = STATION_REGISTRY.get(station)
+        if found is None:
+            raise HTTPException(status_code=404, detail=f"Unknown station '{station}'")
+        station_id = found.id
+
+    def build():
+        board = board_for(TRIPS_DB)
+        clashing = {r for a, b, _, _ in board.clashes() for r in (a, b)}
+        slots = []
+        for (sid, platform), line in sorted(board.timelines.items()):
+            if station_id is not None and sid != station_id:
+                continue
+            for start, end, row in line.bookings():
+                slots.append(PlatformSlot(
+                    id=TRIPS_DB.trip_uid(row), trip_id=TRIPS_DB.trip_label(row),
+                    station=STATION_REGISTRY.names[sid], platform=platform,
+                    start=format_minutes(start), end=format_minutes(end), clash=row in clashing,
+                ))
+        return slots, {}
+
+    return SCHEDULE_CACHE.respond(request, ("platforms", TRIPS_DB.version, station_id), build)
+
+@schedule_router.post("/platforms/reallocate")
+@locked(SCHEDULE_LOCK.write)
+def reallocate_platforms(dry_run: bool = False):
+    """Re-colours the whole day's platform use (greedy, in dwell start order) and applies it unless dry_run."""
+    started = time.perf_counter()
+    board = board_for(TRIPS_DB)
+    before = len(board.clashes())
+    changes, clashes = reallocate(TRIPS_DB)
+    if not dry_run:
+        for row, platform in changes.items():
+            TRIPS_DB.update(row, platform=platform)
+        board.track(TRIPS_DB, list(changes))
+    return {
+        "changed": len(changes),
+        "clashes_before": before,
+        "clashes_after": len(clashes),
+        "applied": not dry_run,
+        "elapsed_ms": round((time.perf_counter() - started) * 1000, 2),
+    }
+
+@schedule_router.get("/duty", response_model=List[PilotDuty])
+@locked(SCHEDULE_LOCK.read)
+def get_pilot_duty(request: Request, at: Optional[str] = Query(None, description="HH:MM for continuous duty so far")):
+    """Driving time, spells and breaks per pilot from the live timetable."""
+    minute = _parse_time(at, "at")
+
+    def build():
+        report = []
+        for p in get_all_pilots():
+            duty = pilot_duty(TRIPS_DB, p.id)
+            summary = duty.summary()
+            report.append(PilotDuty(
+                pilot_id=p.id, name=p.name,
+                trips=summary.trips,
+                driving_minutes=summary.driving_minutes,
+                remaining_minutes=max(MAX_DRIVING_MINUTES - summary.driving_minutes, 0),
+                longest_spell=summary.longest_spell,
+                breaks=summary.breaks,
+                on_duty_minutes=duty.since_break(minute) if minute is not None else None,
+            ))
+        return report, {}
+
+    return SCHEDULE_CACHE.respond(request, ("duty", TRIPS_DB.version, STAFF_VERSION.value, minute), build)
+
+def _pilots() -> List[Pilot]:
     # Map Staff(Pilot) to Schedule Pilot Model
     pilots = get_all_pilots()
     return [Pilot(id=p.id, name=p.name, status="Available") for p in pilots]
 
-@schedule_router.get("/resources/trains", response_model=List[TrainSet])
-def get_trains():
+def _trains() -> List[TrainSet]:
     # Map Fleet(Train) to Schedule TrainSet Model
     trains = get_all_trains()
     return [
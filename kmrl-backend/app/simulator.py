@@ -0,0 +1,307 @@
+import heapq
+import time
+from bisect import bisect_right
+from collections import deque
+from datetime import datetime
+from typing import Dict, List, NamedTuple, Optional
+
+import numpy as np
+from fastapi import APIRouter, HTTPException
+from pydantic import BaseModel
+
+from app import fleet
+from app.delays import MIN_TURNAROUND
+from app.network import NETWORK, route_ends
+from app.schedule import SCHEDULE_LOCK, TRIPS_DB
+from app.stations import STATION_NAMES
+from app.timetable import forecast_demand, planned_load_percent
+from app.trip_store import TripStore, format_minutes, to_minutes
+
+simulation_router = APIRouter(prefix="/simulation", tags=["Line Simulation"])
+
+# ---------------- Line Simulator ----------------
+# Discrete-event run of the timetable over the station sequence. Each trip
+# requests the next platform in its direction; platforms are granted in
+# request order with a minimum separation, so a late train holds up the ones
+# behind it and nothing overtakes. Rakes start their next trip only after the
+# previous one arrives plus turnaround. Dwell and run times are noisy and a
+# few trips hit incidents; all randomness is drawn up front from one seeded
+# generator, so a (timetable, seed) pair always gives the same day.
+
+SEPARATION_S = 90.0       # Platform clear -> next arrival on the same platform
+DWELL_SIGMA = 0.25        # Lognormal spread of dwell times (mean preserved)
+RUN_SIGMA = 0.03          # Lognormal spread of run times
+INCIDENT_PROB = 0.04      # Share of trips held at one station by an incident
+INCIDENT_MEAN_S = 240.0   # Mean incident hold (exponential)
+LATE_MINUTES = 5          # Arrival delay above this counts as late (as on the fleet dashboard)
+
+class TrainState(NamedTuple):
+    train_id: str
+    status: str              # "In Service" or "Available"
+    location: str            # Station, or "From -> To" between stations
+    delay_minutes: int
+    trip_id: Optional[str]
+    station: int             # Line index of the station it is at / last left
+    direction: int           # 0 = towards the last station
+
+class Simulation:
+    """Actual vs planned station arrival / departure times (seconds) of every simulated trip."""
+
+    def __init__(self, store: TripStore, rows: List[int], paths: List[List[int]],
+                 planned_arr: List[List[float]], planned_dep: List[List[float]],
+                 arrive: List[List[float]], depart: List[List[float]]):
+        self.store = store
+        self.rows, self.paths = rows, paths
+        self.planned_arr, self.planned_dep = planned_arr, planned_dep
+        self.arrive, self.depart = arrive, depart
+        # Per train: its trips in start order, for O(log n) position queries
+        self._by_train: Dict[int, List[int]] = {}
+        for i, row in enumerate(rows):
+            self._by_train.setdefault(int(store.col("train")[row]), []).append(i)
+        for trips in self._by_train.values():
+            trips.sort(key=lambda i: depart[i][0])
+        self._starts = {t: [depart[i][0] for i in trips] for t, trips in self._by_train.items()}
+
+    def arrival_delays(self) -> np.ndarray:
+        """Minutes late at the final station, per simulated trip."""
+        return np.array([(a[-1] - p[-1]) / 60 for a, p in zip(self.arrive, self.planned_arr)])
+
+    def summary(self) -> dict:
+        delays = self.arrival_delays()
+        if not len(delays):
+            return {"trips": 0, "punctuality": 100.0, "avg_arrival_delay": 0.0, "max_arrival_delay": 0.0}
+        return {
+            "trips": len(delays),
+            "punctuality": round(float((delays <= LATE_MINUTES).mean() * 100), 1),
+            "avg_arrival_delay": round(float(np.maximum(delays, 0).mean()), 2),
+            "max_arrival_delay": round(float(delays.max()), 1),
+        }
+
+    def state_at(self, minute: int) -> Dict[str, TrainState]:
+        """Where every simulated rake is at minute-of-day `minute`."""
+        t = minute * 60.0
+        states = {}
+        for train, trips in self._by_train.items():
+            train_id = self.store.interners["train"].value(train)
+            k = bisect_right(self._starts[train], t) - 1
+            # Before its first trip / after its last: standing at that trip's origin / destination
+            i = trips[max(k, 0)]
+            path = self.paths[i]
+            direction = 0 if path[-1] > path[0] else 1
+            if k < 0 or t >= self.arrive[i][-1]:
+                station = path[0] if k < 0 else path[-1]
+                states[train_id] = TrainState(train_id, "Available", STATION_NAMES[station], 0, None, station, direction)
+                continue
+
+            # Last event at or before t: arrival at p (dwelling) or departure from p (running)
+            arrive, depart = self.arrive[i], self.depart[i]
+            p = max(bisect_right(arrive, t) - 1, 0)
+            if t < depart[p]:
+                location, late = STATION_NAMES[path[p]], arrive[p] - self.planned_arr[i][p]
+            else:
+                location, late = f"{STATION_NAMES[path[p]]} -> {STATION_NAMES[path[p + 1]]}", depart[p] - self.planned_dep[i][p]
+            states[train_id] = TrainState(train_id, "In Service", location, max(int(round(late / 60)), 0),
+                                          self.store.trip_label(self.rows[i]), path[p], direction)
+        return states
+
+def simulate(store: TripStore, seed: int = 0, incident_prob: float = INCIDENT_PROB) -> Simulation:
+    """Runs every operating trip with an assigned rake on a line route. O(E log E) in station events."""
+    rng = np.random.default_rng(seed)
+    cancelled = store.code_of("status", "Cancelled")
+    dep_col, delay_col, train_col = store.col("dep"), store.col("delay"), store.col("train")
+    status_col = store.col("status")
+
+    rows, paths, directions, planned_arr, planned_dep = [], [], [], [], []
+    for row in store.order():
+        row = int(row)
+        ends = route_ends(store.value(row, "route"))
+        if ends is None or train_col[row] < 0 or status_col[row] == cancelled:
+            continue
+        a, b = ends[0].id, ends[1].id
+        path = np.arange(a, b + 1) if a < b else np.arange(a, b - 1, -1)
+        dep = int(dep_col[row])
+        h = NETWORK.hour_index(dep)
+        # Planned arrival at each station = departure + network travel time (intermediate dwells included)
+        arr = dep * 60.0 + NETWORK.travel_minutes[h, a, path].astype(float) * 60.0
+        leave = arr + NETWORK.dwell_seconds[h, path]
+        leave[0], leave[-1] = arr[0], arr[-1]
+        rows.append(row)
+        paths.append(path.tolist())
+        directions.append(0 if a < b else 1)
+        planned_arr.append(arr.tolist())
+        planned_dep.append(leave.tolist())
+
+    n, n_st = len(rows), len(STATION_NAMES)
+    run_noise = rng.lognormal(-RUN_SIGMA ** 2 / 2, RUN_SIGMA, (n, n_st)).tolist()
+    dwell_noise = rng.lognormal(-DWELL_SIGMA ** 2 / 2, DWELL_SIGMA, (n, n_st)).tolist()
+    hit_at = np.where(rng.random(n) < incident_prob, rng.integers(1, n_st - 1, n), -1).tolist()
+    hold = rng.exponential(INCIDENT_MEAN_S, n).tolist()
+
+    run_s = NETWORK.run_seconds.tolist()
+    dwell_s = NETWORK.dwell_seconds.tolist()
+    arrive = [[0.0] * len(p) for p in paths]
+    depart = [[0.0] * len(p) for p in paths]
+
+    START, ARRIVE = 0, 1
+    events = []     # (time, seq, kind, trip, path position)
+    seq = 0
+    # Platforms are (direction, station); each is granted in request order
+    reserver: Dict[tuple, int] = {}          # platform -> last trip granted it
+    clear_at: Dict[tuple, float] = {}        # platform -> when that trip leaves it (once known)
+    waiting: Dict[tuple, tuple] = {}         # (platform, trip ahead) -> (trip, earliest, position)
+    rake_active: Dict[int, bool] = {}
+    rake_free: Dict[int, float] = {}
+    rake_queue: Dict[int, deque] = {}        # train -> trips whose start is waiting for the rake
+
+    def push(t: float, kind: int, i: int, p: int):
+        nonlocal seq
+        seq += 1
+        heapq.heappush(events, (t, seq, kind, i, p))
+
+    def request(i: int, p: int, earliest: float):
+        """Trip i wants the platform at paths[i][p] from `earliest`, behind whoever asked before."""
+        key = (directions[i], paths[i][p])
+        prev = reserver.get(key)
+        reserver[key] = i
+        if prev is None:
+            push(earliest, ARRIVE, i, p)
+        elif clear_at.get(key) is not None:
+            push(max(earliest, clear_at[key] + SEPARATION_S), ARRIVE, i, p)
+        else:
+            waiting[(key, prev)] = (i, earliest, p)
+        clear_at[key] = None
+
+    def board(i: int, ready: float):
+        train = int(train_col[rows[i]])
+        rake_active[train] = True
+        request(i, 0, max(ready, rake_free.get(train, ready)))
+
+    # Each trip starts at its planned departure (plus any operator-entered delay) once its rake is back
+    for i, row in enumerate(rows):
+        push(planned_arr[i][0] + int(delay_col[row]) * 60.0, START, i, 0)
+
+    while events:
+        t, _, kind, i, p = heapq.heappop(events)
+        train = int(train_col[rows[i]])
+        if kind == START:
+            if rake_active.get(train):
+                rake_queue.setdefault(train, deque()).append((i, t))
+            else:
+                board(i, t)
+            continue
+
+        path = paths[i]
+        station = path[p]
+        arrive[i][p] = t
+        last = p == len(path) - 1
+        if p == 0 or last:
+            leave = t  # Origin departs once granted; terminating trains clear into the turnback
+        else:
+            leave = t + dwell_s[NETWORK.hour_index(int(t // 60))][station] * dwell_noise[i][station]
+            if hit_at[i] == p:
+                leave += hold[i]
+        depart[i][p] = leave
+
+        key = (directions[i], station)
+        if reserver.get(key) == i:
+            clear_at[key] = leave
+        follower = waiting.pop((key, i), None)
+        if follower is not None:
+            f, earliest, fp = follower
+            push(max(earliest, leave + SEPARATION_S), ARRIVE, f, fp)
+
+        if not last:
+            segment = min(station, path[p + 1])
+            request(i, p + 1, leave + run_s[segment] * run_noise[i][segment])
+            continue
+
+        # Trip done: the rake turns round for its next trip
+        rake_active[train] = False
+        rake_free[train] = t + MIN_TURNAROUND * 60
+        if rake_queue.get(train):
+            board(*rake_queue[train].popleft())
+
+    return Simulation(store, rows, paths, planned_arr, planned_dep, arrive, depart)
+
+def sync_fleet(sim: Simulation, minute: int) -> int:
+    """Writes simulated positions / delays into the fleet (one swap, one version bump). Returns trains changed."""
+    line_load = planned_load_percent(forecast_demand(datetime.now().weekday()), len(fleet.get_all_trains()))
+    changes = {}
+    # state_at reads trip labels from the store: snapshot under the read lock, write the fleet after it
+    with SCHEDULE_LOCK.read():
+        states = sim.state_at(minute)
+        for train in fleet.get_all_trains():
+            state = states.get(train.id)
+            if train.status == "Maintenance" or state is None:
+                continue
+            ridership = 0.0
+            if state.status == "In Service":
+                ridership = round(min(120.0, fleet._ridership_load(line_load, state.station, state.direction, minute // 60)), 1)
+            update = {"status": state.status, "location": state.location,
+                      "delay_minutes": state.delay_minutes, "ridership_load": ridership}
+            if any(getattr(train, k) != v for k, v in update.items()):
+                changes[train.id] = update
+    if changes:
+        fleet.update_trains(changes)
+    return len(changes)
+
+def sync_fleet_now() -> int:
+    """Fleet state from a run of the live timetable, seeded by today's date (same all day)."""
+    now = datetime.now()
+    with SCHEDULE_LOCK.read():
+        sim = simulate(TRIPS_DB, seed=now.toordinal())
+    return sync_fleet(sim, now.hour * 60 + now.minute)
+
+# --- Models ---
+
+class SimulationRequest(BaseModel):
+    seed: int = 0
+    at: Optional[str] = None # HH:MM simulated clock for train states, defaults to now
+    incident_prob: float = INCIDENT_PROB
+    apply_to_fleet: bool = False # Write positions / delays into the fleet dashboard
+
+class SimulatedTrain(BaseModel):
+    train_id: str
+    status: str
+    location: str
+    delay_minutes: int
+    trip_id: Optional[str] = None
+
+class SimulationResult(BaseModel):
+    at: str
+    seed: int
+    trips: int
+    punctuality: float
+    avg_arrival_delay: float
+    max_arrival_delay: float
+    elapsed_ms: float
+    trains_updated: int
+    trains: List[SimulatedTrain]
+
+# --- Endpoints ---
+
+@simulation_router.post("/run", response_model=SimulationResult)
+def run_simulation(req: SimulationRequest):
+    """Simulates the live timetable and reports train states at `at`."""
+    if not 0 <= req.incident_prob <= 1:
+        raise HTTPException(status_code=422, detail="incident_prob must be between 0 and 1")
+    try:
+        minute = to_minutes(req.at) if req.at else datetime.now().hour * 60 + datetime.now().minute
+    except ValueError:
+        raise HTTPException(status_code=422, detail="at must be HH:MM")
+
+    started = time.perf_counter()
+    with SCHEDULE_LOCK.read():
+        sim = simulate(TRIPS_DB, req.seed, req.incident_prob)
+        states = sim.state_at(minute)
+    elapsed = (time.perf_counter() - started) * 1000
+    updated = sync_fleet(sim, minute) if req.apply_to_fleet else 0
+
+    return SimulationResult(
+        at=format_minutes(minute),
+        seed=req.seed,
+        **sim.summary(),
+        elapsed_ms=round(elapsed, 2),
+        trains_updated=updated,
+        trains=[SimulatedTrain(**state._asdict()) for state in states.values()],
+    )
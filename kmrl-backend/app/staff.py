@@ -1,10 +1,16 @@
-from fastapi import APIRouter
+from fastapi import APIRouter, Request
 from pydantic import BaseModel
 from typing import List, Optional, Dict
 from enum import Enum
 import random
 from datetime import datetime, timedelta
 
+from app.stations import STATION_NAMES
+from app.network import NETWORK
+from app.concurrency import single_flight
+from app.http_cache import ResponseCache, StoreVersion
+from app.fast_json import FastJSONResponse
+
 staff_router = APIRouter(prefix="/staff", tags=["staff"])
 
 # --- Models ---
@@ -43,13 +49,7 @@ class AllocationRequest(BaseModel):
     shift: ShiftType
 
 # --- Mock Data ---
-STATIONS = [
-    "Aluva", "Pulinchodu", "Companypady", "Ambattukavu", "Muttom",
-    "Kalamassery", "Cochin University", "Pathadipalam", "Edapally",
-    "Changampuzha Park", "Palarivattom", "JLN Stadium", "Kaloor",
-    "Lissie", "M.G. Road", "Maharaja's College", "Ernakulam South",
-    "Kadavanthra", "Elamkulam", "Vytila", "Thykkoodam", "Petta"
-]
+STATIONS = STATION_NAMES  # Line order, from the shared station registry
 
 # Generate 50 Staff Members
 mock_staff_db = []
@@ -67,6 +67,9 @@ for i in range(1, 51):
         home_base=random.choice(STATIONS)
     ))
     
+STAFF_VERSION = StoreVersion()  # bump() after any change to mock_staff_db
+STAFF_CACHE = ResponseCache("staff")
+
 def get_all_pilots() -> List[StaffMember]:
     return [s for s in mock_staff_db if s.role == Role.PILOT]
 
@@ -78,11 +81,33 @@ def get_next_shift(current: ShiftType) -> ShiftType:
     if current == ShiftType.NIGHT: return ShiftType.MORNING
     return ShiftType.MORNING
 
+# Minimum cover per station, and the role that fills each slot
+REQUIRED = {"managers": 1, "security": 2}
+SLOT_ROLE = {"managers": Role.MANAGER, "security": Role.SECURITY}
+
+def _borrow(allocations: Dict[str, dict], station: str, slot: str, unassigned: List[StaffMember]) -> bool:
+    """
+    Fills one `slot` at `station`: the unassigned staff member of the right role
+    whose home base is closest (by network travel time), else the nearest
+    station with more than its own minimum.
+    """
+    candidates = [i for i, s in enumerate(unassigned) if s.role == SLOT_ROLE[slot]]
+    if candidates:
+        i = min(candidates, key=lambda k: NETWORK.distance(unassigned[k].home_base, station))
+        allocations[station][slot].append(unassigned.pop(i))
+        return True
+    for other in NETWORK.nearest(station):
+        donor = allocations[other][slot]
+        if len(donor) > REQUIRED[slot]:
+            allocations[station][slot].append(donor.pop())
+            return True
+    return False
+
 # --- Endpoints ---
 
 @staff_router.get("/list")
-def get_all_staff():
-    return mock_staff_db
+def get_all_staff(request: Request):
+    return STAFF_CACHE.respond(request, (STAFF_VERSION.value,), lambda: (mock_staff_db, {}))
 
 @staff_router.post("/generate-roster")
 def generate_roster(req: RosterRequest):
@@ -124,9 +149,10 @@ def generate_roster(req: RosterRequest):
         
         current_date += timedelta(days=1)
         
-    return {"roster": roster, "staff_details": {s.id: s for s in mock_staff_db}}
+    return FastJSONResponse({"roster": roster, "staff_details": {s.id: s for s in mock_staff_db}})
 
 @staff_router.post("/allocations")
+@single_flight()
 def get_allocations(req: AllocationRequest):
     # Simulates the live allocation for a specific shift
     # Rule: 1 Manager, 2 Security per station.
@@ -154,28 +180,12 @@ def get_allocations(req: AllocationRequest):
         status = allocations[station]
         
         # Missing Manager?
-        if len(status["managers"]) < 1:
-            # Find closest unassigned manager (Simplified: just any unassigned manager)
-            found = False
-            for i, s in enumerate(unassigned_staff):
-                if s.role == Role.MANAGER:
-                    status["managers"].append(s)
-                    unassigned_staff.pop(i)
-                    found = True
-                    break
-            if not found:
-                alerts.append(f"CRITICAL: {station} has NO Manager!")
+        if len(status["managers"]) < 1 and not _borrow(allocations, station, "managers", unassigned_staff):
+            alerts.append(f"CRITICAL: {station} has NO Manager!")
 
         # Missing Security? (Need 2)
         while len(status["security"]) < 2:
-            found = False
-            for i, s in enumerate(unassigned_staff):
-                if s.role == Role.SECURITY:
-                    status["security"].append(s)
-                    unassigned_staff.pop(i)
-                    found = True
-                    break
-            if not found:
+            if not _borrow(allocations, station, "security", unassigned_staff):
                 alerts.append(f"WARNING: {station} short on Security ({len(status['security'])}/2)")
                 break 
 
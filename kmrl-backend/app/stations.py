@@ -0,0 +1,125 @@
+from typing import Dict, Iterator, List, NamedTuple, Optional, Tuple
+
+import numpy as np
+
+# ---------------- Station Registry ----------------
+# Single source of truth for Line 1 station metadata. Built once at import;
+# every other module looks stations up here (O(1) dict / array access).
+
+class UnknownStationError(KeyError):
+    pass
+
+class Station(NamedTuple):
+    id: int              # Line order index (0 = Aluva)
+    name: str            # Canonical display name
+    chainage_km: float   # Distance from Aluva along the line
+    tier: int            # 1 = High, 2 = Medium, 3 = Low traffic
+    profile: str         # Demand profile key into DEMAND_CURVES
+    is_hub: bool         # Terminal / rake turnback point
+    aliases: Tuple[str, ...] = ()
+
+# Daily ridership magnitude per tier (used for prompts and model bootstrap)
+TIER_DAILY = {1: 17000, 2: 10000, 3: 4000}
+TIER_LABELS = {
+    1: "High Traffic > 15000",
+    2: "Medium Traffic 8000-12000",
+    3: "Low Traffic < 5000",
+}
+
+# Share of daily ridership per service hour 06:00 ... 22:00
+SERVICE_HOURS = list(range(6, 23))
+DEMAND_CURVES = {
+    # Residential/Commuter (Start of line) - High Morning Outflow
+    "residential": [0.04, 0.10, 0.20, 0.15, 0.08, 0.04, 0.03, 0.03, 0.03, 0.04, 0.08, 0.08, 0.05, 0.03, 0.01, 0.01, 0.00],
+    # Commercial/Office (City Center) - High Evening Outflow
+    "commercial": [0.01, 0.03, 0.05, 0.08, 0.06, 0.04, 0.04, 0.05, 0.05, 0.08, 0.15, 0.20, 0.10, 0.04, 0.02, 0.00, 0.00],
+    # Balanced/Mixed - Standard Dual Peak
+    "standard": [0.02, 0.06, 0.12, 0.10, 0.06, 0.05, 0.05, 0.05, 0.05, 0.06, 0.10, 0.12, 0.08, 0.05, 0.02, 0.01, 0.00],
+}
+PROFILES = list(DEMAND_CURVES)
+
+_LINE_1 = [
+    # name, chainage_km, tier, profile, is_hub, aliases
+    ("Aluva", 0.0, 1, "residential", True, ()),
+    ("Pulinchodu", 1.7, 3, "residential", False, ()),
+    ("Companypady", 2.7, 3, "residential", False, ()),
+    ("Ambattukavu", 3.7, 3, "residential", False, ()),
+    ("Muttom", 4.7, 3, "residential", False, ()),
+    ("Kalamassery", 6.8, 2, "residential", False, ()),
+    ("Cochin University", 8.0, 3, "standard", False, ("CUSAT",)),
+    ("Pathadipalam", 9.2, 3, "standard", False, ()),
+    ("Edapally", 10.4, 1, "commercial", False, ("Edappally",)),
+    ("Changampuzha Park", 11.4, 3, "standard", False, ()),
+    ("Palarivattom", 12.3, 2, "standard", False, ()),
+    ("JLN Stadium", 13.5, 2, "standard", False, ("Jawaharlal Nehru Stadium",)),
+    ("Kaloor", 14.6, 2, "commercial", False, ()),
+    ("Lissie", 15.4, 3, "commercial", False, ()),
+    ("M.G. Road", 16.6, 1, "commercial", False, ("MG Road", "Mahatma Gandhi Road")),
+    ("Maharaja's College", 17.8, 1, "commercial", False, ("Maharajas College",)),
+    ("Ernakulam South", 19.0, 2, "commercial", False, ()),
+    ("Kadavanthra", 20.1, 3, "standard", False, ()),
+    ("Elamkulam", 21.1, 3, "standard", False, ()),
+    ("Vytila", 22.3, 1, "commercial", False, ("Vyttila",)),
+    ("Thykkoodam", 23.5, 3, "residential", False, ()),
+    # SN Junction (line extension) turns back at the Petta end in this model
+    ("Petta", 24.8, 2, "residential", True, ("Pettah", "Pettah Terminal", "SN Junction")),
+]
+
+def normalize_name(name: str) -> str:
+    """Case/punctuation-insensitive key: "M.G. Road" == "MG Road" == "mg road"."""
+    return " ".join(name.replace(".", "").replace("'", "").casefold().split())
+
+class StationRegistry:
+    def __init__(self, rows):
+        self.stations: List[Station] = [Station(i, *row) for i, row in enumerate(rows)]
+        self.names: List[str] = [s.name for s in self.stations]
+
+        self._by_key: Dict[str, Station] = {}
+        for s in self.stations:
+            for name in (s.name,) + s.aliases:
+                self._by_key[normalize_name(name)] = s
+
+        # Integer-indexed arrays for vectorised engines
+        self.chainage = np.array([s.chainage_km for s in self.stations])
+        self.tier = np.array([s.tier for s in self.stations], dtype=np.int8)
+        self.profile = np.array([PROFILES.index(s.profile) for s in self.stations], dtype=np.int8)
+        self.is_hub = np.array([s.is_hub for s in self.stations])
+        self.termini: Tuple[str, str] = (self.names[0], self.names[-1])
+
+    def __len__(self) -> int:
+        return len(self.stations)
+
+    def __iter__(self) -> Iterator[Station]:
+        return iter(self.stations)
+
+    def get(self, name: Optional[str]) -> Optional[Station]:
+        """Alias-aware lookup. Returns None for names that are not on the line."""
+        if not name:
+            return None
+        return self._by_key.get(normalize_name(name))
+
+    def resolve(self, name: str) -> Station:
+        station = self.get(name)
+        if station is None:
+            raise UnknownStationError(name)
+        return station
+
+    def id_of(self, name: str) -> int:
+        return self.resolve(name).id
+
+    def canonical(self, name: str) -> str:
+        return self.resolve(name).name
+
+    def by_tier(self, tier: int) -> List[str]:
+        return [s.name for s in self.stations if s.tier == tier]
+
+    def demand_curve(self, name: str) -> List[float]:
+        return DEMAND_CURVES[self.resolve(name).profile]
+
+    def demand_matrix(self) -> np.ndarray:
+        """Hourly share per station -> array [stations, service hours]."""
+        curves = np.array([DEMAND_CURVES[p] for p in PROFILES])
+        return curves[self.profile]
+
+STATION_REGISTRY = StationRegistry(_LINE_1)
+STATION_NAMES = STATION_REGISTRY.names
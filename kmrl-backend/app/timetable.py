@@ -0,0 +1,145 @@
+import uuid
+from collections import deque
+from heapq import heappop, heappush
+from typing import Dict, List, NamedTuple, Optional, Sequence, Tuple
+
+import numpy as np
+
+from app.delays import MIN_PILOT_HANDOVER, MIN_TURNAROUND
+from app.duty import BREAK_MINUTES, MAX_CONTINUOUS_DUTY, MAX_DRIVING_MINUTES, DutyIndex
+from app.forecast_model import get_model
+from app.network import NETWORK
+from app.passenger_load import gravity_od, segment_loads
+from app.platforms import colour, occupancy
+from app.stations import SERVICE_HOURS, STATION_REGISTRY
+from app.trip_store import format_minutes
+
+# ---------------- Timetable Synthesis ----------------
+# Hourly per-station demand -> peak segment load per hour (app.passenger_load)
+# -> minimum headway that carries it -> departures from both termini -> rakes
+# and pilots assigned from per-terminus availability heaps. A full day is a few hundred trips and
+# recomputes in milliseconds, so the timetable can follow every forecast.
+
+TRAIN_CAPACITY = 900
+MIN_HEADWAY = 5       # Signalling limit (minutes)
+MAX_HEADWAY = 20      # Service-level floor: never less than 3 trains/hour
+
+class HourPlan(NamedTuple):
+    hour: int
+    peak_load: int           # Busiest segment, busiest direction (passengers/hour)
+    trains_needed: int
+    headway: int             # Minutes
+
+def forecast_demand(dow: int, weather: Optional[str] = None, holiday: bool = False) -> np.ndarray:
+    """Local model forecast in line order -> array [stations, service hours]."""
+    model = get_model()
+    grid = model.predict_grid(dow, weather, holiday)
+    return grid[[model.index_of(s.name) for s in STATION_REGISTRY]]
+
+def plan_headways(demand: np.ndarray, rakes_available: int, capacity: int = TRAIN_CAPACITY,
+                  load_factor: float = 1.0) -> List[HourPlan]:
+    """Minimum headway per service hour that carries the peak segment load, within fleet limits."""
+    peak = segment_loads(gravity_od(demand)).max(axis=(0, 1))
+    needed = np.maximum(np.ceil(peak / (capacity * load_factor)), 1).astype(int)
+    headway = np.clip(60 // needed, MIN_HEADWAY, MAX_HEADWAY)
+
+    # A rake cycles out and back; fewer rakes than the cycle needs stretches the headway
+    cycle = np.ceil(2 * (NETWORK.end_to_end() + MIN_TURNAROUND)).astype(int)
+    if rakes_available > 0:
+        headway = np.maximum(headway, -(-cycle // rakes_available))
+
+    return [HourPlan(h, int(p), int(n), int(w)) for h, p, n, w in zip(SERVICE_HOURS, peak, needed, headway)]
+
+def rakes_required(plan: List[HourPlan]) -> int:
+    """Rakes needed to run the plan's busiest hour (round-trip cycle / headway)."""
+    cycle = 2 * (NETWORK.end_to_end() + MIN_TURNAROUND)
+    return int(np.ceil(cycle / np.array([p.headway for p in plan])).max())
+
+def planned_load_percent(demand: np.ndarray, rakes_available: int, capacity: int = TRAIN_CAPACITY) -> np.ndarray:
+    """Average load per train as % of capacity under the planned headways -> [direction, segment, hours]."""
+    loads = segment_loads(gravity_od(demand))
+    trains_per_hour = 60 / np.array([p.headway for p in plan_headways(demand, rakes_available, capacity)])
+    return loads / (trains_per_hour * capacity) * 100
+
+def _departures(plan: List[HourPlan]) -> List[int]:
+    headway = {p.hour: p.headway for p in plan}
+    t, end = SERVICE_HOURS[0] * 60, (SERVICE_HOURS[-1] + 1) * 60
+    times = []
+    while t < end:
+        times.append(t)
+        t += headway[t // 60]
+    return times
+
+def _take(free: List[Tuple[int, str]], spare: deque, at: int) -> Optional[str]:
+    """Earliest-free resource already at this terminus, else one from the spare pool."""
+    if free and free[0][0] <= at:
+        return heappop(free)[1]
+    if spare:
+        return spare.popleft()
+    return None
+
+def _take_pilot(free: List[Tuple[int, str]], spare: deque, duty: Dict[str, DutyIndex],
+                dep: int, arr: int) -> Optional[str]:
+    """
+    Like _take, within duty rules: a pilot due a break rests at this terminus
+    (back on the heap after BREAK_MINUTES), one out of driving time goes off duty.
+    """
+    while free and free[0][0] <= dep:
+        _, pilot = heappop(free)
+        index = duty[pilot]
+        if index.total() + arr - dep > MAX_DRIVING_MINUTES:
+            continue
+        if index.continuous_with(dep, arr) > MAX_CONTINUOUS_DUTY:
+            heappush(free, (index.ends[-1] + BREAK_MINUTES, pilot))
+            continue
+        return pilot
+    if spare:
+        return spare.popleft()
+    return None
+
+def build_timetable(plan: List[HourPlan], pilots: Sequence[str], rakes: Sequence[str],
+                    first_trip_no: int = 1001) -> List[dict]:
+    """
+    Departures from both termini at the planned headways, with rakes and pilots
+    assigned from per-terminus min-heaps keyed by the time they are next free.
+    Pilots are held to the duty rules (app.duty) as they are assigned, and
+    platforms are coloured over the whole day once every departure is known.
+    O(n log n) in trips; trips nobody can cover are left unassigned.
+    """
+    termini = STATION_REGISTRY.termini
+    legs = sorted((t, d) for t in _departures(plan) for d in (0, 1))
+    headway = {p.hour: p.headway for p in plan}
+
+    rake_free: Dict[str, List[Tuple[int, str]]] = {end: [] for end in termini}
+    pilot_free: Dict[str, List[Tuple[int, str]]] = {end: [] for end in termini}
+    spare_rakes, spare_pilots = deque(rakes), deque(pilots)
+    duty = {p: DutyIndex() for p in pilots}
+
+    trips = []
+    for i, (dep, direction) in enumerate(legs):
+        origin, dest = termini if direction == 0 else termini[::-1]
+        arr = dep + NETWORK.minutes(origin, dest, dep)
+        rake = _take(rake_free[origin], spare_rakes, dep)
+        pilot = _take_pilot(pilot_free[origin], spare_pilots, duty, dep, arr)
+        if rake:
+            heappush(rake_free[dest], (arr + MIN_TURNAROUND, rake))
+        if pilot:
+            duty[pilot].add(dep, arr)
+            heappush(pilot_free[dest], (arr + MIN_PILOT_HANDOVER, pilot))
+
+        trips.append(dict(
+            id=str(uuid.uuid4()),
+            trip_id=f"TR-{first_trip_no + i}",
+            route=f"{origin} -> {dest}",
+            departure_time=format_minutes(dep),
+            arrival_time=format_minutes(arr),
+            frequency=f"+{headway[dep // 60]} mins",
+            pilot_id=pilot,
+            train_set_id=rake,
+            status="Scheduled",
+        ))
+
+    platforms, _ = colour([(i, occupancy(t["route"], dep)) for i, (t, (dep, _)) in enumerate(zip(trips, legs))])
+    for i, trip in enumerate(trips):
+        trip["platform"] = platforms[i]
+    return trips
@@ -0,0 +1,519 @@
+import re
+import uuid
+from array import array
+from bisect import bisect_left, bisect_right, insort
+from heapq import merge
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+# ---------------- Columnar Trip Store ----------------
+# Trips live in parallel NumPy columns (one row per trip) instead of a list of
+# pydantic objects. Times are integer minutes from service-day start, repeated
+# strings are interned to small integer codes, and pydantic models are only
+# built at the API boundary from `record(row)`.
+#
+# Ordering/indexes use int64 keys (departure << 32 | row): sorting keys sorts by
+# departure time (ties by insertion), and a time window is a bisect on the key.
+
+# Only labels that round-trip through f"TR-{n}" are stored as numbers (no leading zeros, int32)
+TRIP_ID_PATTERN = re.compile(r"^TR-(0|[1-9]\d*)$")
+TRIP_NO_MAX = np.iinfo(np.int32).max
+ID_NAMESPACE = uuid.UUID("6f1c2a8e-5b7d-4f3e-9a21-0c4d8e7b1a55")
+
+def to_minutes(hhmm: str) -> int:
+    """ "HH:MM" -> minutes from service-day start. Raises ValueError on bad input."""
+    try:
+        hours, minutes = hhmm.split(":")
+        hours, minutes = int(hours), int(minutes)
+    except (AttributeError, ValueError):
+        raise ValueError(f"Invalid time: {hhmm!r}") from None
+    if not (0 <= hours < 24 and 0 <= minutes < 60):
+        raise ValueError(f"Invalid time: {hhmm}")
+    return hours * 60 + minutes
+
+def format_minutes(minutes: int) -> str:
+    return f"{(minutes // 60) % 24:02d}:{minutes % 60:02d}"
+
+class Interner:
+    """Bidirectional string <-> small integer code table. None is code -1."""
+
+    def __init__(self, values: Iterable[str] = ()):
+        self.values: List[str] = []
+        self.codes: Dict[str, int] = {}
+        for v in values:
+            self.code(v)
+
+    def code(self, value: Optional[str]) -> int:
+        if value is None:
+            return -1
+        c = self.codes.get(value)
+        if c is None:
+            c = len(self.values)
+            self.values.append(value)
+            self.codes[value] = c
+        return c
+
+    def lookup(self, value: Optional[str]) -> Optional[int]:
+        """Code for an existing value without interning it (None if unseen)."""
+        if value is None:
+            return -1
+        return self.codes.get(value)
+
+    def value(self, code: int) -> Optional[str]:
+        return None if code < 0 else self.values[code]
+
+    def copy(self) -> "Interner":
+        clone = Interner()
+        clone.values = list(self.values)
+        clone.codes = dict(self.codes)
+        return clone
+
+COLUMNS = {
+    "uid_hi": np.uint64,    # uuid of the trip (128 bits split in two)
+    "uid_lo": np.uint64,
+    "trip_no": np.int32,    # "TR-1001" -> 1001 (-1 if non-canonical, e.g. "TR-007")
+    "route": np.int16,      # Interned codes
+    "status": np.int8,
+    "platform": np.int16,
+    "frequency": np.int16,
+    "train": np.int16,      # Index into train interner (-1 unassigned)
+    "pilot": np.int16,      # Index into pilot interner (-1 unassigned)
+    "dep": np.int32,        # Minutes from service-day start
+    "arr": np.int32,
+    "delay": np.int32,
+    "own_delay": np.int32,  # Part of the delay entered on the trip itself (knock-on excluded)
+    "modified": np.int32,   # Store version of the row's last change (delta sync)
+}
+
+INTERNED = ("route", "status", "platform", "frequency", "train", "pilot")
+INDEXED = ("route", "status", "platform", "train", "pilot")
+ROW_MASK = 0xFFFFFFFF
+
+def window_key(minutes: int) -> int:
+    """Smallest key departing at `minutes` (bisect bound for time windows)."""
+    return minutes << 32
+
+def _discard(keys: array, key: int):
+    i = bisect_left(keys, key)
+    if i < len(keys) and keys[i] == key:
+        del keys[i]
+
+class TripStore:
+    def __init__(self, capacity: int = 256):
+        self._n = 0
+        self._cols: Dict[str, np.ndarray] = {name: np.empty(capacity, dtype) for name, dtype in COLUMNS.items()}
+        self.interners: Dict[str, Interner] = {name: Interner() for name in INTERNED}
+        # Sorted keys of all rows, plus per-field {code: sorted keys} indexes.
+        # Kept incrementally on every mutation, never fully re-sorted.
+        self._order = array("q")
+        self._index: Dict[str, Dict[int, array]] = {field: {} for field in INDEXED}
+        # Rare non-canonical identifiers, keyed by row
+        self._raw_ids: Dict[int, str] = {}
+        self._raw_labels: Dict[int, str] = {}
+        # Bumped on every mutation; drives the schedule ETag and delta sync.
+        # Deltas from before `cleared_at` can't be served (rows were dropped).
+        self.version = 0
+        self.cleared_at = 0
+        # Arrays shared with a fork (column names, "_order", (field, code));
+        # copied on first write by `_own`
+        self._shared: set = set()
+
+    # --- Basics ---
+
+    def __len__(self) -> int:
+        return self._n
+
+    def col(self, name: str) -> np.ndarray:
+        """Live view of a column for the current rows (do not hold across inserts)."""
+        return self._cols[name][:self._n]
+
+    def order(self) -> np.ndarray:
+        """Row indices in departure-time order."""
+        return np.array(self._order, dtype=np.int64) & ROW_MASK
+
+    def nbytes(self) -> int:
+        index = sum(len(keys) for field in self._index.values() for keys in field.values())
+        return sum(c.nbytes for c in self._cols.values()) + (len(self._order) + index) * 8
+
+    def owned_nbytes(self) -> int:
+        """Bytes not shared with a fork / the store this was forked from."""
+        cols = sum(c.nbytes for name, c in self._cols.items() if name not in self._shared)
+        keys = 0 if "_order" in self._shared else len(self._order)
+        keys += sum(len(arr) for field, codes in self._index.items()
+                    for code, arr in codes.items() if (field, code) not in self._shared)
+        return cols + keys * 8
+
+    def clear(self):
+        self.version += 1
+        self.cleared_at = self.version
+        self._n = 0
+        # Fresh arrays rather than reuse: a fork may still be reading the old ones
+        capacity = len(self._cols["dep"])
+        self._cols = {name: np.empty(capacity, dtype) for name, dtype in COLUMNS.items()}
+        self._order = array("q")
+        self._index = {field: {} for field in INDEXED}
+        self._raw_ids = {}
+        self._raw_labels = {}
+        self._shared = set()
+
+    def _grow(self):
+        capacity = max(256, self._n * 2)
+        for name, col in self._cols.items():
+            grown = np.empty(capacity, col.dtype)
+            grown[:self._n] = col[:self._n]
+            self._cols[name] = grown
+            self._shared.discard(name)
+
+    # --- Copy-on-write forks ---
+
+    def fork(self) -> "TripStore":
+        """
+        Cheap clone for what-if scenarios. Columns and index arrays are shared
+        between both stores and copied by whichever side writes one first, so a
+        fork costs O(#distinct codes) up front and then grows with its edits.
+        """
+        clone = TripStore.__new__(TripStore)
+        clone._n = self._n
+        clone._cols = dict(self._cols)
+        clone.interners = {name: interner.copy() for name, interner in self.interners.items()}
+        clone._order = self._order
+        clone._index = {field: dict(codes) for field, codes in self._index.items()}
+        clone._raw_ids = dict(self._raw_ids)
+        clone._raw_labels = dict(self._raw_labels)
+        clone.version = self.version
+        clone.cleared_at = self.cleared_at
+
+        shared = set(self._cols) | {"_order"}
+        shared |= {(field, code) for field, codes in self._index.items() for code in codes}
+        self._shared = shared
+        clone._shared = set(shared)
+        return clone
+
+    def adopt(self, fork: "TripStore"):
+        """Takes over a fork's state in place (scenario commit). Don't use `fork` afterwards."""
+        for name in ("_n", "_cols", "interners", "_order", "_index", "_raw_ids",
+                     "_raw_labels", "version", "cleared_at", "_shared"):
+            setattr(self, name, getattr(fork, name))
+
+    def _own(self, key):
+        if key not in self._shared:
+            return
+        self._shared.discard(key)
+        if key == "_order":
+            self._order = array("q", self._order)
+        elif isinstance(key, tuple):
+            field, code = key
+            self._index[field][code] = array("q", self._index[field][code])
+        else:
+            self._cols[key] = self._cols[key].copy()
+
+    # --- Identifiers ---
+
+    @staticmethod
+    def _uid_int(trip_uid: str) -> int:
+        try:
+            return uuid.UUID(trip_uid).int
+        except ValueError:
+            return uuid.uuid5(ID_NAMESPACE, trip_uid).int
+
+    def find(self, trip_uid: str) -> Optional[int]:
+        """Row of a trip by its public id (vectorised scan over the uid column)."""
+        key = self._uid_int(trip_uid)
+        lo, hi = np.uint64(key & 0xFFFFFFFFFFFFFFFF), np.uint64(key >> 64)
+        for row in np.flatnonzero(self.col("uid_lo") == lo):
+            if self._cols["uid_hi"][row] == hi:
+                return int(row)
+        return None
+
+    # --- Mutation ---
+
+    def key(self, row: int) -> int:
+        return (int(self._cols["dep"][row]) << 32) | row
+
+    def _index_add(self, row: int, fields: Iterable[str] = INDEXED, order: bool = True):
+        key = self.key(row)
+        if order:
+            self._own("_order")
+            if not self._order or self._order[-1] < key:
+                self._order.append(key)  # Fast path: arriving in departure order
+            else:
+                insort(self._order, key)
+        for field in fields:
+            code = int(self._cols[field][row])
+            self._own((field, code))
+            insort(self._index[field].setdefault(code, array("q")), key)
+
+    def _index_remove(self, row: int, fields: Iterable[str] = INDEXED, order: bool = True):
+        key = self.key(row)
+        if order:
+            self._own("_order")
+            _discard(self._order, key)
+        for field in fields:
+            code = int(self._cols[field][row])
+            self._own((field, code))
+            _discard(self._index[field][code], key)
+
+    def _append(self, trip: dict, dep: int, arr: int) -> int:
+        if self._n == len(self._cols["dep"]):
+            self._grow()
+        for name in COLUMNS:
+            self._own(name)
+        row = self._n
+        self._n += 1
+        self.version += 1
+        self._cols["modified"][row] = self.version
+
+        key = self._uid_int(trip["id"])
+        self._cols["uid_hi"][row] = key >> 64
+        self._cols["uid_lo"][row] = key & 0xFFFFFFFFFFFFFFFF
+        if str(uuid.UUID(int=key)) != trip["id"]:
+            self._raw_ids[row] = trip["id"]
+
+        match = TRIP_ID_PATTERN.match(trip["trip_id"])
+        trip_no = int(match.group(1)) if match else -1
+        if trip_no > TRIP_NO_MAX:
+            trip_no = -1
+        self._cols["trip_no"][row] = trip_no
+        if trip_no < 0:
+            self._raw_labels[row] = trip["trip_id"]
+
+        self._cols["dep"][row] = dep
+        self._cols["arr"][row] = arr
+        self._cols["delay"][row] = trip.get("delay_minutes", 0)
+        self._cols["own_delay"][row] = trip.get("delay_minutes", 0)
+        self._cols["route"][row] = self.interners["route"].code(trip["route"])
+        self._cols["status"][row] = self.interners["status"].code(trip.get("status", "Scheduled"))
+        self._cols["platform"][row] = self.interners["platform"].code(trip.get("platform", "Platform 1"))
+        self._cols["frequency"][row] = self.interners["frequency"].code(trip.get("frequency", "+10 mins"))
+        self._cols["train"][row] = self.interners["train"].code(trip.get("train_set_id"))
+        self._cols["pilot"][row] = self.interners["pilot"].code(trip.get("pilot_id"))
+        return row
+
+    def insert(self, trip: dict) -> int:
+        """Adds a trip given as an API-shaped dict; returns its row."""
+        dep, arr = to_minutes(trip["departure_time"]), to_minutes(trip["arrival_time"])
+        row = self._append(trip, dep, arr)
+        self._index_add(row)
+        return row
+
+    def insert_many(self, trips: List[dict]) -> List[int]:
+        """
+        Adds a batch of trips. New keys are sorted once and merged into the
+        departure order and each field index (O(n + k)) instead of k insertions.
+        """
+        times = [(to_minutes(t["departure_time"]), to_minutes(t["arrival_time"])) for t in trips]
+        rows = [self._append(t, dep, arr) for t, (dep, arr) in zip(trips, times)]
+        new_keys = sorted(self.key(r) for r in rows)
+
+        self._order = array("q", merge(self._order, new_keys))
+        self._shared.discard("_order")
+        for field in INDEXED:
+            by_code: Dict[int, List[int]] = {}
+            for k in new_keys:
+                by_code.setdefault(int(self._cols[field][k & ROW_MASK]), []).append(k)
+            for code, keys in by_code.items():
+                existing = self._index[field].get(code, array("q"))
+                self._index[field][code] = array("q", merge(existing, keys))
+                self._shared.discard((field, code))
+        return rows
+
+    def update(self, row: int, **changes):
+        """Applies API-shaped field changes (e.g. departure_time="08:10", status="Delayed")."""
+        values = {}
+        for field, value in changes.items():
+            if field == "departure_time":
+                values["dep"] = to_minutes(value)
+            elif field == "arrival_time":
+                values["arr"] = to_minutes(value)
+            elif field == "delay_minutes":
+                values["delay"] = value
+            elif field == "own_delay":
+                values["own_delay"] = value
+            elif field == "train_set_id":
+                values["train"] = self.interners["train"].code(value)
+            elif field == "pilot_id":
+                values["pilot"] = self.interners["pilot"].code(value)
+            elif field in ("route", "status", "platform", "frequency"):
+                values[field] = self.interners[field].code(value)
+            else:
+                raise KeyError(field)
+
+        self.version += 1
+        # A departure change moves the row's key everywhere; otherwise only the
+        # indexes of changed fields are touched (and copied, if shared with a fork)
+        if "dep" in values:
+            reindex = INDEXED
+            self._index_remove(row)
+        else:
+            reindex = [f for f in INDEXED if f in values and values[f] != self._cols[f][row]]
+            self._index_remove(row, reindex, order=False)
+        for name in list(values) + ["modified"]:
+            self._own(name)
+        for name, value in values.items():
+            self._cols[name][row] = value
+        self._cols["modified"][row] = self.version
+        self._index_add(row, reindex, order="dep" in values)
+
+    # --- Reads ---
+
+    def value(self, row: int, field: str) -> Optional[str]:
+        return self.interners[field].value(int(self._cols[field][row]))
+
+    def trip_uid(self, row: int) -> str:
+        key = (int(self._cols["uid_hi"][row]) << 64) | int(self._cols["uid_lo"][row])
+        return self._raw_ids.get(row) or str(uuid.UUID(int=key))
+
+    def trip_label(self, row: int) -> str:
+        trip_no = int(self._cols["trip_no"][row])
+        return f"TR-{trip_no}" if trip_no >= 0 else self._raw_labels[row]
+
+    def record(self, row: int, fields: Optional[Iterable[str]] = None) -> dict:
+        """API-shaped dict for one row (what the pydantic Trip model is built from)."""
+        fields = FIELDS if fields is None else fields
+        return {f: FIELD_GETTERS[f](self, row) for f in fields}
+
+    def records(self, rows: Optional[Iterable[int]] = None, fields: Optional[Iterable[str]] = None) -> List[dict]:
+        rows = self.order() if rows is None else rows
+        fields = FIELDS if fields is None else tuple(fields)
+        return [self.record(int(r), fields) for r in rows]
+
+    # --- Vectorised filters ---
+
+    def code_of(self, field: str, value: Optional[str]) -> Optional[int]:
+        return self.interners[field].lookup(value)
+
+    def mask(self, start: Optional[str] = None, end: Optional[str] = None, **equals) -> np.ndarray:
+        """
+        Boolean mask over rows, e.g. mask(status="Delayed", start="08:00", end="10:00").
+        `equals` keys are interned fields (route, status, platform, frequency, train, pilot).
+        """
+        m = np.ones(self._n, dtype=bool)
+        if start is not None:
+            m &= self.col("dep") >= to_minutes(start)
+        if end is not None:
+            m &= self.col("dep") < to_minutes(end)
+        for field, value in equals.items():
+            code = self.code_of(field, value)
+            if code is None:
+                return np.zeros(self._n, dtype=bool)
+            m &= self.col(field) == code
+        return m
+
+    def query(self, start: Optional[int] = None, end: Optional[int] = None, after: Optional[int] = None,
+              limit: Optional[int] = None, changed_since: Optional[int] = None,
+              **equals) -> Tuple[List[int], Optional[int]]:
+        """
+        Rows in departure order with start <= departure < end (minutes), positioned
+        after cursor key `after`, matching every interned field in `equals` and,
+        if given, modified after store version `changed_since`.
+        Returns (rows, next_cursor_key or None).
+
+        The most selective per-field index (or the global order) is bisected to the
+        window, and remaining filters are applied as a vectorised mask on the slice.
+        """
+        codes = {}
+        for field, value in equals.items():
+            code = self.code_of(field, value)
+            if code is None:
+                return [], None
+            codes[field] = code
+
+        candidates = [self._index[f].get(c, array("q")) for f, c in codes.items()]
+        base = min(candidates, key=len) if candidates else self._order
+
+        lo = bisect_left(base, window_key(start)) if start is not None else 0
+        if after is not None:
+            lo = max(lo, bisect_right(base, after))
+        hi = bisect_left(base, window_key(end)) if end is not None else len(base)
+        if lo >= hi:
+            return [], None
+
+        keys = np.array(base[lo:hi], dtype=np.int64)
+        rows = keys & ROW_MASK
+        m = np.ones(len(rows), dtype=bool)
+        for field, code in codes.items():
+            m &= self._cols[field][rows] == code
+        if changed_since is not None:
+            m &= self._cols["modified"][rows] > changed_since
+        keys, rows = keys[m], rows[m]
+
+        if limit is not None and len(rows) > limit:
+            return [int(r) for r in rows[:limit]], int(keys[limit - 1])
+        return [int(r) for r in rows], None
+
+    def next_in_chain(self, field: str, row: int) -> Optional[int]:
+        """
+        Next row (departure order) sharing this row's train/pilot/route, skipping
+        cancelled trips. O(log n) via the per-field index.
+        """
+        code = int(self._cols[field][row])
+        if code < 0:
+            return None
+        keys = self._index[field][code]
+        cancelled = self.code_of("status", "Cancelled")
+        i = bisect_right(keys, self.key(row))
+        while i < len(keys):
+            nxt = keys[i] & ROW_MASK
+            if self._cols["status"][nxt] != cancelled:
+                return nxt
+            i += 1
+        return None
+
+    def prev_in_chain(self, field: str, row: int) -> Optional[int]:
+        """Previous row (departure order) sharing this row's train/pilot/route, skipping cancelled trips."""
+        code = int(self._cols[field][row])
+        if code < 0:
+            return None
+        keys = self._index[field][code]
+        cancelled = self.code_of("status", "Cancelled")
+        i = bisect_left(keys, self.key(row)) - 1
+        while i >= 0:
+            prev = keys[i] & ROW_MASK
+            if self._cols["status"][prev] != cancelled:
+                return prev
+            i -= 1
+        return None
+
+    def find_overlap(self, dep: int, arr: int, pilot: Optional[str] = None, train: Optional[str] = None,
+                     exclude_row: Optional[int] = None) -> Optional[int]:
+        """
+        First non-cancelled row in departure order overlapping [dep, arr) on the
+        same pilot or train. Rows are compared at their expected times (departure
+        plus delay, shifted arrival), so pass expected times too.
+        """
+        pilot_code = self.code_of("pilot", pilot) if pilot else None
+        train_code = self.code_of("train", train) if train else None
+        if pilot_code is None and train_code is None:
+            return None
+
+        m = (self.col("dep") + self.col("delay") < arr) & (self.col("arr") > dep)
+        cancelled = self.code_of("status", "Cancelled")
+        if cancelled is not None:
+            m &= self.col("status") != cancelled
+        same = np.zeros(self._n, dtype=bool)
+        if pilot_code is not None:
+            same |= self.col("pilot") == pilot_code
+        if train_code is not None:
+            same |= self.col("train") == train_code
+        m &= same
+        if exclude_row is not None:
+            m[exclude_row] = False
+
+        hits = np.flatnonzero(m[self.order()])
+        return int(self.order()[hits[0]]) if len(hits) else None
+
+FIELD_GETTERS = {
+    "id": TripStore.trip_uid,
+    "trip_id": TripStore.trip_label,
+    "route": lambda s, r: s.value(r, "route"),
+    "train_set_id": lambda s, r: s.value(r, "train"),
+    "pilot_id": lambda s, r: s.value(r, "pilot"),
+    "departure_time": lambda s, r: format_minutes(int(s._cols["dep"][r])),
+    "arrival_time": lambda s, r: format_minutes(int(s._cols["arr"][r])),
+    "frequency": lambda s, r: s.value(r, "frequency"),
+    "status": lambda s, r: s.value(r, "status"),
+    "delay_minutes": lambda s, r: int(s._cols["delay"][r]),
+    "platform": lambda s, r: s.value(r, "platform"),
+}
+FIELDS = tuple(FIELD_GETTERS)
@@ -0,0 +1,81 @@
+"""
+Serialization benchmark: FastAPI's default response path versus app.fast_json.
+
+The default path is emulated as FastAPI runs it: validate the return value
+against the response model (when there is one), walk it with jsonable_encoder,
+then json.dumps. The fast path is fast_json.dumps (pydantic-core).
+
+    cd kmrl-backend && python -m benchmarks.bench_json [--repeat N]
+"""
+import argparse
+import json
+import time
+from typing import Any, Callable, List, Optional
+
+from fastapi.encoders import jsonable_encoder
+from pydantic import TypeAdapter
+
+from app.fast_json import dumps
+from app.notes import Comment, HistoryEntry, Note
+from app.schedule import Trip
+from app.staff import ShiftAssignment, ShiftType
+from app.trip_store import format_minutes
+
+def roster_payload(staff: int = 50, days: int = 30) -> Any:
+    shifts = list(ShiftType)
+    roster = [ShiftAssignment(staff_id=f"S{s:03d}", date=f"2026-01-{d % 28 + 1:02d}",
+                              shift=shifts[(s + d) % len(shifts)], station_assigned="Aluva")
+              for d in range(days) for s in range(staff)]
+    return {"roster": roster}
+
+def schedule_payload(trips: int = 10_000) -> List[dict]:
+    return [dict(id=f"{i:08x}-0000-0000-0000-000000000000", trip_id=f"TR-{1000 + i}", route="Aluva -> Petta",
+                 train_set_id=f"TM-{100 + i % 25}", pilot_id=f"S{i % 60:03d}",
+                 departure_time=format_minutes(330 + i % 1080), arrival_time=format_minutes(375 + i % 1080),
+                 frequency="+10 mins", status="Scheduled", delay_minutes=0, platform="Platform 1")
+            for i in range(trips)]
+
+def notes_payload(notes: int = 1000, per_note: int = 5) -> List[Note]:
+    stamp = "2026-01-01 08:00:00"
+    return [Note(id=f"N{n}", category="Incident", priority="High", subject=f"Note {n}", description="x" * 200,
+                 visibility="HQ/Admin", author="ops", timestamp=stamp, status="Open",
+                 history=[HistoryEntry(action="Edited", timestamp=stamp, details="changed") for _ in range(per_note)],
+                 comments=[Comment(id=f"C{n}-{c}", author="ops", content="ok", timestamp=stamp) for c in range(per_note)])
+            for n in range(notes)]
+
+def default_path(model: Optional[Any]) -> Callable[[Any], bytes]:
+    adapter = TypeAdapter(model) if model is not None else None
+
+    def render(content: Any) -> bytes:
+        if adapter is not None:
+            content = adapter.validate_python(content, from_attributes=True)
+        return json.dumps(jsonable_encoder(content), ensure_ascii=False, allow_nan=False,
+                          separators=(",", ":")).encode("utf-8")
+    return render
+
+def best_ms(render: Callable[[Any], bytes], content: Any, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        render(content)
+        best = min(best, time.perf_counter() - start)
+    return best * 1000
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--repeat", type=int, default=5, help="runs per case; the best is reported")
+    args = parser.parse_args()
+
+    cases = [
+        ("roster 50 staff x 30 days", roster_payload(), None),
+        ("schedule 10k trips", schedule_payload(), List[Trip]),
+        ("notes 1000 x 5 comments/5 history", notes_payload(), List[Note]),
+    ]
+    for label, content, model in cases:
+        slow = default_path(model)
+        assert json.loads(slow(content)) == json.loads(dumps(content)), label
+        before, after = best_ms(slow, content, args.repeat), best_ms(dumps, content, args.repeat)
+        print(f"  {label:<36}{before:8.1f} ms -> {after:6.1f} ms  (x{before / after:.0f})")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+"""Concurrent read/write stress test for the in-memory stores and their locks."""
+import itertools
+import threading
+import time
+
+from fastapi.testclient import TestClient
+
+from app.concurrency import RWLock
+from app.main import app
+from app.trip_store import to_minutes
+
+DURATION = 2.0      # Seconds of mixed traffic
+READERS = 8
+WRITERS = 4
+
+def test_rwlock_excludes_writers():
+    lock = RWLock()
+    state = {"readers": 0, "writers": 0, "bad": 0}
+    guard = threading.Lock()
+
+    def enter(kind):
+        with guard:
+            state[kind] += 1
+            if state["writers"] > 1 or (state["writers"] and state["readers"]):
+                state["bad"] += 1
+
+    def leave(kind):
+        with guard:
+            state[kind] -= 1
+
+    def reader():
+        for _ in range(200):
+            with lock.read():
+                enter("readers"); time.sleep(0); leave("readers")
+
+    def writer():
+        for _ in range(100):
+            with lock.write():
+                enter("writers"); time.sleep(0); leave("writers")
+
+    threads = [threading.Thread(target=reader) for _ in range(6)] + [threading.Thread(target=writer) for _ in range(3)]
+    for t in threads: t.start()
+    for t in threads: t.join()
+    assert state["bad"] == 0
+
+def test_schedule_concurrent_reads_and_writes():
+    client = TestClient(app)
+    assert client.post("/schedule/reset").status_code == 200
+    stop = threading.Event()
+    errors, counts = [], {"reads": 0, "writes": 0}
+    count_lock = threading.Lock()
+    new_ids = itertools.count()
+
+    def bump(kind):
+        with count_lock:
+            counts[kind] += 1
+
+    def reader():
+        local = TestClient(app)
+        while not stop.is_set():
+            r = local.get("/schedule/")
+            if r.status_code != 200:
+                errors.append(f"read {r.status_code}")
+                continue
+            trips = r.json()
+            deps = [to_minutes(t["departure_time"]) for t in trips]
+            if deps != sorted(deps):
+                errors.append("snapshot not in departure order")
+            if len({t["id"] for t in trips}) != len(trips):
+                errors.append("duplicated trip in snapshot")
+            local.get("/conflicts/")
+            bump("reads")
+
+    def writer():
+        local = TestClient(app)
+        for step in itertools.count():
+            if stop.is_set():
+                return
+            n = next(new_ids)
+            if step % 25 == 24:
+                r = local.post("/schedule/reset")
+            elif step % 3 == 0:
+                trips = local.get("/schedule/?fields=id").json()
+                r = local.put(f"/schedule/trip/{trips[n % len(trips)]['id']}", json={"delay_minutes": n % 7})
+            elif step % 3 == 1:
+                r = local.post("/conflicts/run-check")
+            else:
+                r = local.post("/schedule/trip", json={
+                    "id": f"stress-{n}", "trip_id": f"TR-{9000 + n}", "route": "Aluva -> Petta",
+                    "departure_time": f"{5 + n % 17:02d}:{n % 60:02d}"})
+            # 409 / 422 are legitimate rejections (clashes, late delays) and 404 a trip another
+            # writer's reset removed since the listing; anything else is a failure
+            if r.status_code not in (200, 404, 409, 422):
+                errors.append(f"write {r.status_code}: {r.text[:200]}")
+            bump("writes")
+
+    threads = [threading.Thread(target=reader) for _ in range(READERS)]
+    threads += [threading.Thread(target=writer) for _ in range(WRITERS)]
+    start = time.perf_counter()
+    for t in threads: t.start()
+    time.sleep(DURATION)
+    stop.set()
+    for t in threads: t.join()
+    elapsed = time.perf_counter() - start
+
+    assert not errors, errors[:5]
+    assert counts["reads"] and counts["writes"]
+    # Loose floors: readers must not be serialised behind writers to a crawl, nor writers starved
+    assert counts["reads"] / elapsed > 20, counts
+    assert counts["writes"] / elapsed > 5, counts
+
+    # The store is consistent once the traffic stops
+    trips = client.get("/schedule/").json()
+    deps = [to_minutes(t["departure_time"]) for t in trips]
+    assert deps == sorted(deps)
+    assert len({t["id"] for t in trips}) == len(trips)
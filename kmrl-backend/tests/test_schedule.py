@@ -0,0 +1,67 @@
+"""Schedule edits through the API: validation happens before anything is written."""
+from fastapi.testclient import TestClient
+
+from app.main import app
+from app.platforms import PlatformBoard, board_for
+from app.schedule import TRIPS_DB
+
+client = TestClient(app)
+
+def _trip(trip_id: str) -> dict:
+    return next(t for t in client.get("/schedule/").json() if t["trip_id"] == trip_id)
+
+def test_rejected_knock_on_delay_leaves_the_edit_unapplied():
+    assert client.post("/schedule/reset").status_code == 200
+    before = client.get("/schedule/").json()
+    trip = _trip("TR-1065")
+    assert trip["platform"] == "Platform 1"
+
+    # The trip itself still arrives in time, but a later trip of its chain would not
+    r = client.put(f"/schedule/trip/{trip['id']}", json={"delay_minutes": 590, "platform": "Platform 2"})
+    assert r.status_code == 422
+    assert "end of the service day" in r.json()["detail"]
+
+    assert client.get("/schedule/").json() == before
+    board = board_for(TRIPS_DB)
+    assert board.version == TRIPS_DB.version
+    assert board.booked[TRIPS_DB.find(trip["id"])][1] == "Platform 1"
+
+def _fresh_bookings():
+    board = PlatformBoard()
+    board.track(TRIPS_DB, TRIPS_DB.order())
+    return board.booked
+
+def test_writes_keep_the_platform_board_current():
+    assert client.post("/schedule/reset").status_code == 200
+    board = board_for(TRIPS_DB)
+    trips = client.get("/schedule/").json()
+    client.post(f"/schedule/trip/{trips[30]['id']}/delay", json={"delay_minutes": 12})
+    client.post("/schedule/bulk", json={"cancellations": [{"id": trips[31]["id"]}]})
+    client.post("/schedule/platforms/reallocate")
+    # Tracked in place by each write, never rebuilt
+    assert board_for(TRIPS_DB) is board
+    assert board.version == TRIPS_DB.version
+    assert board.booked == _fresh_bookings()
+
+def test_bulk_rejects_platform_clashes():
+    assert client.post("/schedule/reset").status_code == 200
+    trip = _trip("TR-1041")
+    new = {"route": trip["route"], "departure_time": trip["departure_time"]}
+
+    r = client.post("/schedule/bulk", json={"inserts": [{"id": "b1", "trip_id": "TR-9100", "platform": trip["platform"], **new}]})
+    assert r.status_code == 409
+    assert "is occupied by TR-1041" in r.json()["detail"]["errors"][0]
+
+    # Allocated the other terminus platform, then none is left
+    r = client.post("/schedule/bulk", json={"inserts": [{"id": "b2", "trip_id": "TR-9101", **new}]})
+    assert r.status_code == 200
+    assert _trip("TR-9101")["platform"] not in ("", trip["platform"])
+    r = client.post("/schedule/bulk", json={"inserts": [{"id": "b3", "trip_id": "TR-9102", **new}]})
+    assert r.status_code == 409
+    assert "no free platform" in r.json()["detail"]["errors"][0]
+
+    # A platform the same batch frees up can be reused
+    r = client.post("/schedule/bulk", json={"cancellations": [{"id": trip["id"]}],
+                                            "inserts": [{"id": "b4", "trip_id": "TR-9103", "platform": trip["platform"], **new}]})
+    assert r.status_code == 200
+    assert board_for(TRIPS_DB).booked == _fresh_bookings()
@@ -0,0 +1,29 @@
+"""Staff allocation: gaps are filled by the nearest available staff."""
+from app.staff import STATIONS, Role, StaffMember, _borrow
+
+def _member(id: str, role: Role, home: str) -> StaffMember:
+    return StaffMember(id=id, name=id, role=role, home_base=home)
+
+def _empty():
+    return {st: {"managers": [], "security": [], "ticket": []} for st in STATIONS}
+
+def test_borrow_prefers_the_nearest_unassigned_staff_member():
+    station = STATIONS[0]
+    far, near = _member("FAR", Role.MANAGER, STATIONS[-1]), _member("NEAR", Role.MANAGER, STATIONS[2])
+    unassigned = [far, _member("SEC", Role.SECURITY, STATIONS[1]), near]
+
+    allocations = _empty()
+    assert _borrow(allocations, station, "managers", unassigned)
+    assert allocations[station]["managers"] == [near]
+    assert [s.id for s in unassigned] == ["FAR", "SEC"]
+
+def test_borrow_uses_unassigned_staff_before_donor_stations():
+    station = STATIONS[0]
+    allocations = _empty()
+    allocations[STATIONS[1]]["managers"] = [_member("D1", Role.MANAGER, STATIONS[1]), _member("D2", Role.MANAGER, STATIONS[1])]
+    unassigned = [_member("OFFLINE", Role.MANAGER, "Depot")]   # Home base off the line: last choice, still before donors
+
+    assert _borrow(allocations, station, "managers", unassigned)
+    assert [s.id for s in allocations[station]["managers"]] == ["OFFLINE"]
+    assert _borrow(allocations, station, "managers", unassigned)
+    assert len(allocations[STATIONS[1]]["managers"]) == 1